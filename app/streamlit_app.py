@@ -13,8 +13,15 @@ ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from src.compare_service import compare
+from src.async_engine import ENGINE
+from src.compare_service import warm
 from src.config import settings
+from src.metrics import start_metrics_server
+
+# Índices carregados na abertura do app (no-op nos reruns; recarga automática em compare)
+warm()
+# Endpoint /metrics (tempos por etapa e contadores) se METRICS_PORT estiver definido
+start_metrics_server(settings.METRICS_PORT)
 
 
 # ========= LLM Sidebar (categorias + modos + GitHub) =========
@@ -390,7 +397,8 @@ def main():
             return
 
         with st.spinner("Processando..."):
-            resultados = compare(query)
+            # sessões simultâneas são agrupadas num único lote (micro-batching)
+            resultados = ENGINE.submit(query).result()
 
         if not resultados:
             st.info("Nenhum bloco suspeito encontrado com os thresholds atuais.")
@@ -0,0 +1,72 @@
+# benchmarks/bench_ann_recall.py
+# Mede recall@k e latência da busca IVF contra a busca exata (força bruta).
+#
+# Uso (a partir da raiz do projeto):
+#   python -m benchmarks.bench_ann_recall                      # índice semântico da versão atual
+#   python -m benchmarks.bench_ann_recall --synthetic 200000   # embeddings sintéticos
+#
+# As consultas são blocos do próprio índice com ruído gaussiano (simulam paráfrases),
+# de modo que o benchmark roda offline, sem carregar o modelo de embeddings.
+
+import argparse
+import time
+import numpy as np
+
+from src import io_utils
+from src.ann_index import build_ivf, search_ivf, recall_at_k
+from src.config import settings
+from src.index_store import index_paths
+from src.topk import top_k_indices
+
+
+def _load_embeddings(args) -> np.ndarray:
+    if args.synthetic:
+        rng = np.random.default_rng(args.seed)
+        n_clusters = max(1, args.synthetic // 100)
+        centers = rng.normal(size=(n_clusters, args.dim)).astype(np.float32)
+        emb = centers[rng.integers(0, n_clusters, args.synthetic)]
+        emb += 0.3 * rng.normal(size=emb.shape).astype(np.float32)
+    else:
+        emb, _, _ = io_utils.load_index_semantic(args.index_dir)
+    emb = np.asarray(emb, dtype=np.float32)
+    return emb / np.linalg.norm(emb, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k da busca IVF vs. busca exata")
+    parser.add_argument("--index-dir", default=index_paths(settings)["semantic"])
+    parser.add_argument("--synthetic", type=int, default=0, help="nº de embeddings sintéticos (0 = usa o índice)")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=settings.K_SEM)
+    parser.add_argument("--nlist", type=int, default=settings.IVF_NLIST)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    emb = _load_embeddings(args)
+    rng = np.random.default_rng(args.seed)
+    queries = emb[rng.choice(len(emb), size=min(args.queries, len(emb)), replace=False)]
+    queries = queries + 0.05 * rng.normal(size=queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    t0 = time.perf_counter()
+    index = build_ivf(emb, nlist=args.nlist)
+    print(f"Blocos: {len(emb)} | dim: {emb.shape[1]} | listas IVF: {index.nlist} "
+          f"| construção: {time.perf_counter() - t0:.2f}s")
+
+    t0 = time.perf_counter()
+    exact = list(top_k_indices(queries @ emb.T, args.k))
+    t_exact = (time.perf_counter() - t0) / len(queries) * 1000
+    print(f"{'busca':>10} | {'recall@' + str(args.k):>10} | {'ms/consulta':>11}")
+    print(f"{'exata':>10} | {1.0:>10.3f} | {t_exact:>11.3f}")
+
+    for nprobe in args.nprobe:
+        t0 = time.perf_counter()
+        approx = [idx for idx, _ in search_ivf(index, emb, queries, args.k, nprobe=nprobe)]
+        t_ivf = (time.perf_counter() - t0) / len(queries) * 1000
+        print(f"{'ivf/' + str(nprobe):>10} | {recall_at_k(approx, exact):>10.3f} | {t_ivf:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# benchmarks/bench_concurrent_compare.py
+# Vazão de compare() sob carga concorrente: chamadas sequenciais vs. CompareEngine
+# (micro-batching entre requisições).
+#
+# Uso (a partir da raiz do projeto, com os índices já construídos):
+#   python -m benchmarks.bench_concurrent_compare
+#   python -m benchmarks.bench_concurrent_compare --essays 64 --clients 1 8 32 --max-wait-ms 5 20
+#
+# As redações são trechos de documentos do corpus (DATA_RAW_DIR) com
+# --essay-words palavras. Para cada configuração: redações/s e latência p50/p95; ao
+# final, o tempo acumulado por etapa do pipeline (src/metrics.py).
+
+import argparse
+import asyncio
+import time
+import numpy as np
+
+from src import compare_service, io_utils
+from src.async_engine import CompareEngine
+from src.config import settings
+from src.metrics import METRICS
+
+
+def _load_essays(args):
+    essays = []
+    for doc in io_utils.iter_corpus(settings.DATA_RAW_DIR, settings.DATA_PROCESSED_DIR):
+        words = doc["text"].split()
+        for s in range(0, max(1, len(words) - args.essay_words + 1), args.essay_words):
+            essays.append(" ".join(words[s:s + args.essay_words]))
+            if len(essays) >= args.essays:
+                return essays
+    return essays
+
+
+async def _run_clients(engine: CompareEngine, essays, clients: int):
+    queue = list(essays)
+    latencies = []
+
+    async def client():
+        while queue:
+            texto = queue.pop()
+            t0 = time.perf_counter()
+            await engine.compare(texto)
+            latencies.append(time.perf_counter() - t0)
+
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return latencies
+
+
+def _report(label: str, n: int, elapsed: float, latencies) -> None:
+    lat = np.asarray(latencies) * 1000
+    print(f"{label:>28} | {n / elapsed:>11.2f} | {np.percentile(lat, 50):>8.1f} | {np.percentile(lat, 95):>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vazão de compare() com requisições concorrentes")
+    parser.add_argument("--essays", type=int, default=32)
+    parser.add_argument("--essay-words", type=int, default=300)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--max-wait-ms", type=float, nargs="+", default=[settings.COMPARE_MAX_WAIT_MS])
+    parser.add_argument("--max-batch-windows", type=int, default=settings.COMPARE_MAX_BATCH_WINDOWS)
+    args = parser.parse_args()
+
+    essays = _load_essays(args)
+    compare_service.warm()
+    compare_service.compare(essays[0])  # aquece o modelo
+    print(f"Redações: {len(essays)} x {args.essay_words} palavras")
+    print(f"{'configuração':>28} | {'redações/s':>11} | {'p50 (ms)':>8} | {'p95 (ms)':>8}")
+
+    latencies = []
+    t0 = time.perf_counter()
+    for texto in essays:
+        t1 = time.perf_counter()
+        compare_service.compare(texto)
+        latencies.append(time.perf_counter() - t1)
+    _report("sequencial", len(essays), time.perf_counter() - t0, latencies)
+
+    for wait in args.max_wait_ms:
+        for clients in args.clients:
+            engine = CompareEngine(args.max_batch_windows, wait)
+            t0 = time.perf_counter()
+            latencies = asyncio.run(_run_clients(engine, essays, clients))
+            elapsed = time.perf_counter() - t0
+            stats = engine.stats.snapshot()
+            engine.close()
+            _report(f"engine {clients} clientes, {wait:g}ms", len(essays), elapsed, latencies)
+            print(f"{'':>28}   {stats['batches']} lotes, {stats['requests_per_batch']:.1f} redações/lote")
+
+    # Onde o tempo foi gasto (todas as execuções acima)
+    print(f"\n{'etapa':>28} | {'chamadas':>8} | {'total (s)':>9} | {'média (ms)':>10}")
+    for name, stage in sorted(METRICS.snapshot()["stages"].items(), key=lambda kv: -kv[1]["total_s"]):
+        print(f"{name:>28} | {stage['count']:>8} | {stage['total_s']:>9.2f} | {stage['mean_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# benchmarks/bench_encode_workers.py
+# Mede a vazão (blocos/s) da geração de embeddings em função do nº de processos.
+#
+# Uso (a partir da raiz do projeto):
+#   python -m benchmarks.bench_encode_workers                        # blocos do índice léxico
+#   python -m benchmarks.bench_encode_workers --workers 1 2 4 8 --blocks 4000
+#
+# Cada configuração usa um ShardedEncoder novo, sem shard_dir (sem retomada), e o
+# tempo inclui o carregamento do modelo nos processos, como num build real. Os blocos
+# são enviados em lotes de --chunk-size (INGEST_CHUNK_SIZE, como no pipeline) e, por
+# padrão, com o tamanho de shard automático do build (--shard-size 0).
+
+import argparse
+import time
+
+from src import io_utils
+from src.config import settings
+from src.index_store import index_paths
+from src.parallel_encode import ShardedEncoder
+
+
+def _load_texts(args):
+    try:
+        _, _, id_map = io_utils.load_index_lexical(args.index_dir)
+        texts = [id_map[i]["text"] for i in range(min(args.blocks, len(id_map)))]
+    except FileNotFoundError:
+        texts = []
+    if not texts:
+        # sem índice: frases sintéticas com o tamanho típico de uma janela
+        texts = [" ".join(f"palavra{(i * 7 + j) % 997}" for j in range(settings.WINDOW_SIZE))
+                 for i in range(args.blocks)]
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Blocos/s da codificação por nº de processos")
+    parser.add_argument("--index-dir", default=index_paths(settings)["lexical"])
+    parser.add_argument("--model", default=settings.SEM_MODEL_NAME)
+    parser.add_argument("--blocks", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--batch-size", type=int, default=settings.ENCODE_BATCH_SIZE)
+    parser.add_argument("--max-tokens", type=int, default=settings.ENCODE_MAX_TOKENS)
+    parser.add_argument("--shard-size", type=int, default=0, help="0 = automático (um shard por processo)")
+    parser.add_argument("--chunk-size", type=int, default=settings.INGEST_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    texts = _load_texts(args)
+    print(f"Blocos: {len(texts)} | modelo: {args.model} | batch: {args.batch_size}")
+    print(f"{'processos':>10} | {'tempo (s)':>10} | {'blocos/s':>10}")
+    for workers in args.workers:
+        t0 = time.perf_counter()
+        with ShardedEncoder(args.model, workers=workers, batch_size=args.batch_size,
+                            max_tokens=args.max_tokens, shard_size=args.shard_size or None) as enc:
+            for s in range(0, len(texts), args.chunk_size):
+                enc.encode(texts[s:s + args.chunk_size])
+        elapsed = time.perf_counter() - t0
+        print(f"{workers:>10} | {elapsed:>10.2f} | {len(texts) / elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# benchmarks/bench_lexical_features.py
+# Compara os modos de features do índice léxico (LEX_FEATURES): vocab, pruned e hashing.
+#
+# Uso (a partir da raiz do projeto):
+#   python -m benchmarks.bench_lexical_features                    # blocos do corpus em DATA_RAW_DIR
+#   python -m benchmarks.bench_lexical_features --synthetic 20000  # blocos sintéticos
+#
+# Para cada modo: tamanho do tfidf_model.joblib, tempo de carregamento, latência do
+# transform por janela e recall@1 de detecção. As consultas são blocos do próprio
+# corpus com uma fração das palavras trocada (cópia com pequenas edições); acerto =
+# o bloco de origem em 1º lugar.
+
+import argparse
+import os
+import tempfile
+import time
+import joblib
+import numpy as np
+
+from src import io_utils
+from src.compare_lexical import LEX_FEATURE_MODES, build_postings, compare_lexical_batch, make_tfidf_vectorizer
+from src.config import settings
+from src.preprocess import build_windows
+
+
+def _load_blocks(args):
+    if args.synthetic:
+        rng = np.random.default_rng(args.seed)
+        vocab = [f"palavra{i}" for i in range(20_000)]
+        # distribuição de Zipf, como em texto real
+        ids = np.minimum(rng.zipf(1.3, size=(args.synthetic, settings.WINDOW_SIZE)) - 1, len(vocab) - 1)
+        return [" ".join(vocab[i] for i in row) for row in ids]
+    blocks = []
+    for doc in io_utils.iter_corpus(settings.DATA_RAW_DIR, settings.DATA_PROCESSED_DIR):
+        blocks.extend(w["text"] for w in build_windows(doc["text"], settings.WINDOW_SIZE, settings.STRIDE))
+    return blocks
+
+
+def _perturb(text: str, rate: float, rng) -> str:
+    words = text.split()
+    for i in np.flatnonzero(rng.random(len(words)) < rate):
+        words[i] = f"editada{rng.integers(1_000_000)}"
+    return " ".join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tamanho/latência/recall dos modos de features léxicas")
+    parser.add_argument("--synthetic", type=int, default=0, help="nº de blocos sintéticos (0 = usa o corpus)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--edit-rate", type=float, default=0.2, help="fração de palavras trocadas nas consultas")
+    parser.add_argument("--min-df", type=int, default=settings.LEX_MIN_DF)
+    parser.add_argument("--hash-features", type=int, default=settings.LEX_HASH_FEATURES)
+    parser.add_argument("--modes", nargs="+", default=list(LEX_FEATURE_MODES))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    blocks = _load_blocks(args)
+    rng = np.random.default_rng(args.seed)
+    sources = rng.choice(len(blocks), size=min(args.queries, len(blocks)), replace=False)
+    queries = [_perturb(blocks[i], args.edit_rate, rng) for i in sources]
+    id_map = [{"uid": str(i)} for i in range(len(blocks))]
+    print(f"Blocos: {len(blocks)} | consultas: {len(queries)} | edição: {args.edit_rate:.0%}")
+    print(f"{'modo':>8} | {'features':>10} | {'modelo (MB)':>11} | {'load (s)':>8} | "
+          f"{'fit (s)':>7} | {'ms/janela':>9} | {'recall@1':>8}")
+
+    for mode in args.modes:
+        model = make_tfidf_vectorizer(mode, min_df=args.min_df, n_features=args.hash_features)
+        t0 = time.perf_counter()
+        matrix = model.fit_transform(blocks)
+        t_fit = time.perf_counter() - t0
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "tfidf_model.joblib")
+            joblib.dump(model, path)
+            size_mb = os.path.getsize(path) / 2 ** 20
+            t0 = time.perf_counter()
+            model = joblib.load(path)
+            t_load = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for q in queries:
+            model.transform([q])
+        ms_transform = (time.perf_counter() - t0) / len(queries) * 1000
+
+        tops = compare_lexical_batch(queries, model, matrix, id_map, top_n=1, postings=build_postings(matrix))
+        recall = np.mean([bool(top) and top[0][0] == str(src) for top, src in zip(tops, sources)])
+        print(f"{mode:>8} | {matrix.shape[1]:>10} | {size_mb:>11.2f} | {t_load:>8.3f} | "
+              f"{t_fit:>7.2f} | {ms_transform:>9.3f} | {recall:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
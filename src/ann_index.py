@@ -0,0 +1,115 @@
+# src/ann_index.py
+# Índice aproximado (IVF) para os embeddings semânticos, implementado só com NumPy.
+# Os blocos são agrupados por k-means esférico em `nlist` listas invertidas; na busca,
+# apenas as `nprobe` listas de centróides mais próximos da consulta são varridas.
+
+from dataclasses import dataclass
+from typing import List, Tuple
+import numpy as np
+
+from src.topk import top_k_indices
+
+
+@dataclass(frozen=True)
+class IVFIndex:
+    centroids: np.ndarray     # (nlist, d) float32, L2-normalizados
+    list_offsets: np.ndarray  # (nlist + 1,) int64: lista c = list_ids[offsets[c]:offsets[c+1]]
+    list_ids: np.ndarray      # (n_blocos,) int64: linhas de `embeddings`, agrupadas por lista
+
+    @property
+    def nlist(self) -> int:
+        return int(self.centroids.shape[0])
+
+
+def _normalize_rows(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return x / norms
+
+
+def _assign(x: np.ndarray, centroids: np.ndarray, chunk: int = 65536) -> np.ndarray:
+    """Atribui cada linha de x ao centróide de maior produto interno (em blocos)."""
+    out = np.empty(x.shape[0], dtype=np.int64)
+    for s in range(0, x.shape[0], chunk):
+        out[s:s + chunk] = np.argmax(x[s:s + chunk] @ centroids.T, axis=1)
+    return out
+
+
+def default_nlist(n_blocks: int) -> int:
+    """Regra usual: ~4·sqrt(N) listas, limitada ao número de blocos."""
+    return max(1, min(n_blocks, int(4 * np.sqrt(n_blocks))))
+
+
+def build_ivf(
+    embeddings: np.ndarray,
+    nlist: int = 0,
+    n_iter: int = 10,
+    max_train: int = 256,
+    seed: int = 0,
+) -> IVFIndex:
+    """
+    Treina o k-means esférico (até `max_train` pontos por lista) e distribui TODOS os
+    blocos nas listas invertidas. nlist <= 0 usa default_nlist(N).
+    """
+    x = np.asarray(embeddings, dtype=np.float32)
+    n = x.shape[0]
+    if n == 0:
+        raise ValueError("Não é possível construir o índice IVF sem embeddings.")
+    nlist = min(n, nlist if nlist > 0 else default_nlist(n))
+
+    rng = np.random.default_rng(seed)
+    train = x[rng.choice(n, size=min(n, nlist * max_train), replace=False)]
+    centroids = train[rng.choice(train.shape[0], size=nlist, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assign = _assign(train, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, train)
+        counts = np.bincount(assign, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            # listas vazias são re-semeadas com pontos aleatórios do treino
+            sums[empty] = train[rng.choice(train.shape[0], size=int(empty.sum()), replace=False)]
+        centroids = _normalize_rows(sums).astype(np.float32)
+
+    assign = _assign(x, centroids)
+    list_ids = np.argsort(assign, kind="stable").astype(np.int64)
+    counts = np.bincount(assign, minlength=nlist)
+    list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    return IVFIndex(centroids=centroids, list_offsets=list_offsets, list_ids=list_ids)
+
+
+def search_ivf(
+    index: IVFIndex,
+    embeddings: np.ndarray,
+    query_vecs: np.ndarray,
+    k: int,
+    nprobe: int = 8,
+) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Busca aproximada: para cada consulta, varre só as `nprobe` listas mais próximas.
+    Retorna, por consulta, (índices_dos_blocos, scores) ordenados por score desc.
+    Pode devolver menos de k resultados se as listas sondadas tiverem poucos blocos.
+    """
+    query_vecs = np.atleast_2d(np.asarray(query_vecs, dtype=np.float32))
+    nprobe = max(1, min(int(nprobe), index.nlist))
+    probes = top_k_indices(query_vecs @ index.centroids.T, nprobe)
+
+    results: List[Tuple[np.ndarray, np.ndarray]] = []
+    offsets, ids = index.list_offsets, index.list_ids
+    for q, lists in zip(query_vecs, probes):
+        cand = np.concatenate([ids[offsets[c]:offsets[c + 1]] for c in lists])
+        cand.sort()  # desempate determinístico pelo menor índice de bloco
+        scores = np.asarray(embeddings[cand], dtype=np.float32) @ q
+        sel = top_k_indices(scores, k)
+        results.append((cand[sel], scores[sel]))
+    return results
+
+
+def recall_at_k(approx: List[np.ndarray], exact: List[np.ndarray]) -> float:
+    """Fração média dos top-k exatos recuperados pela busca aproximada."""
+    if not exact:
+        return 1.0
+    hits = [len(set(np.asarray(a).tolist()) & set(np.asarray(e).tolist())) / max(1, len(e))
+            for a, e in zip(approx, exact)]
+    return float(np.mean(hits))
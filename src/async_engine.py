@@ -0,0 +1,168 @@
+# src/async_engine.py
+# Camada assíncrona em torno de compare_service, com micro-batching entre requisições.
+#
+# Cada chamada a CompareEngine.compare() entra numa fila. Um único consumidor junta
+# as redações que chegam em até COMPARE_MAX_WAIT_MS (ou até somar
+# COMPARE_MAX_BATCH_WINDOWS janelas) e as envia de uma vez a compare_service.compare_many:
+# um encode, um transform TF-IDF e um produto matricial para todas as janelas do lote.
+# Os resultados são devolvidos a cada chamador. Enquanto um lote é processado (numa
+# thread, para não bloquear o event loop), as novas requisições se acumulam no próximo.
+#
+# Uso:
+#   resultados = await ENGINE.compare(texto)           # código asyncio
+#   resultados = ENGINE.submit(texto).result()         # threads (ex.: sessões do Streamlit)
+
+import asyncio
+import concurrent.futures
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from src import compare_service
+from src.config import settings
+from src.preprocess import TokenizedText, count_windows, tokenize
+
+
+@dataclass
+class EngineStats:
+    requests: int = 0
+    batches: int = 0
+    windows: int = 0
+    max_batch_requests: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, n_requests: int, n_windows: int) -> None:
+        with self._lock:
+            self.requests += n_requests
+            self.batches += 1
+            self.windows += n_windows
+            self.max_batch_requests = max(self.max_batch_requests, n_requests)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "batches": self.batches,
+                "windows": self.windows,
+                "max_batch_requests": self.max_batch_requests,
+                "requests_per_batch": self.requests / self.batches if self.batches else 0.0,
+            }
+
+
+_Item = Tuple[TokenizedText, int, asyncio.Future]
+
+
+class CompareEngine:
+    """
+    Fila de comparações com micro-batching. O consumidor é criado no event loop da
+    primeira chamada a compare(); submit() usa um loop próprio numa thread de fundo.
+    Um mesmo engine deve ser usado a partir de um único event loop.
+    """
+
+    def __init__(
+        self,
+        max_batch_windows: int = 256,
+        max_wait_ms: float = 10.0,
+        compare_many: Optional[Callable[[Sequence[TokenizedText]], List[List[Dict]]]] = None,
+    ):
+        self.max_batch_windows = max(1, int(max_batch_windows))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._compare_many = compare_many or compare_service.compare_many
+        self.stats = EngineStats()
+        # uma thread: os lotes rodam em sequência (o modelo já usa vários núcleos)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="compare-batch")
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._carry: Optional[_Item] = None
+        self._bg_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._bg_lock = threading.Lock()
+
+    async def compare(self, texto_redacao: str) -> List[Dict]:
+        tok = tokenize(texto_redacao)  # dividida uma vez: conta as janelas e vai a compare_many
+        if not tok:
+            return []
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        n_windows = count_windows(len(tok), settings.WINDOW_SIZE, settings.STRIDE)
+        await self._queue.put((tok, n_windows, future))
+        return await future
+
+    def submit(self, texto_redacao: str) -> concurrent.futures.Future:
+        """Versão para código síncrono/multi-thread: devolve um concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(self.compare(texto_redacao), self._background_loop())
+
+    def close(self) -> None:
+        loop, self._bg_loop = self._bg_loop, None
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(self._stop_worker(), loop).result(timeout=5)
+            loop.call_soon_threadsafe(loop.stop)
+        self._executor.shutdown(wait=False)
+
+    async def _stop_worker(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._carry = None
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    def _background_loop(self) -> asyncio.AbstractEventLoop:
+        with self._bg_lock:
+            if self._bg_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="compare-engine", daemon=True).start()
+                self._bg_loop = loop
+            return self._bg_loop
+
+    async def _next_batch(self) -> List[_Item]:
+        """Junta requisições até max_batch_windows janelas ou max_wait após a primeira."""
+        loop = asyncio.get_running_loop()
+        first = self._carry if self._carry is not None else await self._queue.get()
+        self._carry = None
+        batch, n_windows = [first], first[1]
+        deadline = loop.time() + self.max_wait
+        while n_windows < self.max_batch_windows:
+            try:
+                if self._queue.empty():
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except asyncio.TimeoutError:
+                break
+            if n_windows + item[1] > self.max_batch_windows:
+                self._carry = item  # abre o próximo lote
+                break
+            batch.append(item)
+            n_windows += item[1]
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            pending = [item for item in batch if not item[2].done()]  # descarta canceladas
+            if not pending:
+                continue
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, self._compare_many, [tok for tok, _, _ in pending]
+                )
+            except Exception as e:
+                for _, _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.stats.record(len(pending), sum(n for _, n, _ in pending))
+            for (_, _, future), result in zip(pending, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+# Engine compartilhado pelo processo (ex.: todas as sessões do Streamlit)
+ENGINE = CompareEngine(settings.COMPARE_MAX_BATCH_WINDOWS, settings.COMPARE_MAX_WAIT_MS)
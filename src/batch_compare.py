@@ -0,0 +1,272 @@
+# src/batch_compare.py
+# Comparação em lote (offline) de muitas redações contra os índices.
+#
+# Uso (a partir da raiz do projeto):
+#   python -m src.batch_compare data/redacoes/ resultados.jsonl
+#   python -m src.batch_compare redacoes.jsonl resultados.parquet --workers 4
+#   python -m src.batch_compare redacoes.jsonl resultados.jsonl --resume
+#
+# Entrada: diretório de .txt (id = nome do arquivo) ou JSONL com {"id", "text"}.
+# As redações são agrupadas em lotes de BATCH_CHUNK_ESSAYS; cada lote é comparado
+# com compare_service.compare_many (janelas de todas as redações num único encode) em
+# um pool de BATCH_WORKERS processos, cada um com os índices carregados uma vez (mmap:
+# as páginas são compartilhadas entre os processos).
+#
+# Saída, gravada à medida que os lotes terminam:
+#   .jsonl   -> uma linha por redação: {"id", "n_suspeitos", "score_max", "resultados"}
+#   .parquet -> diretório com um part-NNNNN.parquet por lote, uma linha por bloco
+#               suspeito (requer pyarrow); redações sem blocos suspeitos não geram linhas
+# O checkpoint (<saída>.checkpoint) registra, por lote gravado, os ids e a posição
+# na saída. Com --resume, o que foi gravado depois do último checkpoint é descartado
+# e as redações já registradas são puladas.
+
+import argparse
+import json
+import os
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, List, Set, Tuple
+
+from src import compare_service, io_utils
+from src.config import settings
+from src.preprocess import count_windows, tokenize
+
+Essay = Tuple[str, str]  # (id, texto)
+
+
+def iter_essays(path_in: str) -> Iterator[Essay]:
+    """Redações de um diretório de .txt ou de um arquivo JSONL ({"id", "text"})."""
+    if os.path.isdir(path_in):
+        for doc in io_utils.iter_corpus(path_in):
+            yield doc["doc_id"], doc["text"]
+        return
+    with open(path_in, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            yield str(record.get("id", record.get("doc_id", line_no))), record.get("text", "")
+
+
+# --- Processos do pool ---
+
+def _init_worker(threads: int) -> None:
+    """Limita as threads do torch e carrega índices e modelo uma vez por processo."""
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    compare_service.warm()
+
+
+def _compare_chunk(chunk: List[Essay]) -> Tuple[List[Essay], List[List[Dict]], int]:
+    """Compara um lote; devolve também o nº de janelas, contado sobre a mesma tokenização."""
+    toks = [tokenize(text) for _, text in chunk]
+    n_windows = sum(count_windows(len(tok), settings.WINDOW_SIZE, settings.STRIDE) for tok in toks)
+    return chunk, compare_service.compare_many(toks), n_windows
+
+
+# --- Saída ---
+
+def _summary(essay_id: str, resultados: List[Dict]) -> Dict:
+    return {
+        "id": essay_id,
+        "n_suspeitos": len(resultados),
+        "score_max": max((r["scores"]["final"] for r in resultados), default=0.0),
+        "resultados": resultados,
+    }
+
+
+def _flat_rows(essay_id: str, resultados: List[Dict]) -> List[Dict]:
+    """Uma linha (colunas escalares) por bloco suspeito, para a saída Parquet."""
+    return [{
+        "id": essay_id,
+        "bloco_id": r["bloco_id"],
+        "inicio": r["inicio"],
+        "fim": r["fim"],
+        "tipo": r["tipo"],
+        "trecho": r["trecho"],
+        "candidato_doc_id": r["melhor_candidato"]["doc_id"],
+        "candidato_block_id": r["melhor_candidato"]["block_id"],
+        "candidato_start_word": r["melhor_candidato"]["start_word"],
+        "candidato_end_word": r["melhor_candidato"]["end_word"],
+        "n_trechos_literais": len(r.get("trechos_literais", [])),
+        **{f"score_{name}": value for name, value in r["scores"].items()},
+    } for r in resultados]
+
+
+class _JsonlOutput:
+    """Acrescenta linhas ao arquivo; a posição do checkpoint é o tamanho em bytes."""
+
+    def __init__(self, path: str, resume_mark):
+        self.path = path
+        mode = "r+b" if resume_mark is not None and os.path.exists(path) else "wb"
+        self._f = open(path, mode)
+        self._f.truncate(resume_mark or 0)  # descarta o que veio depois do checkpoint
+        self._f.seek(0, os.SEEK_END)
+
+    def write(self, essays: List[Essay], results: List[List[Dict]]) -> int:
+        for (essay_id, _), resultados in zip(essays, results):
+            line = json.dumps(_summary(essay_id, resultados), ensure_ascii=False)
+            self._f.write(line.encode("utf-8") + b"\n")
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        return self._f.tell()
+
+    def close(self) -> None:
+        self._f.close()
+
+
+class _ParquetOutput:
+    """Um arquivo por lote; a posição do checkpoint é o nome do arquivo."""
+
+    def __init__(self, path: str, done_parts: Set[str]):
+        import pyarrow  # dependência opcional: só para saída .parquet (falha cedo se ausente)
+        self.path = path
+        if not done_parts:
+            shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):  # lotes gravados depois do último checkpoint
+            if name not in done_parts:
+                os.remove(os.path.join(path, name))
+        self._next = len(done_parts)
+
+    def write(self, essays: List[Essay], results: List[List[Dict]]) -> str:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        rows = [row for (essay_id, _), resultados in zip(essays, results) for row in _flat_rows(essay_id, resultados)]
+        name = f"part-{self._next:05d}.parquet"
+        self._next += 1
+        tmp = os.path.join(self.path, f".{name}.tmp")
+        pq.write_table(pa.Table.from_pylist(rows, schema=_parquet_schema()), tmp)
+        os.replace(tmp, os.path.join(self.path, name))
+        return name
+
+    def close(self) -> None:
+        pass
+
+
+def _parquet_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("id", pa.string()), ("bloco_id", pa.int64()), ("inicio", pa.int64()), ("fim", pa.int64()),
+        ("tipo", pa.string()), ("trecho", pa.string()),
+        ("candidato_doc_id", pa.string()), ("candidato_block_id", pa.int64()),
+        ("candidato_start_word", pa.int64()), ("candidato_end_word", pa.int64()),
+        ("n_trechos_literais", pa.int64()),
+        ("score_final", pa.float64()), ("score_lex_raw", pa.float64()), ("score_sem_raw", pa.float64()),
+        ("score_lex_norm", pa.float64()), ("score_sem_norm", pa.float64()),
+    ])
+
+
+def _load_checkpoint(path: str) -> List[Dict]:
+    """Entradas {"ids", "mark"} do checkpoint, ignorando uma última linha truncada."""
+    entries: List[Dict] = []
+    if not os.path.exists(path):
+        return entries
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return entries
+
+
+def _rewrite_checkpoint(path: str, entries: List[Dict]) -> None:
+    """Regrava só as entradas válidas (escrita atômica), antes de voltar a acrescentar."""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+
+
+def _chunks(essays: Iterator[Essay], size: int, skip: Set[str]) -> Iterator[List[Essay]]:
+    chunk: List[Essay] = []
+    for essay in essays:
+        if essay[0] in skip:
+            continue
+        chunk.append(essay)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_batch(
+    path_in: str,
+    path_out: str,
+    workers: int = 1,
+    chunk_essays: int = 32,
+    resume: bool = False,
+) -> Dict[str, float]:
+    """
+    Compara todas as redações de `path_in` e grava os resultados em `path_out`
+    (.jsonl ou .parquet). Retorna estatísticas (redações, janelas, segundos).
+    """
+    parquet = path_out.endswith(".parquet")
+    os.makedirs(os.path.dirname(os.path.abspath(path_out)), exist_ok=True)
+    checkpoint_path = path_out + ".checkpoint"
+    entries = _load_checkpoint(checkpoint_path) if resume else []
+    _rewrite_checkpoint(checkpoint_path, entries)
+    done = {essay_id for entry in entries for essay_id in entry["ids"]}
+    marks = [entry["mark"] for entry in entries]
+    if done:
+        print(f"🔁 Retomando: {len(done)} redações já processadas")
+
+    output = _ParquetOutput(path_out, set(marks)) if parquet else _JsonlOutput(path_out, marks[-1] if marks else None)
+    workers = max(1, int(workers))
+    chunks = _chunks(iter_essays(path_in), max(1, int(chunk_essays)), done)
+    stats = {"essays": 0, "windows": 0, "seconds": 0.0}
+    t0 = time.perf_counter()
+
+    def record(essays: List[Essay], results: List[List[Dict]], n_windows: int, checkpoint) -> None:
+        mark = output.write(essays, results)
+        checkpoint.write(json.dumps({"ids": [essay_id for essay_id, _ in essays], "mark": mark}, ensure_ascii=False) + "\n")
+        checkpoint.flush()
+        stats["essays"] += len(essays)
+        stats["windows"] += n_windows
+        elapsed = time.perf_counter() - t0
+        print(f"   • {stats['essays']} redações | {stats['essays'] / elapsed:.1f} redações/s | "
+              f"{stats['windows'] / elapsed:.0f} janelas/s", flush=True)
+
+    try:
+        with open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+            if workers == 1:
+                compare_service.warm()
+                for chunk in chunks:
+                    record(*_compare_chunk(chunk), checkpoint)
+            else:
+                threads = max(1, (os.cpu_count() or 1) // workers)
+                with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(threads,)) as pool:
+                    pending = set()
+                    for chunk in chunks:
+                        pending.add(pool.submit(_compare_chunk, chunk))
+                        if len(pending) >= 2 * workers:  # no máx. 2 lotes por processo em voo
+                            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            for future in finished:
+                                record(*future.result(), checkpoint)
+                    for future in pending:
+                        record(*future.result(), checkpoint)
+    finally:
+        output.close()
+
+    stats["seconds"] = time.perf_counter() - t0
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara um lote de redações contra os índices.")
+    parser.add_argument("input", help="diretório de .txt ou arquivo .jsonl ({\"id\", \"text\"})")
+    parser.add_argument("output", help="arquivo .jsonl ou diretório .parquet de saída")
+    parser.add_argument("--workers", type=int, default=settings.BATCH_WORKERS)
+    parser.add_argument("--chunk-essays", type=int, default=settings.BATCH_CHUNK_ESSAYS)
+    parser.add_argument("--resume", action="store_true", help="continua a partir do checkpoint da saída")
+    args = parser.parse_args()
+
+    result = run_batch(args.input, args.output, args.workers, args.chunk_essays, args.resume)
+    print(f"✅ {result['essays']} redações em {result['seconds']:.1f}s -> {args.output}")
@@ -0,0 +1,151 @@
+# src/batching.py
+# Lotes dinâmicos por orçamento de tokens para o SentenceTransformer.
+#
+# model.encode com batch_size fixo preenche cada lote até o texto mais longo dele:
+# misturar janelas de 40 palavras com caudas curtas (ou redações de tamanhos variados)
+# gasta CPU com padding. Aqui os textos são ordenados por nº de tokens, agrupados em
+# lotes com no máximo `max_tokens` tokens COM padding (len(lote) x maior texto) e o
+# resultado volta na ordem original. Eficiência de padding e vazão ficam em
+# ENCODE_METRICS.
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+import numpy as np
+
+
+@dataclass
+class BatchingMetrics:
+    """Contadores acumulados das chamadas de encode (por processo)."""
+    texts: int = 0
+    batches: int = 0
+    real_tokens: int = 0      # tokens efetivos (sem padding)
+    padded_tokens: int = 0    # tokens processados (len(lote) x maior texto do lote)
+    seconds: float = 0.0
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+
+    def record(self, texts: int, batches: int, real_tokens: int, padded_tokens: int, seconds: float) -> None:
+        with self._lock:
+            self.texts += texts
+            self.batches += batches
+            self.real_tokens += real_tokens
+            self.padded_tokens += padded_tokens
+            self.seconds += seconds
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "texts": self.texts,
+                "batches": self.batches,
+                "real_tokens": self.real_tokens,
+                "padded_tokens": self.padded_tokens,
+                "padding_efficiency": (self.real_tokens / self.padded_tokens) if self.padded_tokens else 1.0,
+                "texts_per_second": (self.texts / self.seconds) if self.seconds else 0.0,
+                "tokens_per_second": (self.real_tokens / self.seconds) if self.seconds else 0.0,
+            }
+
+    def counters(self) -> Dict[str, float]:
+        """Contadores brutos (picklable), para somar em outro processo via record(**...)."""
+        with self._lock:
+            return {
+                "texts": self.texts,
+                "batches": self.batches,
+                "real_tokens": self.real_tokens,
+                "padded_tokens": self.padded_tokens,
+                "seconds": self.seconds,
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self.texts = self.batches = self.real_tokens = self.padded_tokens = 0
+            self.seconds = 0.0
+
+
+ENCODE_METRICS = BatchingMetrics()
+
+
+def token_lengths(texts: Sequence[str], model=None) -> np.ndarray:
+    """
+    Nº de tokens de cada texto segundo o tokenizer do modelo (com tokens especiais,
+    truncado em max_seq_length). Sem tokenizer, usa o nº de palavras + 2 como estimativa.
+    """
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is None:
+        return np.asarray([len(t.split()) + 2 for t in texts], dtype=np.int64)
+    max_len = getattr(model, "max_seq_length", None)
+    encoded = tokenizer(list(texts), add_special_tokens=True, truncation=max_len is not None, max_length=max_len)
+    return np.asarray([len(ids) for ids in encoded["input_ids"]], dtype=np.int64)
+
+
+def plan_batches(lengths: np.ndarray, max_tokens: int, max_batch_size: int) -> List[np.ndarray]:
+    """
+    Agrupa os índices dos textos em lotes: ordena por comprimento (desc, estável) e
+    fecha o lote quando (len(lote) + 1) x maior_comprimento excederia max_tokens ou o
+    lote atingiria max_batch_size. Um texto sozinho sempre forma um lote válido.
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    order = np.argsort(-lengths, kind="stable")
+    max_tokens = max(1, int(max_tokens))
+    max_batch_size = max(1, int(max_batch_size))
+
+    batches: List[np.ndarray] = []
+    start = 0
+    while start < len(order):
+        longest = max(1, int(lengths[order[start]]))  # ordem desc: o 1º é o maior do lote
+        size = max(1, min(max_batch_size, max_tokens // longest))
+        batches.append(order[start:start + size])
+        start += size
+    return batches
+
+
+def encode_bucketed(
+    texts: Sequence[str],
+    encode_batch: Callable[[List[str]], np.ndarray],
+    lengths: np.ndarray,
+    max_tokens: int,
+    max_batch_size: int,
+    metrics: Optional[BatchingMetrics] = ENCODE_METRICS,
+) -> np.ndarray:
+    """
+    Codifica `texts` em lotes por orçamento de tokens (plan_batches) e devolve a
+    matriz (N x dim) na ordem original. `encode_batch` recebe um lote já pronto.
+    """
+    if len(texts) == 0:
+        return np.zeros((0, 0), dtype=np.float32)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    t0 = time.perf_counter()
+    out: Optional[np.ndarray] = None
+    padded = 0
+    batches = plan_batches(lengths, max_tokens, max_batch_size)
+    for batch in batches:
+        emb = np.asarray(encode_batch([texts[i] for i in batch]), dtype=np.float32)
+        if out is None:
+            out = np.empty((len(texts), emb.shape[1]), dtype=np.float32)
+        out[batch] = emb
+        padded += len(batch) * int(lengths[batch].max())
+    if metrics is not None:
+        metrics.record(len(texts), len(batches), int(lengths.sum()), padded, time.perf_counter() - t0)
+    return out
+
+
+def encode_with_model(
+    model,
+    texts: Sequence[str],
+    max_tokens: int,
+    max_batch_size: int,
+    metrics: Optional[BatchingMetrics] = ENCODE_METRICS,
+) -> np.ndarray:
+    """Atalho para um SentenceTransformer: embeddings normalizados por lotes de tokens."""
+    texts = list(texts)
+    return encode_bucketed(
+        texts,
+        lambda batch: model.encode(batch, batch_size=len(batch), convert_to_numpy=True,
+                                   normalize_embeddings=True, show_progress_bar=False),
+        token_lengths(texts, model),
+        max_tokens,
+        max_batch_size,
+        metrics,
+    )
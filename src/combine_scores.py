@@ -1,13 +1,157 @@
-from typing import List, Tuple, Dict, Set
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
 
+# Tipos de correspondência (campo "match" dos arrays combinados)
+MATCH_TYPES = (None, "plagio_literal", "parafrase")
 
-def _normalize_scores(scores: List[float]) -> List[float]:
-    if not scores:
-        return []
-    min_s, max_s = min(scores), max(scores)
-    if max_s == min_s:
-        return [0.0] * len(scores)
-    return [(s - min_s) / (max_s - min_s) for s in scores]
+# Um candidato combinado; cand = -1 marca posições vazias (menos candidatos que k_final)
+COMBINED_DTYPE = np.dtype([
+    ("cand", np.int64),
+    ("match", np.int8),
+    ("score_final", np.float64),
+    ("score_lex_raw", np.float64),
+    ("score_sem_raw", np.float64),
+    ("score_lex_norm", np.float64),
+    ("score_sem_norm", np.float64),
+])
+
+
+def _normalize_rows(scores: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """Min-max por linha, só sobre as posições válidas (linha constante -> zeros)."""
+    min_s = np.where(valid, scores, np.inf).min(axis=1, keepdims=True)
+    max_s = np.where(valid, scores, -np.inf).max(axis=1, keepdims=True)
+    span = max_s - min_s
+    ok = valid & (span > 0)
+    return np.where(ok, (scores - np.where(ok, min_s, 0.0)) / np.where(ok, span, 1.0), 0.0)
+
+
+def candidate_arrays(tops: Sequence[Sequence[Tuple[str, float]]], codes: Dict[str, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Listas [(uid, score), ...] por janela -> matrizes (janelas x k) de códigos e scores.
+    Os uids são codificados em `codes` (compartilhado entre léxico e semântico);
+    posições sem candidato têm código -1 e score 0.
+    """
+    k = max((len(top) for top in tops), default=0)
+    ids = np.full((len(tops), k), -1, dtype=np.int64)
+    scores = np.zeros((len(tops), k), dtype=np.float64)
+    for row, top in enumerate(tops):
+        if top:
+            ids[row, :len(top)] = [codes.setdefault(uid, len(codes)) for uid, _ in top]
+            scores[row, :len(top)] = [s for _, s in top]
+    return ids, scores
+
+
+def combine_scores_batch(
+    lex_ids: np.ndarray,
+    lex_scores: np.ndarray,
+    sem_ids: np.ndarray,
+    sem_scores: np.ndarray,
+    k_final: int,
+    alpha: float = 0.6,
+    tau_lex: float = 0.85,
+    tau_sem: float = 0.85,
+    delta_para: float = 0.15,
+    min_gate: float = 0.10,
+) -> np.ndarray:
+    """
+    Versão vetorizada de combine_scores para TODAS as janelas de uma vez.
+    Entradas: matrizes (janelas x k) de códigos de candidatos (-1 = vazio) e scores
+    BRUTOS, léxicas e semânticas. Mesmas regras de combine_scores, em operações de
+    array: união por janela, normalização min-max, classificação e ordenação.
+    Retorna array estruturado (janelas x k_final) com COMBINED_DTYPE, cada linha
+    ordenada por score_final desc (empates pelo menor código de candidato).
+    """
+    lex_ids = np.asarray(lex_ids, dtype=np.int64)
+    sem_ids = np.asarray(sem_ids, dtype=np.int64)
+    n_windows = max(len(lex_ids), len(sem_ids))
+    lex_ids = lex_ids.reshape(n_windows, -1)
+    sem_ids = sem_ids.reshape(n_windows, -1)
+    k_lex, k_sem = lex_ids.shape[1], sem_ids.shape[1]
+    out = np.zeros((n_windows, max(0, int(k_final))), dtype=COMBINED_DTYPE)
+    out["cand"] = -1
+    if out.shape[1] == 0 or k_lex + k_sem == 0:
+        return out
+
+    # --- União: candidatos léxicos e semânticos lado a lado, ordenados por código;
+    # um mesmo candidato nos dois lados vira um par de vizinhos, fundido no 1º
+    ids = np.concatenate([lex_ids, sem_ids], axis=1)
+    raw_lex = np.concatenate([np.asarray(lex_scores, dtype=np.float64).reshape(n_windows, k_lex),
+                              np.zeros((n_windows, k_sem))], axis=1)
+    raw_sem = np.concatenate([np.zeros((n_windows, k_lex)),
+                              np.asarray(sem_scores, dtype=np.float64).reshape(n_windows, k_sem)], axis=1)
+    order = np.argsort(ids, axis=1, kind="stable")
+    ids = np.take_along_axis(ids, order, axis=1)
+    raw_lex = np.take_along_axis(raw_lex, order, axis=1)
+    raw_sem = np.take_along_axis(raw_sem, order, axis=1)
+
+    dup = (ids[:, 1:] == ids[:, :-1]) & (ids[:, 1:] >= 0)
+    raw_lex[:, :-1] += np.where(dup, raw_lex[:, 1:], 0.0)
+    raw_sem[:, :-1] += np.where(dup, raw_sem[:, 1:], 0.0)
+    valid = ids >= 0
+    valid[:, 1:] &= ~dup
+
+    # --- Normalização apenas para composição do score_final / exibição
+    norm_lex = _normalize_rows(raw_lex, valid)
+    norm_sem = _normalize_rows(raw_sem, valid)
+    final = alpha * norm_lex + (1 - alpha) * norm_sem
+
+    # --- Classificação com scores BRUTOS
+    gate = np.maximum(raw_lex, raw_sem) >= min_gate
+    literal = gate & (raw_lex >= tau_lex) & (raw_sem >= tau_sem)
+    parafrase = gate & ~literal & (raw_sem >= tau_sem) & (raw_lex <= max(tau_lex - delta_para, 0.0))
+    match = np.where(literal, 1, np.where(parafrase, 2, 0)).astype(np.int8)
+
+    # --- Ranking: válidos por score_final desc; os k_final primeiros de cada linha
+    k = min(out.shape[1], ids.shape[1])
+    rank = np.argsort(np.where(valid, -final, np.inf), axis=1, kind="stable")[:, :k]
+
+    def take(values: np.ndarray) -> np.ndarray:
+        return np.take_along_axis(values, rank, axis=1)
+
+    kept = take(valid)
+    out["cand"][:, :k] = np.where(kept, take(ids), -1)
+    out["match"][:, :k] = np.where(kept, take(match), 0)
+    for field, values in (("score_final", final), ("score_lex_raw", raw_lex), ("score_sem_raw", raw_sem),
+                          ("score_lex_norm", norm_lex), ("score_sem_norm", norm_sem)):
+        out[field][:, :k] = np.where(kept, take(values), 0.0)
+    return out
+
+
+def combine_tops(
+    tops_lex: Sequence[Sequence[Tuple[str, float]]],
+    tops_sem: Sequence[Sequence[Tuple[str, float]]],
+    k_final: int,
+    **params,
+) -> Tuple[np.ndarray, List[str]]:
+    """
+    combine_scores_batch a partir das listas [(uid, score), ...] de cada janela
+    (saída das buscas em lote). Retorna (array combinado, uids), em que
+    uids[cand] é o uid de cada candidato.
+    """
+    codes: Dict[str, int] = {}
+    lex_ids, lex_scores = candidate_arrays(tops_lex, codes)
+    sem_ids, sem_scores = candidate_arrays(tops_sem, codes)
+    combined = combine_scores_batch(lex_ids, lex_scores, sem_ids, sem_scores, k_final, **params)
+    return combined, list(codes)
+
+
+def combined_to_dicts(row: np.ndarray, uids: Sequence[str]) -> List[Dict]:
+    """Visão em dicts (formato de combine_scores) de uma linha do array combinado."""
+    combined: List[Dict] = []
+    for item in row[row["cand"] >= 0].tolist():
+        cand, match, score_final, s_lex_raw, s_sem_raw, s_lex_norm, s_sem_norm = item
+        match_type = MATCH_TYPES[match]
+        combined.append({
+            "doc_id": uids[cand],
+            "score_final": score_final,
+            "score_lex_raw": s_lex_raw,
+            "score_sem_raw": s_sem_raw,
+            "score_lex_norm": s_lex_norm,
+            "score_sem_norm": s_sem_norm,
+            "flags": [match_type] if match_type else [],
+            "match_type": match_type,
+        })
+    return combined
 
 
 def combine_scores(
@@ -32,58 +176,13 @@ def combine_scores(
         "score_lex_norm": float, "score_sem_norm": float,
         "flags": List[str], "match_type": str | None
       }
+    Visão sobre combine_scores_batch (uma janela); para muitas janelas, use
+    combine_tops/combine_scores_batch diretamente.
     """
     if not top_lex and not top_sem:
         return []
-
-    lex_dict = dict(top_lex)
-    sem_dict = dict(top_sem)
-
-    # --- União dos doc_ids preservando diversidade de fontes
-    ids: Set[str] = set(lex_dict.keys()) | set(sem_dict.keys())
-    if not ids:
-        return []
-
-    # Scores BRUTOS alinhados por id
-    raw_lex = [float(lex_dict.get(doc_id, 0.0)) for doc_id in ids]
-    raw_sem = [float(sem_dict.get(doc_id, 0.0)) for doc_id in ids]
-    ids_list = list(ids)
-
-    # Normalização apenas para composição do score_final / exibição
-    norm_lex = _normalize_scores(raw_lex)
-    norm_sem = _normalize_scores(raw_sem)
-
-    combined: List[Dict] = []
-    for doc_id, s_lex_raw, s_sem_raw, s_lex_norm, s_sem_norm in zip(
-        ids_list, raw_lex, raw_sem, norm_lex, norm_sem
-    ):
-        score_final = alpha * s_lex_norm + (1 - alpha) * s_sem_norm
-
-        # --- Classificação com scores BRUTOS ---
-        flags: List[str] = []
-        match_type = None
-
-        # Filtro anti-ruído: ignora candidatos fracos em ambos os eixos
-        if max(s_lex_raw, s_sem_raw) >= min_gate:
-            # Plágio literal: alto nos dois eixos
-            if (s_lex_raw >= tau_lex) and (s_sem_raw >= tau_sem):
-                flags.append("plagio_literal")
-                match_type = "plagio_literal"
-            # Paráfrase: semântico alto + léxico relativamente baixo
-            elif (s_sem_raw >= tau_sem) and (s_lex_raw <= max(tau_lex - delta_para, 0.0)):
-                flags.append("parafrase")
-                match_type = "parafrase"
-
-        combined.append({
-            "doc_id": doc_id,
-            "score_final": float(score_final),
-            "score_lex_raw": float(s_lex_raw),
-            "score_sem_raw": float(s_sem_raw),
-            "score_lex_norm": float(s_lex_norm),
-            "score_sem_norm": float(s_sem_norm),
-            "flags": flags,
-            "match_type": match_type,
-        })
-
-    combined.sort(key=lambda x: x["score_final"], reverse=True)
-    return combined[:k_final]
+    combined, uids = combine_tops(
+        [top_lex], [top_sem], k_final,
+        alpha=alpha, tau_lex=tau_lex, tau_sem=tau_sem, delta_para=delta_para, min_gate=min_gate,
+    )
+    return combined_to_dicts(combined[0], uids)
@@ -1,6 +1,103 @@
 from typing import List, Tuple
-from sklearn.feature_extraction.text import TfidfVectorizer
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer, TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.pipeline import make_pipeline
+
+from src.metrics import METRICS
+from src.topk import top_k_indices
+
+
+LEX_FEATURE_MODES = ("vocab", "pruned", "hashing")
+
+
+def make_tfidf_vectorizer(mode: str = "vocab", min_df: int = 2, n_features: int = 2 ** 20):
+    """
+    Vetorizador TF-IDF de 1 a 5-gramas (sem lowercase) usado no índice léxico.
+    - "vocab":   vocabulário completo (todos os n-gramas do corpus)
+    - "pruned":  só n-gramas presentes em pelo menos `min_df` blocos
+    - "hashing": HashingVectorizer (sem vocabulário; `n_features` colunas) + IDF persistido
+    Todos produzem linhas L2-normalizadas, compatíveis com _lexical_scores.
+    """
+    if mode == "vocab":
+        return TfidfVectorizer(stop_words=None, lowercase=False, ngram_range=(1, 5))
+    if mode == "pruned":
+        return TfidfVectorizer(stop_words=None, lowercase=False, ngram_range=(1, 5), min_df=min_df)
+    if mode == "hashing":
+        return make_pipeline(
+            HashingVectorizer(lowercase=False, ngram_range=(1, 5), n_features=n_features,
+                              alternate_sign=False, norm=None, dtype=np.float32),
+            TfidfTransformer(),
+        )
+    raise ValueError(f"Modo de features léxicas desconhecido: {mode!r} (use {', '.join(LEX_FEATURE_MODES)})")
+
+
+def build_postings(tfidf_matrix) -> sparse.csr_matrix:
+    """
+    Constrói o layout invertido do índice TF-IDF: matriz (n_termos x n_blocos) em CSR,
+    em que a linha t é a posting list do n-grama t (blocos em que aparece + pesos).
+    Deve ser calculado UMA vez ao carregar o índice.
+    """
+    return sparse.csr_matrix(tfidf_matrix).T.tocsr()
+
+
+def _is_l2_normalized(tfidf_model) -> bool:
+    # Pipelines/vetorizadores sem atributo `norm` são tratados como L2 (padrão do sklearn)
+    return getattr(tfidf_model, "norm", "l2") == "l2"
+
+
+def _lexical_scores(query_vecs, tfidf_model, tfidf_matrix, postings=None):
+    """
+    Scores de cosseno (n_consultas x n_blocos).
+    Com linhas L2-normalizadas (padrão do TfidfVectorizer), cosseno == produto interno:
+    q · postings percorre apenas as posting lists dos n-gramas presentes na consulta,
+    e o custo escala com os termos da consulta, não com o tamanho do corpus.
+    Retorna matriz esparsa (CSR, índices ordenados) ou densa, no caso de fallback.
+    """
+    if not _is_l2_normalized(tfidf_model):
+        return cosine_similarity(query_vecs, tfidf_matrix)
+
+    if postings is None:
+        postings = build_postings(tfidf_matrix)
+    scores = sparse.csr_matrix(query_vecs @ postings)
+    scores.eliminate_zeros()
+    scores.sort_indices()
+    return scores
+
+
+def _top_k_row(scores, row: int, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k de UMA linha de scores (esparsa ou densa) -> (índices_dos_blocos, scores).
+    No caso esparso, só os blocos com score > 0 são ordenados; se houver menos de k,
+    completa com blocos de score 0 pelos menores índices (mesmo desempate do top_k_indices).
+    """
+    if not sparse.issparse(scores):
+        idx = top_k_indices(scores[row], k)
+        return idx, scores[row, idx]
+
+    n_blocks = scores.shape[1]
+    k = min(k, n_blocks)
+    start, end = scores.indptr[row], scores.indptr[row + 1]
+    hits = scores.indices[start:end]
+    values = scores.data[start:end]
+
+    # índices ordenados => desempate por posição == desempate por índice do bloco
+    sel = top_k_indices(values, k)
+    idx, vals = hits[sel], values[sel]
+
+    missing = k - len(idx)
+    if missing > 0:
+        hit_set = set(hits.tolist())
+        pad = []
+        j = 0
+        while len(pad) < missing:
+            if j not in hit_set:
+                pad.append(j)
+            j += 1
+        idx = np.concatenate([idx, np.asarray(pad, dtype=idx.dtype)])
+        vals = np.concatenate([vals, np.zeros(missing, dtype=vals.dtype)])
+    return idx, vals
 
 
 def compare_lexical(
@@ -8,17 +105,82 @@ def compare_lexical(
     tfidf_model: TfidfVectorizer,
     tfidf_matrix,
     id_map: List[str],
-    top_n: int = 5
+    top_n: int = 5,
+    postings=None,
 ) -> List[Tuple[str, float]]:
     """
     Compara UM bloco de texto contra o índice TF-IDF (que deve ter sido criado sobre BLOCOS).
+    `postings` (opcional) é o layout invertido pré-calculado com build_postings.
     Retorna [(block_id_map_entry, score_cosine), ...] ordenado por score desc.
     """
     if not query_block:
         return []
 
     query_vec = tfidf_model.transform([query_block])
-    scores = cosine_similarity(query_vec, tfidf_matrix)[0]
-    top_indices = scores.argsort()[::-1][:top_n]
-    return [(id_map[i]["uid"], float(scores[i])) for i in top_indices]
+    scores = _lexical_scores(query_vec, tfidf_model, tfidf_matrix, postings)
+    top_indices, top_scores = _top_k_row(scores, 0, top_n)
+    return [(id_map[i]["uid"], float(s)) for i, s in zip(top_indices, top_scores)]
+
+
+def compare_lexical_batch(
+    query_blocks: List[str],
+    tfidf_model: TfidfVectorizer,
+    tfidf_matrix,
+    id_map: List[str],
+    top_n: int = 5,
+    postings=None,
+) -> List[List[Tuple[str, float]]]:
+    """
+    Versão em lote de compare_lexical: vetoriza TODOS os blocos num único transform
+    e calcula as similaridades com um único produto esparso.
+    Retorna uma lista por bloco, na mesma ordem de query_blocks
+    (blocos vazios resultam em lista vazia).
+    """
+    results: List[List[Tuple[str, float]]] = [[] for _ in query_blocks]
+    positions = [i for i, q in enumerate(query_blocks) if q]
+    if not positions:
+        return results
+
+    with METRICS.stage("tfidf_transform"):
+        query_vecs = tfidf_model.transform([query_blocks[i] for i in positions])
+    with METRICS.stage("lexical_scoring"):
+        scores = _lexical_scores(query_vecs, tfidf_model, tfidf_matrix, postings)
+        for row, pos in enumerate(positions):
+            top_indices, top_scores = _top_k_row(scores, row, top_n)
+            results[pos] = [(id_map[i]["uid"], float(s)) for i, s in zip(top_indices, top_scores)]
+    return results
+
+
+def compare_lexical_candidates(
+    query_blocks: List[str],
+    tfidf_model: TfidfVectorizer,
+    tfidf_matrix,
+    id_map: List[str],
+    candidates: List[np.ndarray],
+    top_n: int = 5,
+) -> List[List[Tuple[str, float]]]:
+    """
+    Versão de compare_lexical_batch restrita a um conjunto de blocos por consulta
+    (ex.: candidatos do pré-filtro MinHash/LSH): o cosseno só é calculado contra as
+    linhas candidatas, com custo proporcional ao nº de candidatos e não ao corpus.
+    Blocos fora de `candidates[i]` não aparecem no resultado da consulta i.
+    """
+    results: List[List[Tuple[str, float]]] = [[] for _ in query_blocks]
+    positions = [i for i, q in enumerate(query_blocks) if q and len(candidates[i])]
+    if not positions:
+        return results
 
+    with METRICS.stage("tfidf_transform"):
+        query_vecs = tfidf_model.transform([query_blocks[i] for i in positions])
+    normalized = _is_l2_normalized(tfidf_model)
+    with METRICS.stage("lexical_scoring"):
+        for row, pos in enumerate(positions):
+            cand = np.unique(np.asarray(candidates[pos], dtype=np.int64))
+            rows = tfidf_matrix[cand]
+            if normalized:
+                scores = np.asarray((query_vecs[row] @ rows.T).todense()).ravel()
+            else:
+                scores = cosine_similarity(query_vecs[row], rows).ravel()
+            sel = top_k_indices(scores, top_n)
+            results[pos] = [(id_map[int(cand[i])]["uid"], float(scores[i])) for i in sel]
+    return results
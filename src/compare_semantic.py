@@ -1,22 +1,128 @@
+import atexit
 import functools
-from typing import List, Tuple
+import warnings
+from typing import Dict, List, Optional, Tuple
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+
+from src.ann_index import IVFIndex, search_ivf
+from src.batching import encode_with_model
+from src.config import settings
+from src.embedding_cache import EmbeddingCache, cached_encode, open_cache
+from src.metrics import METRICS
+from src.quantized_index import QuantizedIndex, search_quantized
+from src.topk import top_k_indices
 
 # Carregamento lazy + cache do modelo para evitar download/instancia repetida
 @functools.lru_cache(maxsize=2)
 def _get_model(model_name: str):
+    if settings.SEM_BACKEND == "onnx":
+        model = _get_onnx_model(model_name)
+        if model is not None:
+            return model
     from sentence_transformers import SentenceTransformer  # import tardio
     return SentenceTransformer(model_name)
 
 
+def _get_onnx_model(model_name: str):
+    """
+    Codificador ONNX exportado por `python -m src.onnx_backend export`.
+    Sem onnxruntime/transformers ou sem o modelo exportado, retorna None
+    (e o modelo torch é usado).
+    """
+    try:
+        from src.onnx_backend import OnnxEncoder, model_dir
+        return OnnxEncoder(model_dir(settings.SEM_ONNX_DIR, model_name))
+    except (ImportError, OSError) as e:
+        warnings.warn(f"Backend ONNX indisponível ({e}); usando o modelo torch.")
+        return None
+
+
+def _encoder_backend(model_name: str) -> str:
+    """
+    Backend que de fato gera os vetores de consulta: "torch" ou "onnx-<arquivo>"
+    (ex.: onnx-model_int8.onnx), que separa no cache os vetores do ONNX (int8 ou
+    float32) dos vetores torch do corpus.
+    """
+    if settings.SEM_BACKEND != "onnx":
+        return "torch"
+    onnx_file = getattr(_get_model(model_name), "config", {}).get("onnx_file")
+    return f"onnx-{onnx_file}" if onnx_file else "torch"  # sem ONNX: fallback para o torch
+
+
+@functools.lru_cache(maxsize=4)
+def get_embedding_cache(model_name: str, backend: str = "torch") -> Optional[EmbeddingCache]:
+    """Cache persistente de embeddings do modelo/backend (None se EMB_CACHE_DIR estiver vazio)."""
+    cache = open_cache(settings.EMB_CACHE_DIR, model_name, settings.EMB_CACHE_MAX_ITEMS, backend)
+    if cache is not None:
+        atexit.register(cache.flush)
+    return cache
+
+
+def _encode(texts: List[str], model_name: str) -> np.ndarray:
+    # lotes por orçamento de tokens: redações de tamanhos variados geram pouco padding
+    return encode_with_model(_get_model(model_name), texts, settings.ENCODE_MAX_TOKENS, settings.ENCODE_BATCH_SIZE)
+
+
 def embed_texts(texts: List[str], model_name: str) -> np.ndarray:
     """
     Gera embeddings normalizados (L2) para uma lista de textos.
+    Textos já vistos (mesmo modelo, backend e texto normalizado) vêm do cache persistente.
     """
-    model = _get_model(model_name)
-    emb = model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
-    return emb
+    cache = get_embedding_cache(model_name, _encoder_backend(model_name)) if settings.EMB_CACHE_DIR else None
+    return cached_encode(texts, lambda batch: _encode(batch, model_name), cache)
+
+
+# Normas das linhas dos embeddings indexados, calculadas uma vez por array.
+# O índice é aberto via mmap: cosine_similarity criaria uma cópia normalizada
+# da matriz inteira a cada chamada.
+_NORMS_CACHE: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+_NORMS_CACHE_SIZE = 2
+
+
+def _row_norms(embeddings: np.ndarray) -> np.ndarray:
+    hit = _NORMS_CACHE.get(id(embeddings))
+    if hit is not None and hit[0] is embeddings:
+        return hit[1]
+    norms = np.sqrt(np.einsum("ij,ij->i", embeddings, embeddings))
+    norms[norms == 0] = 1.0
+    while len(_NORMS_CACHE) >= _NORMS_CACHE_SIZE:
+        _NORMS_CACHE.pop(next(iter(_NORMS_CACHE)))
+    _NORMS_CACHE[id(embeddings)] = (embeddings, norms)
+    return norms
+
+
+def _cosine_scores(query_vecs: np.ndarray, embeddings: np.ndarray) -> np.ndarray:
+    """Cosseno (n_consultas x n_blocos) sem copiar a matriz de embeddings."""
+    query_vecs = np.atleast_2d(np.asarray(query_vecs, dtype=np.float32))
+    q_norms = np.linalg.norm(query_vecs, axis=1, keepdims=True)
+    q_norms[q_norms == 0] = 1.0
+    return (query_vecs / q_norms) @ np.asarray(embeddings).T / _row_norms(embeddings)
+
+
+def _search(
+    query_vecs: np.ndarray,
+    embeddings: np.ndarray,
+    k: int,
+    ann_index: Optional[IVFIndex] = None,
+    nprobe: int = 8,
+    quant_index: Optional[QuantizedIndex] = None,
+    rerank_factor: int = 4,
+) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Top-k de cada consulta -> [(índices_dos_blocos, scores), ...].
+    Sem ann_index: força bruta exata (um único produto denso).
+    Com ann_index: busca IVF aproximada (embeddings já L2-normalizados pelo pipeline).
+    Com quant_index: varredura sobre vetores float16/int8 + re-rank exato dos
+    k * rerank_factor melhores (ver src/quantized_index.py).
+    """
+    if ann_index is not None:
+        return search_ivf(ann_index, embeddings, query_vecs, k, nprobe=nprobe)
+    if quant_index is not None:
+        return search_quantized(quant_index, embeddings, query_vecs, k, rerank_factor=rerank_factor)
+
+    scores = _cosine_scores(query_vecs, embeddings)
+    top_indices = top_k_indices(scores, k)
+    return [(idx, scores[row, idx]) for row, idx in enumerate(top_indices)]
 
 
 def semantic_top_k(
@@ -24,16 +130,52 @@ def semantic_top_k(
     embeddings: np.ndarray,
     id_map: List[str],
     model_name: str,
-    k: int = 10
+    k: int = 10,
+    ann_index: Optional[IVFIndex] = None,
+    nprobe: int = 8,
+    quant_index: Optional[QuantizedIndex] = None,
+    rerank_factor: int = 4,
 ) -> List[Tuple[str, float]]:
     """
     Compara UM bloco de texto (query_block) contra embeddings indexados (de blocos).
+    Se ann_index (IVF) for informado, a busca é aproximada (ver src/ann_index.py);
+    se quant_index for informado, usa o índice quantizado com re-rank exato.
     Retorna [(block_id_map_entry, score_cosine), ...] ordenado por score desc.
     """
     if not query_block:
         return []
 
     query_vec = embed_texts([query_block], model_name)  # shape (1, d)
-    scores = cosine_similarity(query_vec, embeddings)[0]
-    top_indices = np.argsort(scores)[::-1][:k]
-    return [(id_map[i]["uid"], float(scores[i])) for i in top_indices]
+    top_indices, top_scores = _search(query_vec, embeddings, k, ann_index, nprobe, quant_index, rerank_factor)[0]
+    return [(id_map[i]["uid"], float(s)) for i, s in zip(top_indices, top_scores)]
+
+
+def semantic_top_k_batch(
+    query_blocks: List[str],
+    embeddings: np.ndarray,
+    id_map: List[str],
+    model_name: str,
+    k: int = 10,
+    ann_index: Optional[IVFIndex] = None,
+    nprobe: int = 8,
+    quant_index: Optional[QuantizedIndex] = None,
+    rerank_factor: int = 4,
+) -> List[List[Tuple[str, float]]]:
+    """
+    Versão em lote de semantic_top_k: gera os embeddings de TODOS os blocos numa
+    única chamada ao modelo e calcula as similaridades com um único produto denso.
+    Retorna uma lista por bloco, na mesma ordem de query_blocks
+    (blocos vazios resultam em lista vazia).
+    """
+    results: List[List[Tuple[str, float]]] = [[] for _ in query_blocks]
+    positions = [i for i, q in enumerate(query_blocks) if q]
+    if not positions:
+        return results
+
+    with METRICS.stage("embedding"):
+        query_vecs = embed_texts([query_blocks[i] for i in positions], model_name)  # shape (n, d)
+    with METRICS.stage("semantic_scoring"):
+        hits = _search(query_vecs, embeddings, k, ann_index, nprobe, quant_index, rerank_factor)
+        for pos, (top_indices, top_scores) in zip(positions, hits):
+            results[pos] = [(id_map[i]["uid"], float(s)) for i, s in zip(top_indices, top_scores)]
+    return results
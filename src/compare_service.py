@@ -1,20 +1,35 @@
 # src/compare_service.py
 # Orquestra a comparação por BLOCOS (janelas) e retorna saída estruturada por bloco.
 
-from typing import List, Dict, Any
+from collections.abc import Mapping, Sequence
+from typing import List, Dict, Any, Optional, Tuple, Union
+import numpy as np
 from src.config import settings
-from src import io_utils
 from src import compare_lexical, compare_semantic, combine_scores
-from src.preprocess import build_windows, extend_context
+from src.fingerprint_index import find_spans
+from src.index_store import Indexes, IndexStore
+from src.metrics import METRICS, profile_request
+from src.minhash_lsh import query_lsh
+from src.preprocess import TokenizedText, build_windows, extend_context, tokenize
+from src.result_cache import ResultCache, result_key
 
-# --- Carrega índices apenas uma vez ---
-TFIDF_MODEL, TFIDF_MATRIX, ID_MAP_LEX = io_utils.load_index_lexical(settings.INDEX_LEX_DIR)
-EMBEDDINGS, ID_MAP_SEM, MODEL_NAME = io_utils.load_index_semantic(settings.INDEX_SEM_DIR)
+# --- Índices: carregados uma única vez, na 1ª comparação (ou em warm()), e
+# recarregados quando o pipeline grava uma nova versão (INDEX_RELOAD_SECONDS) ---
+STORE = IndexStore(settings)
+
+
+# --- Caches de resultados (src/result_cache.py): redações inteiras e janelas ---
+RESULT_CACHE = ResultCache(settings.RESULT_CACHE_MAX_ITEMS, settings.RESULT_CACHE_DIR, settings.RESULT_CACHE_DISK_MAX_ITEMS)
+WINDOW_CACHE = ResultCache(settings.WINDOW_CACHE_MAX_ITEMS)
+
+
+def warm() -> None:
+    """Carrega os índices antecipadamente (ex.: na inicialização do app)."""
+    STORE.warm()
 
 
 def _validate_id_map_item(item: Any) -> Dict:
-    """Garante que cada entrada de id_map possua metadados mínimos."""
-    if isinstance(item, dict):
+    if isinstance(item, Mapping):
         required = {"doc_id", "start_word", "end_word", "text"}
         missing = required - set(item.keys())
         if missing:
@@ -41,181 +56,139 @@ def _validate_id_map_item(item: Any) -> Dict:
     }
 
 
-def compare(texto_redacao: str) -> List[Dict]:
+def _lexical_tops(idx: Indexes, bloco_texts: List[str], tops_sem: List[List]) -> List[List]:
     """
-    Executa a comparação por janelas (blocos) da redação contra os índices léxico e semântico.
-    Retorna lista de blocos suspeitos com metadados e scores.
+    Top-K léxico de cada janela. Com o pré-filtro LSH, o cosseno TF-IDF só é
+    calculado para os candidatos do LSH (quase-duplicatas) mais os blocos do top-k
+    semântico; no caso comum, sem cópia, isso são só os K_SEM blocos semânticos.
     """
-    texto = (texto_redacao or "").strip()
-    if not texto:
-        return []
-
-    # Janela de análise
-    windows = build_windows(
-        text=texto,
-        window_size=settings.WINDOW_SIZE,
-        stride=settings.STRIDE,
-    )
-
-    resultados: List[Dict] = []
-
-    for w in windows:
-        bloco_text = w["text"]
-
-        # Top-K léxico e semântico
-        top_lex = compare_lexical.compare_lexical(
-            query_block=bloco_text,
-            tfidf_model=TFIDF_MODEL,
-            tfidf_matrix=TFIDF_MATRIX,
-            id_map=ID_MAP_LEX,
+    if idx.lsh_index is None:
+        return compare_lexical.compare_lexical_batch(
+            query_blocks=bloco_texts,
+            tfidf_model=idx.tfidf_model,
+            tfidf_matrix=idx.tfidf_matrix,
+            id_map=idx.id_map_lex,
             top_n=settings.K_LEX,
+            postings=idx.postings,
         )
 
-        top_sem = compare_semantic.semantic_top_k(
-            query_block=bloco_text,
-            embeddings=EMBEDDINGS,
-            id_map=ID_MAP_SEM,
-            model_name=MODEL_NAME,
-            k=settings.K_SEM,
-        )
-
-        # Combina e classifica
-        combined = combine_scores.combine_scores(
-            top_lex=top_lex,
-            top_sem=top_sem,
-            k_final=settings.K_FINAL,
-            alpha=settings.ALPHA,
-            tau_lex=settings.TAU_LEX,
-            tau_sem=settings.TAU_SEM,
-        )
-
-        if not combined:
-            continue
-
-        best = combined[0]
-        match_type = best.get("match_type")
-        if match_type is None:
-            continue
+    with METRICS.stage("lsh_prefilter"):
+        lsh_hits = query_lsh(idx.lsh_index, bloco_texts)
+    candidates = []
+    for (lsh_rows, _), top_sem in zip(lsh_hits, tops_sem):
+        sem_rows = [row for row in (idx.lex_rows.get(uid) for uid, _ in top_sem) if row is not None]
+        candidates.append(np.union1d(lsh_rows, np.asarray(sem_rows, dtype=np.int64)))
+    return compare_lexical.compare_lexical_candidates(
+        query_blocks=bloco_texts,
+        tfidf_model=idx.tfidf_model,
+        tfidf_matrix=idx.tfidf_matrix,
+        id_map=idx.id_map_lex,
+        candidates=candidates,
+        top_n=settings.K_LEX,
+    )
 
-        # Busca metadados do bloco
-        try:
-            idx_match = next(i for i, v in enumerate(ID_MAP_LEX)
-                             if (v.get("doc_id") if isinstance(v, dict) else str(v)) == best["doc_id"])
-            meta_raw = ID_MAP_LEX[idx_match]
-        except StopIteration:
-            try:
-                idx_match = next(i for i, v in enumerate(ID_MAP_SEM)
-                                 if (v.get("doc_id") if isinstance(v, dict) else str(v)) == best["doc_id"])
-                meta_raw = ID_MAP_SEM[idx_match]
-            except StopIteration:
-                meta_raw = best["doc_id"]
-
-        meta = _validate_id_map_item(meta_raw)
 
-        resultados.append({
-            "bloco_id": int(w["bloco_id"]),
-            "inicio": int(w["start_word"]),
-            "fim": int(w["end_word"]),
-            "trecho": bloco_text,
-            "trecho_contexto": extend_context(
-                text=texto,
-                start_word=w["start_word"],
-                end_word=w["end_word"],
-                margin=settings.CONTEXT_MARGIN
-            ),
-            "tipo": match_type,
-            "melhor_candidato": {
-                "doc_id": meta["doc_id"],
-                "block_id": meta.get("block_id", -1),
-                "start_word": meta.get("start_word", -1),
-                "end_word": meta.get("end_word", -1),
-                "text": meta.get("text", ""),
-            },
-            "scores": {
-                "final": float(best["score_final"]),
-                "lex_raw": float(best["score_lex_raw"]),
-                "sem_raw": float(best["score_sem_raw"]),
-                "lex_norm": float(best["score_lex_norm"]),
-                "sem_norm": float(best["score_sem_norm"]),
-            }
-        })
+def literal_spans(texto_redacao: Union[str, TokenizedText], idx: Optional[Indexes] = None) -> List[Dict]:
+    """
+    Trechos máximos da redação copiados literalmente do corpus (índice de impressões),
+    independentemente das janelas: cada trecho traz os intervalos de palavras na
+    redação e no documento de origem, e o texto copiado.
+    """
+    tok = tokenize(texto_redacao)
+    if not len(tok):
+        return []
+    fp_index = (idx or STORE.get()).fp_index
+    if fp_index is None:
+        return []
+    spans = find_spans(fp_index, tok.words, min_words=settings.FP_MIN_WORDS)
+    return [{**span, "text": tok.join(span["query_start"], span["query_end"])} for span in spans]
 
-    resultados.sort(key=lambda r: r["scores"]["final"], reverse=True)
-    return resultados
-from typing import List, Dict, Any
-from src.config import settings
-from src import io_utils
-from src import compare_lexical, compare_semantic, combine_scores
-from src.preprocess import build_windows, extend_context
 
-# --- Carrega índices apenas uma vez ---
-TFIDF_MODEL, TFIDF_MATRIX, ID_MAP_LEX = io_utils.load_index_lexical(settings.INDEX_LEX_DIR)
-EMBEDDINGS, ID_MAP_SEM, MODEL_NAME = io_utils.load_index_semantic(settings.INDEX_SEM_DIR)
+def _score_windows(idx: Indexes, bloco_texts: List[str]) -> Tuple[List[List], List[List]]:
+    """
+    Top-K léxico e semântico de janelas (de uma ou várias redações) em lote:
+    um encode, um transform TF-IDF e um produto matricial por índice.
+    """
+    METRICS.inc("windows_scored", len(bloco_texts))
+    tops_sem = compare_semantic.semantic_top_k_batch(
+        query_blocks=bloco_texts,
+        embeddings=idx.embeddings,
+        id_map=idx.id_map_sem,
+        model_name=idx.model_name,
+        k=settings.K_SEM,
+        ann_index=idx.ann_index,
+        nprobe=settings.IVF_NPROBE,
+        quant_index=idx.quant_index,
+        rerank_factor=settings.SEM_RERANK_FACTOR,
+    )
+    tops_lex = _lexical_tops(idx, bloco_texts, tops_sem)
+    return tops_lex, tops_sem
 
 
-def _validate_id_map_item(item: Any) -> Dict:
-    if isinstance(item, dict):
-        required = {"doc_id", "start_word", "end_word", "text"}
-        missing = required - set(item.keys())
-        if missing:
-            return {
-                "doc_id": item.get("doc_id", str(item)),
-                "block_id": item.get("block_id", -1),
-                "start_word": item.get("start_word", -1),
-                "end_word": item.get("end_word", -1),
-                "text": item.get("text", ""),
-            }
-        return {
-            "doc_id": item["doc_id"],
-            "block_id": int(item.get("block_id", -1)),
-            "start_word": int(item["start_word"]),
-            "end_word": int(item["end_word"]),
-            "text": item["text"],
-        }
-    return {
-        "doc_id": str(item),
-        "block_id": -1,
-        "start_word": -1,
-        "end_word": -1,
-        "text": "",
-    }
+def _window_params() -> str:
+    """
+    Parâmetros que afetam o top-k de uma janela (parte da chave do cache): busca
+    léxica (pré-filtro, features) e semântica (modo, quantização, codificador).
+    """
+    return repr((
+        settings.K_LEX, settings.K_SEM, settings.LEX_PREFILTER, settings.LEX_FEATURES,
+        settings.SEM_SEARCH, settings.IVF_NPROBE, settings.SEM_QUANTIZATION, settings.SEM_RERANK_FACTOR,
+        settings.SEM_BACKEND, settings.SEM_ONNX_DIR,
+    ))
 
 
-def compare(texto_redacao: str) -> List[Dict]:
-    texto = (texto_redacao or "").strip()
-    if not texto:
-        return []
+def _result_params() -> str:
+    """Parâmetros que afetam o resultado de uma redação (parte da chave do cache)."""
+    return repr((
+        _window_params(), settings.WINDOW_SIZE, settings.STRIDE, settings.CONTEXT_MARGIN, settings.K_FINAL,
+        settings.ALPHA, settings.TAU_LEX, settings.TAU_SEM, settings.DELTA_PARA, settings.MIN_GATE,
+        settings.FP_KGRAM, settings.FP_MIN_WORDS,
+    ))
 
-    windows = build_windows(
-        text=texto,
-        window_size=settings.WINDOW_SIZE,
-        stride=settings.STRIDE,
-    )
 
-    resultados: List[Dict] = []
-
-    for w in windows:
-        bloco_text = w["text"]
+def _score_windows_cached(idx: Indexes, bloco_texts: List[str]) -> Tuple[List[List], List[List]]:
+    """
+    _score_windows com o cache de janelas: só as janelas ainda não vistas (nesta
+    versão dos índices) são pontuadas, uma vez por texto distinto. Redações que
+    compartilham parágrafos só pagam pelas janelas novas.
+    """
+    if not WINDOW_CACHE.enabled:
+        return _score_windows(idx, bloco_texts)
+
+    params = _window_params()
+    tops_lex: List[List] = [[] for _ in bloco_texts]
+    tops_sem: List[List] = [[] for _ in bloco_texts]
+    missing: Dict[str, List[int]] = {}  # texto da janela -> posições
+    for i, text in enumerate(bloco_texts):
+        cached = WINDOW_CACHE.get(result_key(text, idx.version, params))
+        if cached is None:
+            missing.setdefault(text, []).append(i)
+            continue
+        tops_lex[i] = [tuple(pair) for pair in cached[0]]
+        tops_sem[i] = [tuple(pair) for pair in cached[1]]
+    METRICS.inc("window_cache_hits", len(bloco_texts) - sum(len(pos) for pos in missing.values()))
 
-        top_lex = compare_lexical.compare_lexical(
-            query_block=bloco_text,
-            tfidf_model=TFIDF_MODEL,
-            tfidf_matrix=TFIDF_MATRIX,
-            id_map=ID_MAP_LEX,
-            top_n=settings.K_LEX,
-        )
+    if missing:
+        texts = list(missing)
+        new_lex, new_sem = _score_windows(idx, texts)
+        for text, top_lex, top_sem in zip(texts, new_lex, new_sem):
+            WINDOW_CACHE.put(result_key(text, idx.version, params), [top_lex, top_sem])
+            for i in missing[text]:
+                tops_lex[i], tops_sem[i] = top_lex, top_sem
+    return tops_lex, tops_sem
 
-        top_sem = compare_semantic.semantic_top_k(
-            query_block=bloco_text,
-            embeddings=EMBEDDINGS,
-            id_map=ID_MAP_SEM,
-            model_name=MODEL_NAME,
-            k=settings.K_SEM,
-        )
 
-        combined = combine_scores.combine_scores(
-            top_lex=top_lex,
-            top_sem=top_sem,
+def _combine(tops_lex: List[List], tops_sem: List[List]) -> Tuple[np.ndarray, List[str]]:
+    """
+    Combinação vetorizada de todas as janelas do lote (combine_scores.combine_tops).
+    Retorna o melhor candidato de cada janela (array estruturado, cand = -1 se não
+    houver) e os uids dos candidatos.
+    """
+    METRICS.inc("candidates", sum(map(len, tops_lex)) + sum(map(len, tops_sem)))
+    with METRICS.stage("combine"):
+        combined, uids = combine_scores.combine_tops(
+            tops_lex,
+            tops_sem,
             k_final=settings.K_FINAL,
             alpha=settings.ALPHA,
             tau_lex=settings.TAU_LEX,    # agora BRUTO
@@ -223,42 +196,66 @@ def compare(texto_redacao: str) -> List[Dict]:
             delta_para=settings.DELTA_PARA,
             min_gate=settings.MIN_GATE,
         )
+    if combined.shape[1] == 0:  # K_FINAL = 0: nenhum candidato
+        best = np.zeros(len(combined), dtype=combine_scores.COMBINED_DTYPE)
+        best["cand"] = -1
+        return best, uids
+    return combined[:, 0], uids
+
+
+def _assemble(
+    idx: Indexes,
+    tok: TokenizedText,
+    windows: List[Dict],
+    best: np.ndarray,
+    uids: List[str],
+) -> List[Dict]:
+    """Monta a saída estruturada de uma redação a partir do melhor candidato de cada janela."""
+    with METRICS.stage("literal_spans"):
+        spans = literal_spans(tok, idx)
+
+    with METRICS.stage("assemble"):  # metadados do candidato + contexto de cada janela
+        resultados = _assemble_windows(idx, tok, windows, best, uids, spans)
+    resultados.sort(key=lambda r: r["scores"]["final"], reverse=True)
+    return resultados
 
-        if not combined:
-            continue
 
-        best = combined[0]
-        match_type = best.get("match_type")
+def _assemble_windows(
+    idx: Indexes,
+    tok: TokenizedText,
+    windows: List[Dict],
+    best: np.ndarray,
+    uids: List[str],
+    spans: List[Dict],
+) -> List[Dict]:
+    resultados: List[Dict] = []
+    for w, cand in zip(windows, best):
+        if cand["cand"] < 0:
+            continue
+        match_type = combine_scores.MATCH_TYPES[cand["match"]]
         if match_type is None:
             continue
+        uid = uids[cand["cand"]]
 
-        # Metadados do bloco candidato
-        try:
-            idx_match = next(i for i, v in enumerate(ID_MAP_LEX)
-                             if (v.get("doc_id") if isinstance(v, dict) else str(v)) == best["doc_id"])
-            meta_raw = ID_MAP_LEX[idx_match]
-        except StopIteration:
-            try:
-                idx_match = next(i for i, v in enumerate(ID_MAP_SEM)
-                                 if (v.get("doc_id") if isinstance(v, dict) else str(v)) == best["doc_id"])
-                meta_raw = ID_MAP_SEM[idx_match]
-            except StopIteration:
-                meta_raw = best["doc_id"]
-
-        meta = _validate_id_map_item(meta_raw)
+        # Metadados do bloco candidato (uid do bloco, ex.: "doc#b3")
+        meta = _validate_id_map_item(idx.uid_index.get(uid, uid))
 
         resultados.append({
             "bloco_id": int(w["bloco_id"]),
             "inicio": int(w["start_word"]),
             "fim": int(w["end_word"]),
-            "trecho": bloco_text,
+            "trecho": w["text"],
             "trecho_contexto": extend_context(
-                text=texto,
+                text=tok,  # já tokenizada: o contexto não re-divide a redação
                 start_word=w["start_word"],
                 end_word=w["end_word"],
                 margin=settings.CONTEXT_MARGIN
             ),
             "tipo": match_type,
+            # trechos literais (índice de impressões) que se sobrepõem à janela
+            "trechos_literais": [
+                sp for sp in spans if sp["query_start"] < w["end_word"] and sp["query_end"] > w["start_word"]
+            ],
             "melhor_candidato": {
                 "doc_id": meta["doc_id"],
                 "block_id": meta.get("block_id", -1),
@@ -267,13 +264,92 @@ def compare(texto_redacao: str) -> List[Dict]:
                 "text": meta.get("text", ""),
             },
             "scores": {
-                "final": float(best["score_final"]),
-                "lex_raw": float(best["score_lex_raw"]),
-                "sem_raw": float(best["score_sem_raw"]),
-                "lex_norm": float(best["score_lex_norm"]),
-                "sem_norm": float(best["score_sem_norm"]),
+                "final": float(cand["score_final"]),
+                "lex_raw": float(cand["score_lex_raw"]),
+                "sem_raw": float(cand["score_sem_raw"]),
+                "lex_norm": float(cand["score_lex_norm"]),
+                "sem_norm": float(cand["score_sem_norm"]),
             }
         })
+    return resultados
 
-    resultados.sort(key=lambda r: r["scores"]["final"], reverse=True)
+
+def _compare_uncached(idx: Indexes, toks: Sequence[TokenizedText]) -> List[List[Dict]]:
+    with METRICS.stage("windowing"):
+        windows = [build_windows(text=tok, window_size=settings.WINDOW_SIZE, stride=settings.STRIDE) for tok in toks]
+        bloco_texts = [w["text"] for ws in windows for w in ws]
+    METRICS.inc("windows", len(bloco_texts))
+    if not bloco_texts:
+        return [[] for _ in toks]
+
+    tops_lex, tops_sem = _score_windows_cached(idx, bloco_texts)
+    best, uids = _combine(tops_lex, tops_sem)  # todas as janelas do lote de uma vez
+
+    resultados: List[List[Dict]] = []
+    pos = 0
+    for tok, ws in zip(toks, windows):
+        n = len(ws)
+        resultados.append(_assemble(idx, tok, ws, best[pos:pos + n], uids) if ws else [])
+        pos += n
+    return resultados
+
+
+def compare_many(textos: Sequence[Union[str, TokenizedText]]) -> List[List[Dict]]:
+    """
+    Compara várias redações de uma vez: as janelas de todas são pontuadas num único
+    lote (_score_windows) e os resultados são separados de volta por redação.
+    Aceita textos ou TokenizedText já construídos (ex.: pelo async_engine, que os
+    usa para contar janelas): cada redação é dividida em palavras uma única vez.
+    Redações já comparadas (mesmo texto normalizado, versão dos índices e parâmetros)
+    vêm do RESULT_CACHE. Retorna uma lista de resultados (a mesma saída de compare)
+    por redação. Tempos por etapa e contadores vão para METRICS (src/metrics.py).
+    """
+    toks = [tokenize(t) for t in textos]
+    if not any(toks):
+        return [[] for _ in toks]
+    with profile_request("compare", settings.PROFILE_DIR, settings.PROFILE_MIN_MS / 1000.0):
+        with METRICS.stage("total"):
+            return _compare_many(toks)
+
+
+def _compare_many(toks: List[TokenizedText]) -> List[List[Dict]]:
+    resultados: List[List[Dict]] = [[] for _ in toks]
+    pending = [i for i, tok in enumerate(toks) if tok]
+    METRICS.inc("essays", len(pending))
+
+    idx = STORE.get()  # a mesma versão dos índices em todo o lote
+    RESULT_CACHE.use_version(idx.version)  # versão nova -> caches da anterior descartados
+    WINDOW_CACHE.use_version(idx.version)
+
+    keys: Dict[int, str] = {}
+    if RESULT_CACHE.enabled:
+        params = _result_params()
+        keys = {i: result_key(toks[i].text, idx.version, params) for i in pending}
+        misses = []
+        for i in pending:
+            cached = RESULT_CACHE.get(keys[i])
+            if cached is None:
+                misses.append(i)
+            else:
+                resultados[i] = cached
+        METRICS.inc("result_cache_hits", len(pending) - len(misses))
+        pending = misses
+
+    if pending:
+        for i, res in zip(pending, _compare_uncached(idx, [toks[i] for i in pending])):
+            resultados[i] = res
+            if i in keys:
+                RESULT_CACHE.put(keys[i], res)
     return resultados
+
+
+def cache_stats() -> Dict[str, Dict[str, float]]:
+    """Contadores dos caches de redações e de janelas."""
+    return {"redacoes": RESULT_CACHE.stats(), "janelas": WINDOW_CACHE.stats()}
+
+
+def compare(texto_redacao: str) -> List[Dict]:
+    texto = (texto_redacao or "").strip()
+    if not texto:
+        return []
+    return compare_many([texto])[0]
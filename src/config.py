@@ -31,12 +31,30 @@ class Settings:
     DATA_INDEXES_DIR: str
     INDEX_LEX_DIR: str
     INDEX_SEM_DIR: str
+    INDEX_RELOAD_SECONDS: float  # intervalo p/ checar índices novos no serviço (0 = nunca)
+    INDEX_KEEP_VERSIONS: int     # versões de índices mantidas em DATA_INDEXES_DIR/versions
 
     # Retrieval
     K_LEX: int
     K_SEM: int
     K_FINAL: int
 
+    # Lexical features
+    LEX_FEATURES: str      # "vocab" (todos os n-gramas), "pruned" (min_df) ou "hashing"
+    LEX_MIN_DF: int        # nº mínimo de blocos por n-grama no modo "pruned"
+    LEX_HASH_FEATURES: int # nº de colunas do HashingVectorizer no modo "hashing"
+
+    # Lexical prefilter (MinHash/LSH)
+    LEX_PREFILTER: str     # "none" (TF-IDF sobre o corpus todo) ou "lsh" (só candidatos)
+    LSH_NUM_PERM: int      # valores por assinatura MinHash
+    LSH_BANDS: int         # faixas do LSH (LSH_NUM_PERM deve ser múltiplo)
+    LSH_SHINGLE_SIZE: int  # palavras por shingle
+
+    # Literal spans (winnowing)
+    FP_KGRAM: int          # palavras por k-grama (0 = não constrói o índice)
+    FP_WINDOW: int         # janela do winnowing (em k-gramas)
+    FP_MIN_WORDS: int      # tamanho mínimo de um trecho literal reportado
+
     # Combination & thresholds
     ALPHA: float           # peso do score léxico na média ponderada (apenas p/ rank)
     TAU_LEX: float         # limiar BRUTO para plágio literal (léxico)
@@ -46,6 +64,47 @@ class Settings:
 
     # Semantic model
     SEM_MODEL_NAME: str
+    SEM_BACKEND: str       # "torch" (SentenceTransformer) ou "onnx" (onnxruntime, consultas)
+    SEM_ONNX_DIR: str      # onde ficam os modelos exportados para ONNX
+
+    # Embedding generation (build)
+    ENCODE_WORKERS: int        # processos de codificação (1 = processo único)
+    ENCODE_BATCH_SIZE: int     # máx. de textos por lote de model.encode
+    ENCODE_MAX_TOKENS: int     # máx. de tokens (com padding) por lote
+
+    # Embedding cache
+    EMB_CACHE_DIR: str         # diretório do cache persistente ("" = desativado)
+    EMB_CACHE_MAX_ITEMS: int   # nº máximo de embeddings (evicção LRU)
+
+    # Semantic search
+    SEM_SEARCH: str        # "exact" (força bruta) ou "ivf" (aproximada)
+    IVF_NLIST: int         # nº de listas do IVF (0 = automático, ~4·sqrt(N))
+    IVF_NPROBE: int        # nº de listas sondadas por consulta
+    SEM_QUANTIZATION: str  # "none", "float16" ou "int8" (varredura comprimida + re-rank)
+    SEM_RERANK_FACTOR: int # candidatos re-ranqueados = K_SEM x fator
+
+    # Ingestion
+    INGEST_WORKERS: int        # threads de leitura do corpus
+    INGEST_CHUNK_SIZE: int     # blocos por lote no build (embeddings/id_map)
+
+    # Serving (micro-batching entre requisições)
+    COMPARE_MAX_BATCH_WINDOWS: int  # máx. de janelas por lote de compare_many
+    COMPARE_MAX_WAIT_MS: float      # espera máx. por outras requisições antes do lote
+
+    # Result cache (compare_service; invalidado a cada nova versão dos índices)
+    RESULT_CACHE_MAX_ITEMS: int     # resultados de redações em memória (LRU; 0 = desativado)
+    RESULT_CACHE_DIR: str           # nível em disco dos resultados ("" = só memória)
+    RESULT_CACHE_DISK_MAX_ITEMS: int  # arquivos por versão no nível em disco (0 = sem limite)
+    WINDOW_CACHE_MAX_ITEMS: int     # top-k de janelas em memória (LRU; 0 = desativado)
+
+    # Instrumentação (src/metrics.py)
+    METRICS_PORT: int               # porta do endpoint /metrics (Prometheus; 0 = desativado)
+    PROFILE_DIR: str                # perfis cProfile por requisição ("" = desativado)
+    PROFILE_MIN_MS: float           # só grava perfis de requisições mais lentas que isso
+
+    # Batch (python -m src.batch_compare)
+    BATCH_WORKERS: int         # processos, cada um com os índices carregados
+    BATCH_CHUNK_ESSAYS: int    # redações por lote (janelas codificadas juntas)
 
     # Sliding windows (em palavras)
     WINDOW_SIZE: int
@@ -62,12 +121,30 @@ def get_settings(environ: Optional[Mapping[str, str]] = None) -> Settings:
 
     idx_lex = env.get("INDEX_LEX_DIR") or os.path.join(data_indexes, "lexical")
     idx_sem = env.get("INDEX_SEM_DIR") or os.path.join(data_indexes, "semantic")
+    index_reload_seconds = max(0.0, _to_float(env.get("INDEX_RELOAD_SECONDS"), 5.0))
+    index_keep_versions = max(1, _to_int(env.get("INDEX_KEEP_VERSIONS"), 2))
 
     # Top-K
     k_lex = _to_int(env.get("K_LEX"), 10)
     k_sem = _to_int(env.get("K_SEM"), 10)
     k_final = _to_int(env.get("K_FINAL"), 5)
 
+    # Features léxicas
+    lex_features = (env.get("LEX_FEATURES") or "vocab").strip().lower()
+    lex_min_df = _to_int(env.get("LEX_MIN_DF"), 2)
+    lex_hash_features = _to_int(env.get("LEX_HASH_FEATURES"), 2 ** 20)
+
+    # Pré-filtro léxico
+    lex_prefilter = (env.get("LEX_PREFILTER") or "none").strip().lower()
+    lsh_num_perm = _to_int(env.get("LSH_NUM_PERM"), 96)
+    lsh_bands = _to_int(env.get("LSH_BANDS"), 32)
+    lsh_shingle_size = _to_int(env.get("LSH_SHINGLE_SIZE"), 3)
+
+    # Trechos literais (winnowing)
+    fp_kgram = _to_int(env.get("FP_KGRAM"), 5)
+    fp_window = _to_int(env.get("FP_WINDOW"), 4)
+    fp_min_words = _to_int(env.get("FP_MIN_WORDS"), 12)
+
     # Combinação & thresholds (BRUTOS)
     alpha = _to_float(env.get("ALPHA"), 0.6)
     tau_lex = _to_float(env.get("TAU_LEX"), 0.85)
@@ -77,6 +154,47 @@ def get_settings(environ: Optional[Mapping[str, str]] = None) -> Settings:
 
     # Modelo semântico
     model_name = env.get("SEM_MODEL_NAME", "sentence-transformers/all-mpnet-base-v2")
+    sem_backend = (env.get("SEM_BACKEND") or "torch").strip().lower()
+    sem_onnx_dir = env.get("SEM_ONNX_DIR") or "data/models/onnx"
+
+    # Geração de embeddings
+    encode_workers = _to_int(env.get("ENCODE_WORKERS"), 1)
+    encode_batch_size = _to_int(env.get("ENCODE_BATCH_SIZE"), 32)
+    encode_max_tokens = _to_int(env.get("ENCODE_MAX_TOKENS"), 8192)
+
+    # Cache de embeddings
+    emb_cache_dir = env.get("EMB_CACHE_DIR", "") or ""
+    emb_cache_max_items = _to_int(env.get("EMB_CACHE_MAX_ITEMS"), 200_000)
+
+    # Busca semântica
+    sem_search = (env.get("SEM_SEARCH") or "exact").strip().lower()
+    ivf_nlist = _to_int(env.get("IVF_NLIST"), 0)
+    ivf_nprobe = _to_int(env.get("IVF_NPROBE"), 8)
+    sem_quantization = (env.get("SEM_QUANTIZATION") or "none").strip().lower()
+    sem_rerank_factor = _to_int(env.get("SEM_RERANK_FACTOR"), 4)
+
+    # Ingestão
+    ingest_workers = _to_int(env.get("INGEST_WORKERS"), 4)
+    ingest_chunk_size = _to_int(env.get("INGEST_CHUNK_SIZE"), 2048)
+
+    # Serviço
+    compare_max_batch_windows = max(1, _to_int(env.get("COMPARE_MAX_BATCH_WINDOWS"), 256))
+    compare_max_wait_ms = max(0.0, _to_float(env.get("COMPARE_MAX_WAIT_MS"), 10.0))
+
+    # Cache de resultados
+    result_cache_max_items = max(0, _to_int(env.get("RESULT_CACHE_MAX_ITEMS"), 1024))
+    result_cache_dir = env.get("RESULT_CACHE_DIR", "") or ""
+    result_cache_disk_max_items = max(0, _to_int(env.get("RESULT_CACHE_DISK_MAX_ITEMS"), 100_000))
+    window_cache_max_items = max(0, _to_int(env.get("WINDOW_CACHE_MAX_ITEMS"), 20_000))
+
+    # Instrumentação
+    metrics_port = max(0, _to_int(env.get("METRICS_PORT"), 0))
+    profile_dir = env.get("PROFILE_DIR", "") or ""
+    profile_min_ms = max(0.0, _to_float(env.get("PROFILE_MIN_MS"), 1000.0))
+
+    # Comparação em lote
+    batch_workers = max(1, _to_int(env.get("BATCH_WORKERS"), 1))
+    batch_chunk_essays = max(1, _to_int(env.get("BATCH_CHUNK_ESSAYS"), 32))
 
     # Janelas
     window_size = _to_int(env.get("WINDOW_SIZE"), 40)
@@ -89,15 +207,52 @@ def get_settings(environ: Optional[Mapping[str, str]] = None) -> Settings:
         DATA_INDEXES_DIR=data_indexes,
         INDEX_LEX_DIR=idx_lex,
         INDEX_SEM_DIR=idx_sem,
+        INDEX_RELOAD_SECONDS=index_reload_seconds,
+        INDEX_KEEP_VERSIONS=index_keep_versions,
         K_LEX=k_lex,
         K_SEM=k_sem,
         K_FINAL=k_final,
+        LEX_FEATURES=lex_features,
+        LEX_MIN_DF=lex_min_df,
+        LEX_HASH_FEATURES=lex_hash_features,
+        LEX_PREFILTER=lex_prefilter,
+        LSH_NUM_PERM=lsh_num_perm,
+        LSH_BANDS=lsh_bands,
+        LSH_SHINGLE_SIZE=lsh_shingle_size,
+        FP_KGRAM=fp_kgram,
+        FP_WINDOW=fp_window,
+        FP_MIN_WORDS=fp_min_words,
         ALPHA=alpha,
         TAU_LEX=tau_lex,
         TAU_SEM=tau_sem,
         DELTA_PARA=delta_para,
         MIN_GATE=min_gate,
         SEM_MODEL_NAME=model_name,
+        SEM_BACKEND=sem_backend,
+        SEM_ONNX_DIR=sem_onnx_dir,
+        ENCODE_WORKERS=encode_workers,
+        ENCODE_BATCH_SIZE=encode_batch_size,
+        ENCODE_MAX_TOKENS=encode_max_tokens,
+        EMB_CACHE_DIR=emb_cache_dir,
+        EMB_CACHE_MAX_ITEMS=emb_cache_max_items,
+        SEM_SEARCH=sem_search,
+        IVF_NLIST=ivf_nlist,
+        IVF_NPROBE=ivf_nprobe,
+        SEM_QUANTIZATION=sem_quantization,
+        SEM_RERANK_FACTOR=sem_rerank_factor,
+        INGEST_WORKERS=ingest_workers,
+        INGEST_CHUNK_SIZE=ingest_chunk_size,
+        COMPARE_MAX_BATCH_WINDOWS=compare_max_batch_windows,
+        COMPARE_MAX_WAIT_MS=compare_max_wait_ms,
+        RESULT_CACHE_MAX_ITEMS=result_cache_max_items,
+        RESULT_CACHE_DIR=result_cache_dir,
+        RESULT_CACHE_DISK_MAX_ITEMS=result_cache_disk_max_items,
+        WINDOW_CACHE_MAX_ITEMS=window_cache_max_items,
+        METRICS_PORT=metrics_port,
+        PROFILE_DIR=profile_dir,
+        PROFILE_MIN_MS=profile_min_ms,
+        BATCH_WORKERS=batch_workers,
+        BATCH_CHUNK_ESSAYS=batch_chunk_essays,
         WINDOW_SIZE=window_size,
         STRIDE=stride,
         CONTEXT_MARGIN=context_margin,
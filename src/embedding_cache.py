@@ -0,0 +1,313 @@
+# src/embedding_cache.py
+# Cache persistente de embeddings, chaveado por (modelo, texto normalizado).
+#
+# Em disco, um subdiretório por modelo:
+#   meta.json   -> {"model_name", "dim"}, gravado uma vez na criação
+#   vectors.f32 -> matriz (capacidade x dim) float32 crua, memory-mapped e gravada in-place;
+#                  cresce por truncate (nunca é substituída: outros processos remapeiam)
+#   index.log   -> log só de acréscimo, uma linha "<chave> <slot>" por gravação; a última
+#                  linha de um slot vale (a chave anterior daquele slot foi evictada).
+#                  Compactado (reescrito com as entradas vivas) quando fica muito longo
+#   lock        -> trava (fcntl.flock): compartilhada para ler, exclusiva para gravar
+# Cada instância relê o final do log antes de ler ou alocar slots, então vários processos
+# (ex.: workers do build e o serviço) podem usar o mesmo diretório.
+# Usado por pipeline_build_index (blocos do corpus) e por compare_semantic (consultas).
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos (um processo por diretório)
+    fcntl = None
+
+
+def normalize_text(text: str) -> str:
+    """Normalização usada na chave: colapsa espaços em branco."""
+    return " ".join((text or "").split())
+
+
+def cache_namespace(model_name: str, backend: str = "torch") -> str:
+    """
+    Nome sob o qual os vetores são guardados: o modelo e, fora do torch (ex.: ONNX
+    int8), o backend que os gerou, para não misturar vetores de codificadores distintos.
+    """
+    return model_name if backend in ("", "torch") else f"{model_name}#{backend}"
+
+
+def cache_key(model_name: str, text: str) -> str:
+    return hashlib.sha1(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Cache LRU de embeddings com limite de itens (max_items) e contadores de hit/miss.
+    Seguro entre threads e entre processos que compartilham o diretório.
+    """
+
+    def __init__(self, path: str, model_name: str, max_items: int = 200_000):
+        self.model_name = model_name
+        self.max_items = max(1, int(max_items))
+        slug = hashlib.sha1(model_name.encode("utf-8")).hexdigest()[:16]
+        self.path = os.path.join(path, slug)
+        os.makedirs(self.path, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._lock_fd = os.open(os.path.join(self.path, "lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        self._slots: "OrderedDict[str, int]" = OrderedDict()
+        self._owners: Dict[int, str] = {}
+        self._free: List[int] = []
+        self._vectors: Optional[np.ndarray] = None
+        self._dim: Optional[int] = None
+        self._log_ino: Optional[int] = None
+        self._log_offset = 0
+        self._log_lines = 0
+        with self._lock, self._file_lock(exclusive=False):
+            self._sync()
+            while len(self._slots) > self.max_items:  # o limite pode ter diminuído
+                self._drop(next(iter(self._slots)))
+
+    # ---------- persistência ----------
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, "meta.json")
+
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.f32")
+
+    def _log_path(self) -> str:
+        return os.path.join(self.path, "index.log")
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool) -> Iterator[None]:
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _map_vectors(self) -> None:
+        """(Re)mapeia vectors.f32 se outro processo aumentou a capacidade."""
+        if self._dim is None:
+            if not os.path.exists(self._meta_path()):
+                return
+            with open(self._meta_path(), "r", encoding="utf-8") as f:
+                self._dim = int(json.load(f)["dim"])
+        old_cap = 0 if self._vectors is None else self._vectors.shape[0]
+        try:
+            capacity = os.path.getsize(self._vectors_path()) // (4 * self._dim)
+        except OSError:
+            capacity = 0
+        if capacity > old_cap:
+            self._vectors = np.memmap(self._vectors_path(), dtype=np.float32, mode="r+", shape=(capacity, self._dim))
+            self._free = list(range(capacity - 1, old_cap - 1, -1)) + self._free
+
+    def _sync(self) -> None:
+        """Aplica as linhas do log gravadas (por qualquer processo) desde a última leitura."""
+        self._map_vectors()
+        try:
+            ino = os.stat(self._log_path()).st_ino
+        except OSError:
+            return
+        if ino != self._log_ino:  # log novo ou compactado por outro processo: relê tudo
+            self._log_ino, self._log_offset, self._log_lines = ino, 0, 0
+            self._slots.clear()
+            self._owners.clear()
+            capacity = 0 if self._vectors is None else self._vectors.shape[0]
+            self._free = list(range(capacity - 1, -1, -1))
+        with open(self._log_path(), "rb") as f:
+            f.seek(self._log_offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1  # ignora uma linha final incompleta
+        self._log_offset += end
+        for line in data[:end].decode("utf-8").splitlines():
+            key, slot = line.split()
+            self._assign(key, int(slot))
+            self._log_lines += 1
+
+    def _assign(self, key: str, slot: int) -> None:
+        old_key = self._owners.get(slot)
+        if old_key is not None and old_key != key:
+            del self._slots[old_key]  # evictada por quem gravou o slot
+        old_slot = self._slots.get(key)
+        if old_slot is not None and old_slot != slot:
+            del self._owners[old_slot]
+            self._free.append(old_slot)
+        self._slots[key] = slot
+        self._slots.move_to_end(key)
+        self._owners[slot] = key
+
+    def _drop(self, key: str) -> int:
+        slot = self._slots.pop(key)
+        del self._owners[slot]
+        return slot
+
+    def _take_free(self) -> Optional[int]:
+        while self._free:
+            slot = self._free.pop()
+            if slot not in self._owners:  # o slot pode ter sido ocupado por outro processo
+                return slot
+        return None
+
+    def _append_log(self, lines: List[str]) -> None:
+        with open(self._log_path(), "ab") as f:
+            f.write("".join(lines).encode("utf-8"))
+            self._log_offset = f.tell()
+        self._log_ino = os.stat(self._log_path()).st_ino
+        self._log_lines += len(lines)
+
+    def _compact(self) -> None:
+        """Reescreve o log só com as entradas vivas (com a trava exclusiva)."""
+        tmp = self._log_path() + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write("".join(f"{k} {s}\n" for k, s in self._slots.items()).encode("utf-8"))
+            offset = f.tell()
+        os.replace(tmp, self._log_path())
+        self._log_ino = os.stat(self._log_path()).st_ino
+        self._log_offset, self._log_lines = offset, len(self._slots)
+
+    def _grow(self, dim: int, needed: int) -> None:
+        """Aumenta a capacidade do arquivo de vetores (dobrando, até max_items)."""
+        if self._dim is None:
+            with open(self._meta_path(), "w", encoding="utf-8") as f:
+                json.dump({"model_name": self.model_name, "dim": dim}, f)
+            self._dim = dim
+        old_cap = 0 if self._vectors is None else self._vectors.shape[0]
+        new_cap = min(self.max_items, max(needed, 2 * old_cap, 1024))
+        if new_cap <= old_cap:
+            return
+        if self._vectors is not None:
+            self._vectors.flush()
+        with open(self._vectors_path(), "ab") as f:
+            f.truncate(new_cap * dim * 4)
+        self._map_vectors()
+
+    def flush(self) -> None:
+        """Sincroniza os vetores com o disco (o índice já é gravado a cada put_many)."""
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+
+    # ---------- API ----------
+    def get_many(self, texts: List[str]) -> Tuple[List[Optional[np.ndarray]], List[int]]:
+        """
+        Busca os embeddings de `texts`. Retorna (vetores, posições_faltantes), em que
+        vetores[i] é None para as posições não encontradas.
+        """
+        found: List[Optional[np.ndarray]] = [None] * len(texts)
+        missing: List[int] = []
+        with self._lock, self._file_lock(exclusive=False):
+            self._sync()
+            for i, text in enumerate(texts):
+                key = cache_key(self.model_name, text)
+                slot = self._slots.get(key)
+                if slot is None:
+                    missing.append(i)
+                    continue
+                self._slots.move_to_end(key)
+                found[i] = np.array(self._vectors[slot])
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        return found, missing
+
+    def put_many(self, texts: List[str], vectors: np.ndarray) -> None:
+        """Insere/atualiza embeddings; remove os menos usados ao atingir max_items."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(texts) == 0:
+            return
+        with self._lock, self._file_lock(exclusive=True):
+            self._sync()  # alocação de slots sobre o estado mais recente do log
+            if self._dim is not None and vectors.shape[1] != self._dim:
+                raise ValueError(f"Dimensão {vectors.shape[1]} difere da do cache ({self._dim}).")
+            if self._vectors is None:
+                self._grow(vectors.shape[1], len(texts))
+            lines = []
+            for text, vec in zip(texts, vectors):
+                key = cache_key(self.model_name, text)
+                slot = self._slots.get(key)
+                if slot is None:
+                    slot = self._take_free()
+                    if slot is None and self._vectors.shape[0] < self.max_items:
+                        self._grow(vectors.shape[1], len(self._slots) + 1)
+                        slot = self._take_free()
+                    if slot is None:
+                        slot = self._drop(next(iter(self._slots)))  # evicção LRU
+                self._assign(key, slot)
+                self._vectors[slot] = vec
+                lines.append(f"{key} {slot}\n")
+            # vetores antes do log: quem lê a linha encontra o vetor já gravado
+            self._vectors.flush()
+            self._append_log(lines)
+            if self._log_lines > 2 * self.max_items + 1024:
+                self._compact()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._lock_fd is not None:
+                os.close(self._lock_fd)
+                self._lock_fd = None
+            self._vectors = None
+
+    def __del__(self):
+        if getattr(self, "_lock_fd", None) is not None:
+            os.close(self._lock_fd)
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "size": len(self._slots),
+            "max_items": self.max_items,
+        }
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+
+def open_cache(cache_dir: str, model_name: str, max_items: int, backend: str = "torch") -> Optional[EmbeddingCache]:
+    """
+    Abre o cache em cache_dir para os vetores de `model_name` gerados por `backend`
+    (ver cache_namespace); retorna None se o cache estiver desativado (dir vazio).
+    """
+    if not cache_dir:
+        return None
+    return EmbeddingCache(cache_dir, cache_namespace(model_name, backend), max_items=max_items)
+
+
+def cached_encode(
+    texts: List[str],
+    encode_fn: Callable[[List[str]], np.ndarray],
+    cache: Optional[EmbeddingCache],
+) -> np.ndarray:
+    """
+    Codifica `texts` consultando o cache antes do modelo: só os textos ausentes
+    (deduplicados pela chave normalizada) são enviados a encode_fn.
+    Retorna a matriz (len(texts) x dim) na ordem original.
+    """
+    if cache is None or not texts:
+        return encode_fn(texts)
+
+    found, missing = cache.get_many(texts)
+    if missing:
+        unique: Dict[str, int] = {}
+        for i in missing:
+            unique.setdefault(normalize_text(texts[i]), i)
+        to_encode = [texts[i] for i in unique.values()]
+        encoded = np.asarray(encode_fn(to_encode), dtype=np.float32)
+        cache.put_many(to_encode, encoded)
+        by_key = dict(zip(unique.keys(), encoded))
+        for i in missing:
+            found[i] = by_key[normalize_text(texts[i])]
+    return np.stack(found).astype(np.float32, copy=False)
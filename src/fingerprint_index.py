@@ -0,0 +1,180 @@
+# src/fingerprint_index.py
+# Índice de impressões digitais (winnowing) para localizar trechos copiados LITERALMENTE.
+#
+# Cada documento vira a sequência de hashes dos seus k-gramas de palavras (mesma
+# segmentação de build_windows: split por espaços, sem normalizar). Em cada janela de
+# `window` k-gramas consecutivos guarda-se o menor hash (winnowing): qualquer trecho
+# comum com pelo menos window + kgram - 1 palavras tem ao menos uma impressão indexada.
+#
+# Em disco (diretório fingerprint/ da versão dos índices, ao lado de lexical/ e semantic/):
+#   fp_params.json  -> {"kgram", "window"}
+#   fp_docs.json    -> doc_ids
+#   fp_hashes.npy   -> impressões (uint32), ordenadas  | fp_doc.npy / fp_pos.npy -> doc e
+#                      posição (k-grama) de cada uma   |   (int32)
+#   fp_kgrams.npy   -> hashes de TODOS os k-gramas dos documentos (uint32), concatenados
+#   fp_offsets.npy  -> início de cada documento em fp_kgrams (int64, n_docs + 1)
+# fp_kgrams permite estender cada acerto até o trecho máximo sem reler o corpus.
+
+import json
+import os
+import zlib
+from array import array
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Union
+import numpy as np
+
+
+@dataclass(frozen=True)
+class FingerprintIndex:
+    doc_names: List[str]
+    hashes: np.ndarray   # (F,) uint32, ordenado
+    doc: np.ndarray      # (F,) int32
+    pos: np.ndarray      # (F,) int32
+    kgrams: np.ndarray   # (soma dos k-gramas,) uint32
+    offsets: np.ndarray  # (n_docs + 1,) int64
+    kgram: int
+    window: int
+
+
+def kgram_hashes(text: Union[str, Sequence[str]], kgram: int) -> np.ndarray:
+    """
+    Hash (crc32) de cada k-grama de palavras; o i-ésimo começa na palavra i.
+    Aceita o texto ou a lista de palavras já dividida (ex.: TokenizedText.words).
+    """
+    words = text.split() if isinstance(text, str) else text
+    return np.fromiter(
+        (zlib.crc32(" ".join(words[i:i + kgram]).encode("utf-8")) for i in range(len(words) - kgram + 1)),
+        dtype=np.uint32,
+        count=max(0, len(words) - kgram + 1),
+    )
+
+
+def winnow(hashes: np.ndarray, window: int) -> np.ndarray:
+    """
+    Posições selecionadas pelo winnowing: o menor hash de cada janela de `window`
+    k-gramas (o mais à direita, em empates), sem repetir posições consecutivas.
+    """
+    n = len(hashes)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    if n <= window:
+        return np.asarray([n - 1 - int(np.argmin(hashes[::-1]))])
+    views = np.lib.stride_tricks.sliding_window_view(hashes, window)
+    picks = np.arange(len(views)) + (window - 1 - np.argmin(views[:, ::-1], axis=1))
+    return np.unique(picks)
+
+
+class FingerprintWriter:
+    """Acumula as impressões documento a documento (uso em streaming no pipeline)."""
+
+    def __init__(self, kgram: int = 5, window: int = 4):
+        self.kgram = max(1, int(kgram))
+        self.window = max(1, int(window))
+        self._docs: List[str] = []
+        self._kgrams: List[np.ndarray] = []
+        self._fp = {"hashes": array("I"), "doc": array("i"), "pos": array("i")}
+
+    def add(self, doc_id: str, text: Union[str, Sequence[str]]) -> None:
+        hashes = kgram_hashes(text, self.kgram)
+        picks = winnow(hashes, self.window)
+        doc = len(self._docs)
+        self._docs.append(doc_id)
+        self._kgrams.append(hashes)
+        self._fp["hashes"].extend(hashes[picks].tolist())
+        self._fp["doc"].extend([doc] * len(picks))
+        self._fp["pos"].extend(picks.tolist())
+
+    def build(self) -> FingerprintIndex:
+        hashes = np.frombuffer(self._fp["hashes"], dtype=np.uint32)
+        order = np.argsort(hashes, kind="stable")
+        lengths = [len(h) for h in self._kgrams]
+        return FingerprintIndex(
+            doc_names=list(self._docs),
+            hashes=hashes[order],
+            doc=np.frombuffer(self._fp["doc"], dtype=np.int32)[order],
+            pos=np.frombuffer(self._fp["pos"], dtype=np.int32)[order],
+            kgrams=np.concatenate(self._kgrams) if self._kgrams else np.zeros(0, dtype=np.uint32),
+            offsets=np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+            kgram=self.kgram,
+            window=self.window,
+        )
+
+
+def save_fingerprints(path_out: str, index: FingerprintIndex) -> None:
+    os.makedirs(path_out, exist_ok=True)
+    with open(os.path.join(path_out, "fp_params.json"), "w", encoding="utf-8") as f:
+        json.dump({"kgram": index.kgram, "window": index.window}, f)
+    with open(os.path.join(path_out, "fp_docs.json"), "w", encoding="utf-8") as f:
+        json.dump(index.doc_names, f, ensure_ascii=False)
+    for name in ("hashes", "doc", "pos", "kgrams", "offsets"):
+        np.save(os.path.join(path_out, f"fp_{name}.npy"), getattr(index, name))
+
+
+def load_fingerprints(path_in: str) -> Optional[FingerprintIndex]:
+    """Abre o índice (arrays via mmap); None se não tiver sido construído."""
+    if not os.path.exists(os.path.join(path_in, "fp_params.json")):
+        return None
+    with open(os.path.join(path_in, "fp_params.json"), "r", encoding="utf-8") as f:
+        params = json.load(f)
+    with open(os.path.join(path_in, "fp_docs.json"), "r", encoding="utf-8") as f:
+        doc_names = json.load(f)
+    arrays = {name: np.load(os.path.join(path_in, f"fp_{name}.npy"), mmap_mode="r")
+              for name in ("hashes", "doc", "pos", "kgrams", "offsets")}
+    return FingerprintIndex(doc_names=doc_names, **arrays, **params)
+
+
+def find_spans(
+    index: FingerprintIndex,
+    text: Union[str, Sequence[str]],
+    min_words: int = 0,
+    max_postings: int = 1000,
+) -> List[Dict]:
+    """
+    Trechos MÁXIMOS do texto copiados literalmente de documentos do corpus.
+    Cada k-grama do texto é procurado nas impressões (busca binária); cada acerto é
+    estendido para os dois lados comparando os hashes de k-gramas do texto e do
+    documento na mesma diagonal. Hashes com mais de `max_postings` ocorrências
+    (expressões muito comuns) são ignorados. Aceita o texto ou suas palavras
+    (ex.: TokenizedText.words, sem dividir a redação de novo).
+    Retorna [{"doc_id", "query_start", "query_end", "doc_start", "doc_end", "n_words"}, ...]
+    (intervalos em palavras, fim exclusivo), ordenados pelo tamanho do trecho desc.
+    """
+    k = index.kgram
+    min_words = max(min_words, index.window + k - 1)
+    q = kgram_hashes(text, k)
+    if len(q) == 0 or len(index.hashes) == 0:
+        return []
+
+    lo = np.searchsorted(index.hashes, q, side="left")
+    hi = np.searchsorted(index.hashes, q, side="right")
+    covered: Dict[tuple, List[tuple]] = {}  # (doc, diagonal) -> intervalos já estendidos
+    spans: List[Dict] = []
+    for i in np.flatnonzero((hi > lo) & (hi - lo <= max_postings)):
+        for j in range(lo[i], hi[i]):
+            d, p = int(index.doc[j]), int(index.pos[j])
+            key = (d, p - int(i))
+            if any(s <= i < e for s, e in covered.get(key, ())):
+                continue
+            doc_k = index.kgrams[index.offsets[d]:index.offsets[d + 1]]
+            if doc_k[p] != q[i]:
+                continue
+            start = int(i)
+            while start > 0 and p - (i - start) > 0 and q[start - 1] == doc_k[p - (i - start) - 1]:
+                start -= 1
+            end = int(i) + 1
+            while end < len(q) and p + (end - i) < len(doc_k) and q[end] == doc_k[p + (end - i)]:
+                end += 1
+            covered.setdefault(key, []).append((start, end))
+            n_words = end - start + k - 1
+            if n_words >= min_words:
+                doc_start = key[1] + start
+                spans.append({
+                    "doc_id": index.doc_names[d],
+                    "query_start": start,
+                    "query_end": end + k - 1,
+                    "doc_start": doc_start,
+                    "doc_end": doc_start + n_words,
+                    "n_words": n_words,
+                })
+    spans.sort(key=lambda s: (-s["n_words"], s["query_start"], s["doc_id"]))
+    return spans
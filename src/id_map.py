@@ -0,0 +1,249 @@
+# src/id_map.py
+# Armazenamento compacto do id_map (metadados por BLOCO) em arrays colunares.
+#
+# Em disco (num diretório próprio; nos builds versionados, <versão>/idmap/, um só para
+# os índices léxico e semântico):
+#   idmap_docs.json          -> lista de doc_ids distintos
+#   idmap_doc.npy            -> índice do doc_id de cada bloco (int32)
+#   idmap_block.npy          -> block_id (int32)
+#   idmap_start.npy          -> start_word (int32)
+#   idmap_end.npy            -> end_word (int32)
+#   idmap_uid.bin / _offsets -> uids concatenados (utf-8) + offsets (int64, N+1)
+#   idmap_text.bin / _offsets-> textos dos blocos concatenados (utf-8) + offsets
+#   idmap_uidhash.npy        -> hashes de 64 bits dos uids, ordenados (uint64)
+#   idmap_uidrow.npy         -> linha de cada hash acima (int64): uid -> linha por
+#                               busca binária (UidRows), sem dict por bloco na carga
+# Tudo é aberto via mmap; o texto de um bloco só é decodificado quando acessado.
+
+import hashlib
+import json
+import os
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import Dict, Iterable, Iterator, List, Optional
+import numpy as np
+
+_KEYS = ("uid", "doc_id", "block_id", "start_word", "end_word", "text")
+
+
+def uid_hash(uid: str) -> int:
+    """Hash de 64 bits do uid (chave da busca binária de UidRows)."""
+    return int.from_bytes(hashlib.blake2b(uid.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def record_uid(item) -> str:
+    """Chave de busca de uma entrada de id_map (uid do bloco, com fallback p/ doc_id)."""
+    if isinstance(item, Mapping):
+        return str(item.get("uid", item.get("doc_id", item)))
+    return str(item)
+
+
+def _open_blob(path_in: str, name: str):
+    offsets = np.load(os.path.join(path_in, f"idmap_{name}_offsets.npy"), mmap_mode="r")
+    blob_path = os.path.join(path_in, f"idmap_{name}.bin")
+    # np.memmap não aceita arquivos vazios
+    blob = np.memmap(blob_path, dtype=np.uint8, mode="r") if os.path.getsize(blob_path) else np.zeros(0, np.uint8)
+    return blob, offsets
+
+
+class IdMapWriter:
+    """
+    Grava o id_map em streaming, um bloco por vez: uids e textos vão direto para os
+    blobs em disco, e só as colunas inteiras ficam em memória até close().
+    Campos ausentes viram -1 (inteiros) ou "" (uid/text).
+    """
+
+    def __init__(self, path_out: str):
+        os.makedirs(path_out, exist_ok=True)
+        self.path_out = path_out
+        self._docs: Dict[str, int] = {}
+        self._cols = {name: array("i") for name in ("doc", "block", "start", "end")}
+        self._offsets = {name: array("q", [0]) for name in ("uid", "text")}
+        self._blobs = {name: open(os.path.join(path_out, f"idmap_{name}.bin"), "wb") for name in ("uid", "text")}
+        self._uid_hashes = array("Q")
+
+    def append(self, item: Mapping) -> None:
+        # mesma chave de IdMap.record_uid: uid ou, sem ele, doc_id
+        self._uid_hashes.append(uid_hash(str(item.get("uid", "")) or str(item.get("doc_id", ""))))
+        self._cols["doc"].append(self._docs.setdefault(str(item.get("doc_id", "")), len(self._docs)))
+        self._cols["block"].append(int(item.get("block_id", -1)))
+        self._cols["start"].append(int(item.get("start_word", -1)))
+        self._cols["end"].append(int(item.get("end_word", -1)))
+        for name in ("uid", "text"):
+            data = str(item.get(name, "")).encode("utf-8")
+            self._blobs[name].write(data)
+            self._offsets[name].append(self._offsets[name][-1] + len(data))
+
+    def close(self) -> None:
+        for blob in self._blobs.values():
+            blob.close()
+        with open(os.path.join(self.path_out, "idmap_docs.json"), "w", encoding="utf-8") as f:
+            json.dump(list(self._docs), f, ensure_ascii=False)
+        for name, col in self._cols.items():
+            np.save(os.path.join(self.path_out, f"idmap_{name}.npy"), np.frombuffer(col, dtype=np.int32))
+        for name, offsets in self._offsets.items():
+            np.save(os.path.join(self.path_out, f"idmap_{name}_offsets.npy"), np.frombuffer(offsets, dtype=np.int64))
+        hashes = np.frombuffer(self._uid_hashes, dtype=np.uint64)
+        rows = np.argsort(hashes, kind="stable")  # uid repetido: a menor linha vem antes
+        np.save(os.path.join(self.path_out, "idmap_uidhash.npy"), hashes[rows])
+        np.save(os.path.join(self.path_out, "idmap_uidrow.npy"), rows.astype(np.int64))
+
+    def __enter__(self) -> "IdMapWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def save_id_map(path_out: str, id_map: Iterable[Mapping]) -> None:
+    """
+    Grava o id_map (sequência de registros, um por bloco) no formato colunar.
+    Aceita tanto lista de dicts quanto um IdMap (cujos textos são lidos sob demanda).
+    """
+    with IdMapWriter(path_out) as writer:
+        for item in id_map:
+            writer.append(item)
+
+
+def load_id_map(path_in: str) -> Optional["IdMap"]:
+    """Abre o id_map colunar de um diretório de índice (None se não existir)."""
+    if not os.path.exists(os.path.join(path_in, "idmap_docs.json")):
+        return None
+    return IdMap(path_in)
+
+
+class BlockRecord(Mapping):
+    """
+    Visão somente leitura de UMA linha do id_map, com a mesma interface de um dict
+    ({"uid", "doc_id", "block_id", "start_word", "end_word", "text"}).
+    O texto só é lido do arquivo quando a chave "text" é acessada.
+    """
+
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store: "IdMap", row: int):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, key: str):
+        store, row = self._store, self._row
+        if key == "uid" and store.uid(row):
+            return store.uid(row)
+        if key == "doc_id":
+            return store.doc_id(row)
+        if key == "block_id":
+            return int(store.block_ids[row])
+        if key == "start_word":
+            return int(store.start_words[row])
+        if key == "end_word":
+            return int(store.end_words[row])
+        if key == "text":
+            return store.text(row)
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        has_uid = bool(self._store.uid(self._row))
+        return iter(_KEYS if has_uid else _KEYS[1:])
+
+    def __len__(self) -> int:
+        return len(_KEYS) if self._store.uid(self._row) else len(_KEYS) - 1
+
+    def __repr__(self) -> str:
+        return f"BlockRecord({dict(self)!r})"
+
+
+class IdMap(Sequence):
+    """
+    id_map colunar memory-mapped: len(), id_map[i] -> BlockRecord, e acessores
+    diretos por linha (uid, doc_id, text) que evitam montar o registro inteiro.
+    """
+
+    def __init__(self, path_in: str):
+        self.path = path_in
+        with open(os.path.join(path_in, "idmap_docs.json"), "r", encoding="utf-8") as f:
+            self.doc_names: List[str] = json.load(f)
+        load = lambda name: np.load(os.path.join(path_in, f"idmap_{name}.npy"), mmap_mode="r")
+        self.doc_index = load("doc")
+        self.block_ids = load("block")
+        self.start_words = load("start")
+        self.end_words = load("end")
+        self._uids, self._uid_offsets = _open_blob(path_in, "uid")
+        self._texts, self._text_offsets = _open_blob(path_in, "text")
+        # busca uid -> linha (ausente em id_maps gravados antes dela: UidRows calcula)
+        has_hashes = os.path.exists(os.path.join(path_in, "idmap_uidhash.npy"))
+        self.uid_hashes = load("uidhash") if has_hashes else None
+        self.uid_hash_rows = load("uidrow") if has_hashes else None
+
+    def __len__(self) -> int:
+        return int(self.doc_index.shape[0])
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [BlockRecord(self, i) for i in range(*row.indices(len(self)))]
+        row = int(row)
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return BlockRecord(self, row)
+
+    def uid(self, row: int) -> str:
+        s, e = self._uid_offsets[row], self._uid_offsets[row + 1]
+        return bytes(self._uids[s:e]).decode("utf-8")
+
+    def doc_id(self, row: int) -> str:
+        return self.doc_names[int(self.doc_index[row])]
+
+    def text(self, row: int) -> str:
+        s, e = self._text_offsets[row], self._text_offsets[row + 1]
+        return bytes(self._texts[s:e]).decode("utf-8")
+
+    def record_uid(self, row: int) -> str:
+        """record_uid(self[row]) sem montar o registro."""
+        return self.uid(row) or self.doc_id(row)
+
+
+class UidRows:
+    """
+    uid -> linha de um id_map sem dict por bloco: busca binária (np.searchsorted) nos
+    hashes ordenados gravados com o id_map (idmap_uidhash.npy), conferindo o uid da
+    linha encontrada. Para id_maps sem esses arquivos (listas de dicts, builds
+    antigos), os hashes são calculados na primeira busca.
+    get(uid) devolve a menor linha com esse uid (ou default).
+    """
+
+    def __init__(self, id_map: Sequence):
+        self.id_map = id_map
+        hashes = getattr(id_map, "uid_hashes", None)
+        self._sorted = None if hashes is None else (hashes, id_map.uid_hash_rows)
+
+    def _uid(self, row: int) -> str:
+        if hasattr(self.id_map, "record_uid"):
+            return self.id_map.record_uid(row)
+        return record_uid(self.id_map[row])
+
+    def _sorted_hashes(self):
+        if self._sorted is None:
+            n = len(self.id_map)
+            hashes = np.fromiter((uid_hash(self._uid(row)) for row in range(n)), dtype=np.uint64, count=n)
+            rows = np.argsort(hashes, kind="stable")
+            self._sorted = (hashes[rows], rows)
+        return self._sorted
+
+    def get(self, uid: str, default: Optional[int] = None) -> Optional[int]:
+        hashes, rows = self._sorted_hashes()
+        h = np.uint64(uid_hash(uid))
+        for i in range(int(np.searchsorted(hashes, h, "left")), int(np.searchsorted(hashes, h, "right"))):
+            row = int(rows[i])
+            if self._uid(row) == uid:  # descarta colisões de hash
+                return row
+        return default
+
+    def __contains__(self, uid: str) -> bool:
+        return self.get(uid) is not None
+
+    def __getitem__(self, uid: str) -> int:
+        row = self.get(uid)
+        if row is None:
+            raise KeyError(uid)
+        return row
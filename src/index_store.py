@@ -0,0 +1,227 @@
+# src/index_store.py
+# Carregamento único, preguiçoso e thread-safe dos índices usados por compare_service.
+#
+# IndexStore.get() carrega tudo na primeira chamada (ou em warm()) e devolve um
+# objeto Indexes imutável. O pipeline grava cada build numa versão nova
+# (DATA_INDEXES_DIR/versions/<versão>/) e só então aponta DATA_INDEXES_DIR/CURRENT
+# para ela. A cada INDEX_RELOAD_SECONDS, get() confere CURRENT: se mudou, a nova
+# versão é carregada numa thread em segundo plano e trocada de forma atômica quando
+# estiver pronta. Enquanto isso, e para as comparações em andamento, vale a anterior.
+# Índices não versionados (builds antigos) são lidos de INDEX_LEX_DIR/INDEX_SEM_DIR,
+# com a versão identificada pelos mtimes dos arquivos principais.
+
+import os
+import threading
+import time
+import warnings
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from src import io_utils
+from src.ann_index import IVFIndex
+from src.fingerprint_index import FingerprintIndex, load_fingerprints
+from src.id_map import UidRows, load_id_map
+from src.minhash_lsh import MinHashLSH
+from src.quantized_index import QuantizedIndex
+
+# Arquivos cujo mtime identifica a versão de índices sem arquivo VERSION
+_VERSION_FILES = (
+    ("lex", "tfidf_model.joblib"),
+    ("lex", "idmap_docs.json"),
+    ("sem", "meta.json"),
+    ("sem", "embeddings.npy"),
+)
+
+
+@dataclass(frozen=True)
+class Indexes:
+    tfidf_model: Any
+    tfidf_matrix: Any
+    id_map_lex: Sequence
+    postings: Any                          # layout invertido do TF-IDF (termo -> blocos)
+    embeddings: Any
+    id_map_sem: Sequence
+    model_name: str
+    ann_index: Optional[IVFIndex]          # SEM_SEARCH=ivf
+    quant_index: Optional[QuantizedIndex]  # SEM_QUANTIZATION=float16|int8
+    lsh_index: Optional[MinHashLSH]        # LEX_PREFILTER=lsh
+    fp_index: Optional[FingerprintIndex]   # FP_KGRAM > 0
+    uid_index: "UidIndex"                  # uid -> registro do bloco (léxico tem precedência)
+    lex_rows: Optional[UidRows]            # uid -> linha do índice léxico (só com LSH)
+    version: str
+
+
+class UidIndex:
+    """
+    uid -> registro do bloco nos id_maps, resolvido na consulta (UidRows: busca
+    binária nos hashes gravados com o id_map), sem percorrer os blocos na carga.
+    Os id_maps são consultados em ordem: em caso de uid repetido, vale o primeiro
+    (o léxico tem precedência sobre o semântico). A validação acontece só para o
+    candidato efetivamente exibido.
+    """
+
+    def __init__(self, *id_maps: Sequence[Any]):
+        self._rows = [UidRows(id_map) for id_map in id_maps]
+
+    def get(self, uid: str, default: Any = None) -> Any:
+        for rows in self._rows:
+            row = rows.get(uid)
+            if row is not None:
+                return rows.id_map[row]
+        return default
+
+    def __contains__(self, uid: str) -> bool:
+        return any(uid in rows for rows in self._rows)
+
+    def __getitem__(self, uid: str) -> Mapping:
+        item = self.get(uid)
+        if item is None:
+            raise KeyError(uid)
+        return item
+
+
+def build_uid_index(*id_maps: Sequence[Any]) -> UidIndex:
+    """uid -> registro do bloco (ver UidIndex); não percorre os id_maps."""
+    return UidIndex(*id_maps)
+
+
+def lexical_rows(id_map: Sequence[Any]) -> UidRows:
+    """uid -> linha do índice léxico (para pontuar os blocos do top-k semântico)."""
+    return UidRows(id_map)
+
+
+def index_version(settings) -> str:
+    """Versão dos índices em disco: a apontada por CURRENT ou assinatura por mtime."""
+    version = io_utils.current_index_version(settings.DATA_INDEXES_DIR)
+    if version:
+        return version
+    dirs = {"lex": settings.INDEX_LEX_DIR, "sem": settings.INDEX_SEM_DIR}
+    parts = []
+    for kind, name in _VERSION_FILES:
+        path = os.path.join(dirs[kind], name)
+        parts.append(str(os.stat(path).st_mtime_ns) if os.path.exists(path) else "-")
+    return "mtime:" + ":".join(parts)
+
+
+def index_paths(settings, version: Optional[str] = None) -> Dict[str, str]:
+    """Diretórios lexical/semantic/fingerprint (e idmap, se versionada) de uma versão (padrão: a atual)."""
+    version = index_version(settings) if version is None else version
+    if version.startswith("mtime:"):
+        return {
+            "lexical": settings.INDEX_LEX_DIR,
+            "semantic": settings.INDEX_SEM_DIR,
+            "fingerprint": os.path.join(settings.DATA_INDEXES_DIR, "fingerprint"),
+        }
+    root = io_utils.index_version_dir(settings.DATA_INDEXES_DIR, version)
+    return {name: os.path.join(root, name) for name in ("idmap", "lexical", "semantic", "fingerprint")}
+
+
+def load_indexes(settings, version: Optional[str] = None) -> Indexes:
+    """Carrega todos os índices configurados em `settings` (padrão: versão atual)."""
+    version = index_version(settings) if version is None else version
+    paths = index_paths(settings, version)
+    # builds versionados: um único id_map (<versão>/idmap), aberto uma vez para os dois índices
+    shared = load_id_map(paths["idmap"]) if "idmap" in paths else None
+    tfidf_model, tfidf_matrix, id_map_lex = io_utils.load_index_lexical(paths["lexical"], shared)
+    embeddings, id_map_sem, model_name = io_utils.load_index_semantic(paths["semantic"], shared)
+    lsh_index = io_utils.load_lsh(paths["lexical"]) if settings.LEX_PREFILTER == "lsh" else None
+    return Indexes(
+        tfidf_model=tfidf_model,
+        tfidf_matrix=tfidf_matrix,
+        id_map_lex=id_map_lex,
+        postings=io_utils.load_postings_lexical(paths["lexical"], tfidf_matrix),
+        embeddings=embeddings,
+        id_map_sem=id_map_sem,
+        model_name=model_name,
+        ann_index=io_utils.load_ann_index(paths["semantic"]) if settings.SEM_SEARCH == "ivf" else None,
+        quant_index=(
+            io_utils.load_quantized_index(paths["semantic"], settings.SEM_QUANTIZATION)
+            if settings.SEM_QUANTIZATION != "none" else None
+        ),
+        lsh_index=lsh_index,
+        fp_index=load_fingerprints(paths["fingerprint"]) if settings.FP_KGRAM > 0 else None,
+        uid_index=build_uid_index(*((id_map_lex,) if id_map_sem is id_map_lex else (id_map_lex, id_map_sem))),
+        lex_rows=lexical_rows(id_map_lex) if lsh_index is not None else None,
+        version=version,
+    )
+
+
+class IndexStore:
+    """
+    Guarda os índices carregados (Indexes) para todo o processo.
+    - get(): carrega na 1ª chamada; depois, confere a versão em disco a cada
+      `reload_seconds` (0 = nunca) e, se mudou, dispara a carga em segundo plano
+    - warm(): força o carregamento antecipado (ex.: na inicialização do app)
+    - reload(): recarrega imediatamente, na thread atual
+    - wait(): aguarda a carga em segundo plano em andamento (se houver)
+    `loader(settings, version)` é load_indexes por padrão.
+    """
+
+    def __init__(self, settings, reload_seconds: Optional[float] = None, loader=load_indexes):
+        self.settings = settings
+        self.reload_seconds = float(settings.INDEX_RELOAD_SECONDS if reload_seconds is None else reload_seconds)
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._indexes: Optional[Indexes] = None
+        self._checked_at = 0.0
+        self._loading: Optional[threading.Thread] = None
+        self._failed_version: Optional[str] = None
+
+    def get(self) -> Indexes:
+        indexes = self._indexes
+        if indexes is None:
+            return self.warm()
+        if self.reload_seconds > 0 and time.monotonic() - self._checked_at >= self.reload_seconds:
+            self._check_version()
+        return self._indexes
+
+    def warm(self) -> Indexes:
+        with self._lock:
+            if self._indexes is None:
+                self._indexes = self._loader(self.settings, index_version(self.settings))
+                self._checked_at = time.monotonic()
+            return self._indexes
+
+    def reload(self) -> Indexes:
+        with self._lock:
+            self._indexes = self._loader(self.settings, index_version(self.settings))
+            self._checked_at = time.monotonic()
+            return self._indexes
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        loading = self._loading
+        if loading is not None:
+            loading.join(timeout)
+
+    def _check_version(self) -> None:
+        # se outra thread já está conferindo, segue com os índices atuais
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._checked_at = time.monotonic()
+            if self._loading is not None:
+                return
+            version = index_version(self.settings)
+            if version in (self._indexes.version, self._failed_version):
+                return
+            self._loading = threading.Thread(
+                target=self._load_in_background, args=(version,), name="index-store-reload", daemon=True,
+            )
+            self._loading.start()
+        finally:
+            self._lock.release()
+
+    def _load_in_background(self, version: str) -> None:
+        try:
+            indexes = self._loader(self.settings, version)
+        except Exception as e:  # versão corrompida/removida: mantém a atual
+            warnings.warn(f"Falha ao carregar os índices da versão {version} ({e}); mantendo a versão atual.")
+            indexes = None
+        with self._lock:
+            if indexes is not None:
+                self._indexes = indexes
+                self._failed_version = None
+            else:
+                self._failed_version = version
+            self._loading = None
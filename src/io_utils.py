@@ -1,10 +1,20 @@
 import os
 import json
 import glob
+import shutil
+import time
 import joblib
 import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from scipy import sparse
-from typing import List, Dict
+from typing import Iterator, List, Dict, Optional
+
+from src.ann_index import IVFIndex
+from src.compare_lexical import build_postings
+from src.id_map import IdMap, save_id_map, load_id_map
+from src.minhash_lsh import MinHashLSH
+from src.quantized_index import QuantizedIndex
 
 
 def ensure_dir(path: str) -> None:
@@ -12,12 +22,7 @@ def ensure_dir(path: str) -> None:
     os.makedirs(path, exist_ok=True)
 
 
-def load_corpus(path_raw: str, path_processed: str | None = None) -> List[Dict]:
-    """
-    Carrega o corpus a partir de data/processed (se existir e não vazio) ou data/raw.
-    Retorna uma lista de dicionários:
-      { "doc_id": str, "title": str, "text": str, "meta": dict }
-    """
+def _corpus_dir(path_raw: str, path_processed: str | None = None) -> str:
     base_path = (
         path_processed
         if path_processed and os.path.exists(path_processed) and os.listdir(path_processed)
@@ -25,26 +30,189 @@ def load_corpus(path_raw: str, path_processed: str | None = None) -> List[Dict]:
     )
     if not os.path.exists(base_path):
         raise FileNotFoundError(f"Diretório não encontrado: {base_path}")
+    return base_path
+
+
+def _read_doc(file_path: str) -> Dict:
+    doc_id = os.path.splitext(os.path.basename(file_path))[0]
+    with open(file_path, "r", encoding="utf-8") as f:
+        text = f.read()
+    return {
+        "doc_id": doc_id,
+        "title": doc_id,
+        "text": text,
+        "meta": {},
+    }
+
+
+def iter_corpus(
+    path_raw: str,
+    path_processed: str | None = None,
+    max_workers: int = 4,
+    prefetch: int = 0,
+) -> Iterator[Dict]:
+    """
+    Versão em streaming de load_corpus: lê os .txt em paralelo (pool de threads) e
+    entrega os documentos um a um, na ordem dos nomes de arquivo.
+    No máximo `prefetch` arquivos (padrão: 2 x max_workers) ficam lidos à frente do
+    consumidor, de modo que a memória não cresce com o tamanho do corpus.
+    """
+    files = sorted(glob.glob(os.path.join(_corpus_dir(path_raw, path_processed), "*.txt")))
+    max_workers = max(1, int(max_workers))
+    prefetch = max(1, int(prefetch) or 2 * max_workers)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = deque()
+        for file_path in files:
+            pending.append(pool.submit(_read_doc, file_path))
+            if len(pending) >= prefetch:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def load_corpus(path_raw: str, path_processed: str | None = None) -> List[Dict]:
+    """
+    Carrega o corpus a partir de data/processed (se existir e não vazio) ou data/raw.
+    Retorna uma lista de dicionários:
+      { "doc_id": str, "title": str, "text": str, "meta": dict }
+    """
+    return list(iter_corpus(path_raw, path_processed))
+
+
+def save_manifest(path_indexes: str, manifest: Dict) -> None:
+    """
+    Salva o manifesto do build (hash de conteúdo por documento + parâmetros usados),
+    consultado pelo modo incremental de pipeline_build_index.
+    """
+    ensure_dir(path_indexes)
+    with open(os.path.join(path_indexes, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+def load_manifest(path_indexes: str) -> Optional[Dict]:
+    """Carrega o manifesto do último build (None se não existir)."""
+    path = os.path.join(path_indexes, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# --- Versões dos índices ---
+# Cada build grava em DATA_INDEXES_DIR/versions/<versão>/ (idmap/, lexical/, semantic/,
+# fingerprint/, manifest.json); DATA_INDEXES_DIR/CURRENT aponta a versão em uso e
+# só é trocado (rename atômico) depois que todos os arquivos foram gravados.
+# O id_map (idmap/) é um só para os índices léxico e semântico.
+
+def index_version_dir(path_indexes: str, version: str) -> str:
+    return os.path.join(path_indexes, "versions", version)
+
+
+def current_index_version(path_indexes: str) -> Optional[str]:
+    """Versão apontada por CURRENT (None se os índices não forem versionados)."""
+    path = os.path.join(path_indexes, "CURRENT")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip() or None
+
+
+def current_index_dir(path_indexes: str) -> Optional[str]:
+    """Diretório da versão em uso (None se os índices não forem versionados)."""
+    version = current_index_version(path_indexes)
+    return index_version_dir(path_indexes, version) if version else None
+
+
+def new_index_version(path_indexes: str) -> str:
+    """Cria o diretório de uma nova versão (ainda não publicada) e retorna seu nome."""
+    version = time.strftime("%Y%m%d-%H%M%S") + f"-{time.time_ns() % 10**9:09d}"
+    os.makedirs(index_version_dir(path_indexes, version))
+    return version
+
 
-    corpus: List[Dict] = []
-    for file_path in sorted(glob.glob(os.path.join(base_path, "*.txt"))):
-        doc_id = os.path.splitext(os.path.basename(file_path))[0]
-        with open(file_path, "r", encoding="utf-8") as f:
-            text = f.read()
-        corpus.append(
-            {
-                "doc_id": doc_id,
-                "title": doc_id,
-                "text": text,
-                "meta": {},
-            }
-        )
-    return corpus
+def publish_index_version(path_indexes: str, version: str) -> None:
+    """Aponta CURRENT para `version` (escrita em arquivo temporário + rename atômico)."""
+    tmp = os.path.join(path_indexes, f"CURRENT.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(path_indexes, "CURRENT"))
+
+
+def prune_index_versions(path_indexes: str, keep: int = 2) -> List[str]:
+    """
+    Remove versões antigas, mantendo as `keep` mais recentes (a atual sempre fica).
+    Serviços que ainda usam uma versão removida seguem lendo os arquivos já abertos
+    (mmap); a próxima checagem do IndexStore troca para a atual.
+    Retorna as versões removidas.
+    """
+    root = os.path.join(path_indexes, "versions")
+    if not os.path.isdir(root):
+        return []
+    current = current_index_version(path_indexes)
+    versions = sorted(os.listdir(root), reverse=True)  # nomes ordenáveis por data
+    removed = [v for v in versions[max(1, keep):] if v != current]
+    for version in removed:
+        shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+    return removed
+
+
+def shared_id_map_dir(path_index: str) -> str:
+    """Diretório do id_map compartilhado, ao lado de lexical/ e semantic/ (<versão>/idmap)."""
+    return os.path.join(os.path.dirname(os.path.abspath(path_index)), "idmap")
+
+
+def _save_index_id_map(path_out: str, id_map) -> None:
+    """Grava o id_map em path_out, a menos que já seja o id_map compartilhado da versão."""
+    shared = shared_id_map_dir(path_out)
+    if isinstance(id_map, IdMap) and os.path.isdir(shared) and os.path.samefile(id_map.path, shared):
+        return
+    save_id_map(path_out, id_map)
+
+
+def _load_index_id_map(path_in: str):
+    """id_map do próprio diretório do índice ou, nos builds versionados, o compartilhado."""
+    id_map = load_id_map(path_in)
+    return id_map if id_map is not None else load_id_map(shared_id_map_dir(path_in))
+
+
+def _save_csr(path_out: str, prefix: str, matrix) -> None:
+    """
+    Salva uma matriz esparsa como arrays CSR crus (data/indices/indptr/shape), sem
+    compressão, para que possam ser abertos com np.load(mmap_mode="r").
+    """
+    matrix = sparse.csr_matrix(matrix)
+    np.save(os.path.join(path_out, f"{prefix}_data.npy"), matrix.data)
+    np.save(os.path.join(path_out, f"{prefix}_indices.npy"), matrix.indices)
+    np.save(os.path.join(path_out, f"{prefix}_indptr.npy"), matrix.indptr)
+    np.save(os.path.join(path_out, f"{prefix}_shape.npy"), np.asarray(matrix.shape, dtype=np.int64))
+
+
+def _load_csr(path_in: str, prefix: str) -> Optional[sparse.csr_matrix]:
+    """
+    Abre (memory-mapped, somente leitura) uma matriz salva por _save_csr.
+    Os arrays não são copiados: vários processos compartilham o mesmo page cache.
+    Retorna None se os arquivos não existirem.
+    """
+    if not os.path.exists(os.path.join(path_in, f"{prefix}_data.npy")):
+        return None
+    data, indices, indptr = (
+        np.load(os.path.join(path_in, f"{prefix}_{part}.npy"), mmap_mode="r")
+        for part in ("data", "indices", "indptr")
+    )
+    shape = tuple(int(x) for x in np.load(os.path.join(path_in, f"{prefix}_shape.npy")))
+    return sparse.csr_matrix((data, indices, indptr), shape=shape, copy=False)
 
 
 def save_index_lexical(path_out: str, tfidf_model, tfidf_matrix, id_map: List[Dict]) -> None:
     """
     Salva o índice léxico (TF-IDF) e metadados.
+    A matriz TF-IDF e seu layout invertido (postings, termos x blocos) são gravados
+    como arrays CSR crus, abertos via mmap no carregamento; o id_map é gravado no
+    formato colunar de src/id_map.py (a não ser que seja o IdMap compartilhado da
+    versão, <versão>/idmap, que já está em disco).
     id_map deve ser uma lista de dicts, um por BLOCO:
       {
         "doc_id": str,
@@ -56,41 +224,147 @@ def save_index_lexical(path_out: str, tfidf_model, tfidf_matrix, id_map: List[Di
     """
     ensure_dir(path_out)
     joblib.dump(tfidf_model, os.path.join(path_out, "tfidf_model.joblib"))
-    sparse.save_npz(os.path.join(path_out, "tfidf_matrix.npz"), tfidf_matrix)
-    with open(os.path.join(path_out, "id_map.json"), "w", encoding="utf-8") as f:
-        json.dump(id_map, f, ensure_ascii=False, indent=2)
+    _save_csr(path_out, "tfidf", tfidf_matrix)
+    _save_csr(path_out, "postings", build_postings(tfidf_matrix))
+    _save_index_id_map(path_out, id_map)
+    # pré-filtro LSH de um build anterior não corresponde mais aos blocos
+    for stale in glob.glob(os.path.join(path_out, "lsh_*")):
+        os.remove(stale)
 
 
-def load_index_lexical(path_in: str):
+def load_index_lexical(path_in: str, id_map=None):
     """
     Carrega o índice léxico (TF-IDF) e metadados (id_map).
+    A matriz é aberta via mmap (somente leitura) e o id_map é um IdMap colunar
+    (registros com texto lazy): o informado (ex.: o compartilhado com o índice
+    semântico, já aberto), o do diretório ou o da versão (<versão>/idmap). Índices
+    antigos, salvos como tfidf_matrix.npz / id_map.json, continuam sendo lidos (em memória).
     Retorna: (tfidf_model, tfidf_matrix, id_map)
     """
     model = joblib.load(os.path.join(path_in, "tfidf_model.joblib"))
-    matrix = sparse.load_npz(os.path.join(path_in, "tfidf_matrix.npz"))
-    with open(os.path.join(path_in, "id_map.json"), "r", encoding="utf-8") as f:
-        id_map = json.load(f)
+    matrix = _load_csr(path_in, "tfidf")
+    if matrix is None:
+        matrix = sparse.load_npz(os.path.join(path_in, "tfidf_matrix.npz"))
+    if id_map is None:
+        id_map = _load_index_id_map(path_in)
+    if id_map is None:
+        with open(os.path.join(path_in, "id_map.json"), "r", encoding="utf-8") as f:
+            id_map = json.load(f)
     return model, matrix, id_map
 
 
-def save_index_semantic(path_out: str, embeddings: np.ndarray, id_map: List[Dict], model_name: str) -> None:
+def load_postings_lexical(path_in: str, tfidf_matrix=None) -> Optional[sparse.csr_matrix]:
+    """
+    Carrega (via mmap) o layout invertido do índice léxico. Para índices antigos,
+    sem postings em disco, calcula-o a partir de tfidf_matrix (se informada).
+    """
+    postings = _load_csr(path_in, "postings")
+    if postings is None and tfidf_matrix is not None:
+        postings = build_postings(tfidf_matrix)
+    return postings
+
+
+def save_lsh(path_out: str, index: MinHashLSH) -> None:
+    """Salva o pré-filtro MinHash/LSH junto ao índice léxico."""
+    ensure_dir(path_out)
+    np.save(os.path.join(path_out, "lsh_signatures.npy"), index.signatures)
+    np.save(os.path.join(path_out, "lsh_keys.npy"), index.band_keys)
+    np.save(os.path.join(path_out, "lsh_ids.npy"), index.band_ids)
+    params = {"num_perm": index.num_perm, "bands": index.bands,
+              "shingle_size": index.shingle_size, "seed": index.seed}
+    with open(os.path.join(path_out, "lsh_params.json"), "w", encoding="utf-8") as f:
+        json.dump(params, f, indent=2)
+
+
+def load_lsh(path_in: str) -> Optional[MinHashLSH]:
+    """Abre (mmap) o pré-filtro MinHash/LSH; None se não tiver sido construído."""
+    params_path = os.path.join(path_in, "lsh_params.json")
+    if not os.path.exists(params_path):
+        return None
+    with open(params_path, "r", encoding="utf-8") as f:
+        params = json.load(f)
+    signatures, keys, ids = (
+        np.load(os.path.join(path_in, f"lsh_{name}.npy"), mmap_mode="r")
+        for name in ("signatures", "keys", "ids")
+    )
+    return MinHashLSH(signatures=signatures, band_keys=keys, band_ids=ids, **params)
+
+
+def save_index_semantic(
+    path_out: str,
+    embeddings: np.ndarray,
+    id_map: List[Dict],
+    model_name: str,
+    ann_index: Optional[IVFIndex] = None,
+    quantized: Optional[QuantizedIndex] = None,
+) -> None:
     """
     Salva o índice semântico (embeddings) e metadados.
-    id_map segue o mesmo formato do índice léxico.
+    id_map segue o mesmo formato do índice léxico (e, como lá, o IdMap compartilhado
+    da versão não é regravado).
+    Se ann_index (IVF) for informado, suas listas invertidas são salvas junto.
+    Se quantized for informado, os vetores comprimidos vão em emb_<tipo>.npy
+    (e emb_scales.npy, no int8); embeddings.npy continua em float32 para o re-rank.
     """
     ensure_dir(path_out)
-    np.save(os.path.join(path_out, "embeddings.npy"), embeddings)
-    meta = {"id_map": id_map, "model_name": model_name}
+    emb_path = os.path.join(path_out, "embeddings.npy")
+    # embeddings já gravados no lugar (memmap do build, ver pipeline_build_index) não são regravados
+    if not (isinstance(embeddings, np.memmap) and embeddings.filename
+            and os.path.abspath(embeddings.filename) == os.path.abspath(emb_path)):
+        np.save(emb_path, np.asarray(embeddings, dtype=np.float32))
+    # listas IVF e vetores quantizados de um build anterior não correspondem mais aos embeddings
+    for stale in glob.glob(os.path.join(path_out, "ivf_*.npy")) + glob.glob(os.path.join(path_out, "emb_*.npy")):
+        os.remove(stale)
+    if ann_index is not None:
+        np.save(os.path.join(path_out, "ivf_centroids.npy"), ann_index.centroids)
+        np.save(os.path.join(path_out, "ivf_offsets.npy"), ann_index.list_offsets)
+        np.save(os.path.join(path_out, "ivf_ids.npy"), ann_index.list_ids)
+    if quantized is not None:
+        np.save(os.path.join(path_out, f"emb_{quantized.kind}.npy"), quantized.codes)
+        if quantized.scales is not None:
+            np.save(os.path.join(path_out, "emb_scales.npy"), quantized.scales)
+    _save_index_id_map(path_out, id_map)
+    meta = {"model_name": model_name}
     with open(os.path.join(path_out, "meta.json"), "w", encoding="utf-8") as f:
         json.dump(meta, f, ensure_ascii=False, indent=2)
 
 
-def load_index_semantic(path_in: str):
+def load_index_semantic(path_in: str, id_map=None):
     """
     Carrega o índice semântico (embeddings) e metadados (id_map + model_name).
+    Os embeddings são abertos via mmap (somente leitura, sem cópia privada por processo);
+    o id_map é o informado ou um IdMap colunar, buscado como em load_index_lexical
+    (ou a lista do meta.json, em índices antigos).
     Retorna: (embeddings, id_map, model_name)
     """
-    embeddings = np.load(os.path.join(path_in, "embeddings.npy"))
+    embeddings = np.load(os.path.join(path_in, "embeddings.npy"), mmap_mode="r")
     with open(os.path.join(path_in, "meta.json"), "r", encoding="utf-8") as f:
         meta = json.load(f)
-    return embeddings, meta["id_map"], meta["model_name"]
+    if id_map is None:
+        id_map = meta["id_map"] if "id_map" in meta else _load_index_id_map(path_in)
+    return embeddings, id_map, meta["model_name"]
+
+
+def load_ann_index(path_in: str) -> Optional[IVFIndex]:
+    """
+    Carrega o índice aproximado (IVF) salvo junto ao índice semântico.
+    Retorna None se o índice não tiver sido construído.
+    """
+    files = [os.path.join(path_in, f"ivf_{name}.npy") for name in ("centroids", "offsets", "ids")]
+    if not all(os.path.exists(f) for f in files):
+        return None
+    centroids, offsets, ids = (np.load(f, mmap_mode="r") for f in files)
+    return IVFIndex(centroids=centroids, list_offsets=offsets, list_ids=ids)
+
+
+def load_quantized_index(path_in: str, kind: str) -> Optional[QuantizedIndex]:
+    """
+    Abre (mmap) os vetores quantizados ("float16" ou "int8") do índice semântico.
+    Retorna None se o pipeline não os tiver gerado.
+    """
+    codes_path = os.path.join(path_in, f"emb_{kind}.npy")
+    if not os.path.exists(codes_path):
+        return None
+    scales_path = os.path.join(path_in, "emb_scales.npy")
+    scales = np.load(scales_path) if kind == "int8" else None
+    return QuantizedIndex(codes=np.load(codes_path, mmap_mode="r"), scales=scales)
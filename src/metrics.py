@@ -0,0 +1,174 @@
+# src/metrics.py
+# Instrumentação do pipeline de comparação: tempo por etapa, contadores e profiling.
+#
+#   with METRICS.stage("embedding"):     # acumula nº de chamadas, tempo total e máximo
+#       ...
+#   METRICS.inc("windows", n)            # contadores (janelas, candidatos, cache...)
+#   METRICS.snapshot()                   # dict com tudo (ex.: para logs/benchmarks)
+#   METRICS.prometheus()                 # formato texto do Prometheus
+#   start_metrics_server(9100)           # GET /metrics numa thread de fundo (METRICS_PORT)
+#
+# profile_request() é o gancho opcional por requisição (PROFILE_DIR): roda o cProfile
+# durante a comparação e, se ela levar mais que PROFILE_MIN_MS, grava o perfil
+# (<nome>.prof, para pstats/snakeviz) e o tempo de cada etapa (<nome>.json).
+
+import cProfile
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, Optional
+
+# Etapas da requisição em andamento na thread (preenchido só dentro de profile_request)
+_local = threading.local()
+
+
+class Metrics:
+    """Timers por etapa (nº, soma e máximo, em segundos) e contadores. Seguro entre threads."""
+
+    def __init__(self, prefix: str = "plagio"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._stages: Dict[str, list] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            entry = self._stages.setdefault(name, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+        trace = getattr(_local, "trace", None)
+        if trace is not None:
+            trace[name] = trace.get(name, 0.0) + seconds
+
+    def inc(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._stages.clear()
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "stages": {
+                    name: {
+                        "count": count,
+                        "total_s": total,
+                        "mean_ms": 1000.0 * total / count if count else 0.0,
+                        "max_ms": 1000.0 * max_s,
+                    }
+                    for name, (count, total, max_s) in self._stages.items()
+                },
+            }
+
+    def prometheus(self) -> str:
+        """Exposição no formato texto do Prometheus (versão 0.0.4)."""
+        snap = self.snapshot()
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_stage_seconds Tempo gasto em cada etapa da comparação.",
+            f"# TYPE {p}_stage_seconds summary",
+        ]
+        for name, s in sorted(snap["stages"].items()):
+            lines.append(f'{p}_stage_seconds_count{{stage="{name}"}} {s["count"]}')
+            lines.append(f'{p}_stage_seconds_sum{{stage="{name}"}} {s["total_s"]:.6f}')
+        lines.append(f"# TYPE {p}_stage_seconds_max gauge")
+        for name, s in sorted(snap["stages"].items()):
+            lines.append(f'{p}_stage_seconds_max{{stage="{name}"}} {s["max_ms"] / 1000.0:.6f}')
+        for name, value in sorted(snap["counters"].items()):
+            lines.append(f"# TYPE {p}_{name}_total counter")
+            lines.append(f"{p}_{name}_total {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+# Métricas compartilhadas pelo processo
+METRICS = Metrics()
+
+
+@contextmanager
+def profile_request(label: str, profile_dir: str, min_seconds: float = 0.0) -> Iterator[None]:
+    """
+    Gancho de profiling por requisição. Sem `profile_dir`, não faz nada. Com ele, roda
+    o cProfile e registra o tempo de cada etapa (METRICS.stage) da requisição; se ela
+    levar pelo menos `min_seconds`, grava <label>-<data>-<ms>ms-<pid>.prof e .json.
+    """
+    if not profile_dir:
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # outro profiler já ativo (ex.: requisição aninhada)
+        yield
+        return
+    _local.trace = trace = {}
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        profiler.disable()
+        _local.trace = None
+        if elapsed >= min_seconds:
+            _save_profile(profiler, trace, label, profile_dir, elapsed)
+
+
+def _save_profile(profiler: cProfile.Profile, trace: Dict[str, float], label: str, profile_dir: str, elapsed: float) -> str:
+    os.makedirs(profile_dir, exist_ok=True)
+    name = f"{label}-{time.strftime('%Y%m%d-%H%M%S')}-{int(elapsed * 1000)}ms-{os.getpid()}"
+    base = os.path.join(profile_dir, name)
+    profiler.dump_stats(base + ".prof")
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump({"label": label, "seconds": elapsed, "stages": trace}, f, ensure_ascii=False, indent=2)
+    return base
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = METRICS.prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # sem log por scrape
+        pass
+
+
+_SERVER: Optional[ThreadingHTTPServer] = None
+_SERVER_LOCK = threading.Lock()
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> Optional[ThreadingHTTPServer]:
+    """
+    Serve GET /metrics (formato Prometheus) numa thread de fundo. Idempotente: chamadas
+    seguintes (ex.: reruns do Streamlit) reaproveitam o servidor. port <= 0 desativa.
+    """
+    global _SERVER
+    if port <= 0:
+        return None
+    with _SERVER_LOCK:
+        if _SERVER is None:
+            _SERVER = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_SERVER.serve_forever, name="metrics-http", daemon=True).start()
+        return _SERVER
@@ -0,0 +1,134 @@
+# src/minhash_lsh.py
+# Pré-filtro de quase-duplicatas (cópia literal) com MinHash + LSH.
+#
+# Cada bloco vira um conjunto de shingles (n-gramas de palavras) e uma assinatura
+# MinHash de `num_perm` valores; a fração de valores iguais entre duas assinaturas
+# estima a similaridade de Jaccard dos conjuntos. A assinatura é cortada em `bands`
+# faixas de r = num_perm / bands valores: blocos que coincidem em ao menos uma faixa
+# viram candidatos. A probabilidade de um par com Jaccard J ser candidato é
+# 1 - (1 - J^r)^bands (padrão 96/32 -> r=3: J=0.5 ~ 99%, J=0.3 ~ 58%, J=0.1 ~ 3%).
+#
+# Em disco (diretório do índice léxico): lsh_params.json, lsh_signatures.npy,
+# lsh_keys.npy e lsh_ids.npy (por faixa: chaves ordenadas + blocos correspondentes).
+
+import zlib
+from dataclasses import dataclass
+from typing import Iterable, List, Tuple
+import numpy as np
+
+_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+@dataclass(frozen=True)
+class MinHashLSH:
+    signatures: np.ndarray  # (n_blocos, num_perm) uint32
+    band_keys: np.ndarray   # (bands, n_blocos) uint64, ordenadas em cada faixa
+    band_ids: np.ndarray    # (bands, n_blocos) int64: bloco de cada chave
+    num_perm: int
+    bands: int
+    shingle_size: int
+    seed: int
+
+    @property
+    def rows_per_band(self) -> int:
+        return self.num_perm // self.bands
+
+
+def shingle_hashes(text: str, shingle_size: int = 3) -> np.ndarray:
+    """Hashes (crc32) dos n-gramas de palavras do texto; textos curtos viram um único shingle."""
+    words = text.split()
+    n = max(1, min(shingle_size, len(words)))
+    shingles = {" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+    return np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+
+def _permutations(num_perm: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    # (a·x + b) mod P com a, b < 2^32 e x < 2^32: o produto cabe em uint64
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def _band_multipliers(rows: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed + 1)
+    return rng.integers(1, 1 << 63, size=rows, dtype=np.uint64) | np.uint64(1)
+
+
+def minhash_signatures(
+    texts: Iterable[str],
+    num_perm: int = 96,
+    shingle_size: int = 3,
+    seed: int = 0,
+) -> np.ndarray:
+    """Assinaturas MinHash (n_textos x num_perm) uint32."""
+    a, b = _permutations(num_perm, seed)
+    sigs = []
+    for text in texts:
+        h = shingle_hashes(text, shingle_size)
+        sigs.append((((h[:, None] * a + b) % _PRIME) & _MAX_HASH).min(axis=0))
+    if not sigs:
+        return np.zeros((0, num_perm), dtype=np.uint32)
+    return np.stack(sigs).astype(np.uint32)
+
+
+def _band_hashes(signatures: np.ndarray, bands: int, seed: int) -> np.ndarray:
+    """Uma chave uint64 por (faixa, bloco): combinação linear dos r valores da faixa."""
+    n, num_perm = signatures.shape
+    rows = num_perm // bands
+    mult = _band_multipliers(rows, seed)
+    sig = signatures[:, :bands * rows].astype(np.uint64).reshape(n, bands, rows)
+    with np.errstate(over="ignore"):  # aritmética módulo 2^64, intencional
+        return (sig * mult).sum(axis=2, dtype=np.uint64).T  # (bands, n)
+
+
+def build_lsh(
+    texts: Iterable[str],
+    num_perm: int = 96,
+    bands: int = 32,
+    shingle_size: int = 3,
+    seed: int = 0,
+) -> MinHashLSH:
+    """Calcula as assinaturas dos blocos e as tabelas de faixas (ordenadas para busca binária)."""
+    if bands <= 0 or num_perm % bands:
+        raise ValueError(f"num_perm ({num_perm}) deve ser múltiplo de bands ({bands}).")
+    signatures = minhash_signatures(texts, num_perm, shingle_size, seed)
+    keys = _band_hashes(signatures, bands, seed)
+    order = np.argsort(keys, axis=1, kind="stable")
+    return MinHashLSH(
+        signatures=signatures,
+        band_keys=np.take_along_axis(keys, order, axis=1),
+        band_ids=order.astype(np.int64),
+        num_perm=num_perm,
+        bands=bands,
+        shingle_size=shingle_size,
+        seed=seed,
+    )
+
+
+def query_lsh(index: MinHashLSH, texts: List[str]) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Candidatos de cada texto: blocos que coincidem em ao menos uma faixa.
+    Retorna, por texto, (blocos_candidatos ordenados, Jaccard estimado de cada um).
+    O custo é proporcional ao nº de candidatos (+ bands buscas binárias), não ao corpus.
+    """
+    sigs = minhash_signatures(texts, index.num_perm, index.shingle_size, index.seed)
+    keys = _band_hashes(sigs, index.bands, index.seed)
+
+    results: List[Tuple[np.ndarray, np.ndarray]] = []
+    for q in range(len(texts)):
+        found = []
+        for band in range(index.bands):
+            row = index.band_keys[band]
+            lo = np.searchsorted(row, keys[band, q], side="left")
+            hi = np.searchsorted(row, keys[band, q], side="right")
+            if hi > lo:
+                found.append(index.band_ids[band, lo:hi])
+        if not found:
+            results.append((np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)))
+            continue
+        cand = np.unique(np.concatenate(found))
+        jaccard = (np.asarray(index.signatures[cand]) == sigs[q]).mean(axis=1).astype(np.float32)
+        results.append((cand, jaccard))
+    return results
@@ -0,0 +1,178 @@
+# src/onnx_backend.py
+# Backend ONNX (onnxruntime, CPU) para o codificador de consultas.
+#
+# Exportação (uma vez por modelo):
+#   python -m src.onnx_backend export                 # modelo de SEM_MODEL_NAME, int8
+#   python -m src.onnx_backend export --no-quantize   # mantém float32
+#
+# Gera em SEM_ONNX_DIR/<slug do modelo>/:
+#   model.onnx / model_int8.onnx -> transformer (saída: last_hidden_state)
+#   tokenizer (arquivos do HuggingFace) + onnx_config.json (pooling, max_seq_length)
+# O pooling e a normalização L2 são feitos em NumPy, como no SentenceTransformer.
+# Com SEM_BACKEND=onnx, compare_semantic usa OnnxEncoder no lugar do modelo torch.
+
+import argparse
+import hashlib
+import json
+import os
+from typing import Dict, List, Sequence
+import numpy as np
+
+
+def model_dir(onnx_dir: str, model_name: str) -> str:
+    """Diretório do modelo exportado dentro de SEM_ONNX_DIR."""
+    slug = model_name.rstrip("/").split("/")[-1]
+    return os.path.join(onnx_dir, f"{slug}-{hashlib.sha1(model_name.encode('utf-8')).hexdigest()[:8]}")
+
+
+def _pool(hidden: np.ndarray, attention_mask: np.ndarray, mode: str) -> np.ndarray:
+    """Pooling sobre os tokens (mean ignora o padding via attention_mask; cls usa o 1º token)."""
+    if mode == "cls":
+        return hidden[:, 0]
+    mask = attention_mask[..., None].astype(hidden.dtype)
+    return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return x / norms
+
+
+class OnnxEncoder:
+    """
+    Codificador com a mesma interface usada do SentenceTransformer
+    (encode, tokenizer, max_seq_length), executado pelo onnxruntime.
+    """
+
+    def __init__(self, path: str, threads: int = 0):
+        import onnxruntime as ort  # dependências opcionais: só com SEM_BACKEND=onnx
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(path, "onnx_config.json"), "r", encoding="utf-8") as f:
+            self.config: Dict = json.load(f)
+        self.model_name = self.config["model_name"]
+        self.max_seq_length = int(self.config["max_seq_length"])
+        self.pooling = self.config.get("pooling", "mean")
+        self.tokenizer = AutoTokenizer.from_pretrained(path)
+
+        options = ort.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        onnx_file = os.path.join(path, self.config["onnx_file"])
+        self.session = ort.InferenceSession(onnx_file, options, providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self.session.get_inputs()}
+
+    def encode(
+        self,
+        texts: Sequence[str],
+        batch_size: int = 32,
+        convert_to_numpy: bool = True,
+        normalize_embeddings: bool = True,
+        show_progress_bar: bool = False,
+    ) -> np.ndarray:
+        out: List[np.ndarray] = []
+        texts = list(texts)
+        for s in range(0, len(texts), max(1, batch_size)):
+            enc = self.tokenizer(
+                texts[s:s + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            feed = {k: v.astype(np.int64) for k, v in enc.items() if k in self._inputs}
+            hidden = self.session.run(None, feed)[0]
+            out.append(_pool(hidden, enc["attention_mask"], self.pooling))
+        emb = np.concatenate(out).astype(np.float32) if out else np.zeros((0, 0), dtype=np.float32)
+        return _normalize(emb) if normalize_embeddings else emb
+
+
+def exportable_pooling(st_model) -> str:
+    """
+    Pooling ("mean" ou "cls") de um SentenceTransformer reproduzível por OnnxEncoder:
+    Transformer -> Pooling, seguido no máximo de Normalize (a normalização L2 é refeita
+    em NumPy). Outros poolings (max, weightedmean, ...) ou módulos extras (Dense, ...)
+    levantam ValueError: o ONNX geraria vetores diferentes dos do corpus.
+    """
+    modules = [type(m).__name__ for m in st_model]
+    if modules[:2] != ["Transformer", "Pooling"] or any(m != "Normalize" for m in modules[2:]):
+        raise ValueError(f"Pilha de módulos não suportada na exportação ONNX: {' -> '.join(modules)}")
+    pooling = st_model[1].get_pooling_mode_str()
+    if pooling not in ("mean", "cls"):
+        raise ValueError(f"Pooling '{pooling}' não suportado na exportação ONNX (só mean ou cls).")
+    return pooling
+
+
+def export_onnx(model_name: str, onnx_dir: str, quantize: bool = True, opset: int = 14) -> str:
+    """
+    Exporta o transformer do SentenceTransformer para ONNX (eixos de lote e de
+    sequência dinâmicos) e, com quantize=True, aplica quantização dinâmica int8 dos
+    pesos (onnxruntime.quantization). Retorna o diretório gerado. Só modelos
+    Transformer -> Pooling (mean/cls) [-> Normalize]; ver exportable_pooling.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    pooling = exportable_pooling(st_model)
+    out = model_dir(onnx_dir, model_name)
+    os.makedirs(out, exist_ok=True)
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+
+    sample = tokenizer(["exemplo de entrada"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class _Wrapper(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    dynamic = {name: {0: "batch", 1: "seq"} for name in input_names}
+    dynamic["last_hidden_state"] = {0: "batch", 1: "seq"}
+    fp32_path = os.path.join(out, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            _Wrapper(transformer),
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic,
+            opset_version=opset,
+        )
+
+    onnx_file = "model.onnx"
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32_path, os.path.join(out, "model_int8.onnx"), weight_type=QuantType.QInt8)
+        onnx_file = "model_int8.onnx"
+
+    tokenizer.save_pretrained(out)
+    with open(os.path.join(out, "onnx_config.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "model_name": model_name,
+            "onnx_file": onnx_file,
+            "pooling": pooling,
+            "max_seq_length": int(st_model.max_seq_length),
+        }, f, ensure_ascii=False, indent=2)
+    return out
+
+
+if __name__ == "__main__":
+    from src.config import settings
+
+    parser = argparse.ArgumentParser(description="Backend ONNX do codificador de consultas.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    exp = sub.add_parser("export", help="exporta o modelo para ONNX (int8 por padrão)")
+    exp.add_argument("--model", default=settings.SEM_MODEL_NAME)
+    exp.add_argument("--out", default=settings.SEM_ONNX_DIR)
+    exp.add_argument("--no-quantize", action="store_true", help="mantém os pesos em float32")
+    args = parser.parse_args()
+
+    path = export_onnx(args.model, args.out, quantize=not args.no_quantize)
+    print(f"✅ Modelo exportado em: {path}")
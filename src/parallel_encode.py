@@ -0,0 +1,191 @@
+# src/parallel_encode.py
+# Geração de embeddings em vários processos, para o build dos índices.
+#
+# Os textos são divididos em SHARDS (por padrão, um por processo em cada chamada, com
+# um tamanho mínimo); cada processo do pool carrega o modelo uma vez e codifica shards
+# inteiros. O resultado de cada shard é gravado em
+# shard_dir/<chave>.npy (chave = hash do modelo + textos do shard) assim que fica
+# pronto: se o build for interrompido, a próxima execução só codifica os shards que
+# faltam. A matriz final é montada na ordem original dos textos. As métricas de lote
+# (src/batching.py) de cada shard voltam com ele e são somadas no processo principal.
+
+import hashlib
+import math
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+
+from src.batching import ENCODE_METRICS, BatchingMetrics, encode_with_model
+
+EncodeFn = Callable[[List[str]], np.ndarray]
+
+# Estado de cada processo do pool (preenchido por _init_worker)
+_WORKER_ENCODE: Optional[EncodeFn] = None
+
+
+def _sentence_transformer_encoder(model_name: str, batch_size: int, max_tokens: int) -> EncodeFn:
+    from sentence_transformers import SentenceTransformer  # import tardio
+    model = SentenceTransformer(model_name)
+    return lambda texts: encode_with_model(model, texts, max_tokens, batch_size)
+
+
+def _init_worker(
+    model_name: str,
+    batch_size: int,
+    max_tokens: int,
+    threads: int,
+    encoder: Optional[EncodeFn],
+) -> None:
+    """Inicializa um processo do pool: limita as threads do torch e carrega o modelo."""
+    global _WORKER_ENCODE
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _WORKER_ENCODE = encoder or _sentence_transformer_encoder(model_name, batch_size, max_tokens)
+
+
+def _encode_shard(texts: List[str]) -> Tuple[np.ndarray, Dict[str, float]]:
+    """Codifica um shard no processo do pool; devolve também as métricas de lote dele."""
+    ENCODE_METRICS.reset()  # cada processo codifica um shard por vez
+    embeddings = np.asarray(_WORKER_ENCODE(texts), dtype=np.float32)
+    return embeddings, ENCODE_METRICS.counters()
+
+
+def shard_key(model_name: str, texts: List[str]) -> str:
+    h = hashlib.sha1(model_name.encode("utf-8"))
+    for text in texts:
+        h.update(b"\0")
+        h.update(text.encode("utf-8"))
+    return h.hexdigest()
+
+
+class ShardedEncoder:
+    """
+    Codificador multi-processo com retomada por shard.
+
+    - workers: nº de processos (<= 1 codifica no próprio processo, também por shards)
+    - batch_size / max_tokens: limites de cada lote (src/batching.py) dentro dos processos
+    - shard_size: nº de textos por shard (unidade de trabalho e de checkpoint); None =
+      dividir cada chamada igualmente entre os processos, com no mínimo min_shard_size
+    - shard_dir: onde gravar os shards prontos ("" / None = sem retomada)
+    - encoder: função picklable texts -> embeddings, usada no lugar do
+      SentenceTransformer (testes e benchmarks)
+    - metrics: onde somar as métricas de lote dos shards codificados no pool
+      (seconds = soma dos tempos de codificação dos processos)
+    O pool é criado na primeira chamada e reaproveitado até close().
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        workers: int = 1,
+        batch_size: int = 32,
+        max_tokens: int = 8192,
+        shard_size: Optional[int] = None,
+        shard_dir: Optional[str] = None,
+        min_shard_size: int = 64,
+        encoder: Optional[EncodeFn] = None,
+        metrics: Optional[BatchingMetrics] = ENCODE_METRICS,
+    ):
+        self.model_name = model_name
+        self.workers = max(1, int(workers))
+        self.batch_size = max(1, int(batch_size))
+        self.max_tokens = max(1, int(max_tokens))
+        self.shard_size = max(1, int(shard_size)) if shard_size else None
+        self.min_shard_size = max(1, int(min_shard_size))
+        self.submitted = 0  # shards enviados ao pool
+        self.shard_dir = shard_dir or None
+        self.encoder = encoder
+        self.metrics = metrics
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._local: Optional[EncodeFn] = None
+        self._lock = threading.Lock()  # encode() pode ser chamado de várias threads
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            return self._get_pool_locked()
+
+    def _get_pool_locked(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            threads = max(1, (os.cpu_count() or 1) // self.workers)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(self.model_name, self.batch_size, self.max_tokens, threads, self.encoder),
+            )
+        return self._pool
+
+    def _encode_local(self, texts: List[str]) -> np.ndarray:
+        if self._local is None:
+            self._local = self.encoder or _sentence_transformer_encoder(
+                self.model_name, self.batch_size, self.max_tokens
+            )
+        return np.asarray(self._local(texts), dtype=np.float32)
+
+    def _shard_size_for(self, n_texts: int) -> int:
+        if self.shard_size:
+            return self.shard_size
+        # um shard por processo: todos os workers ocupados em cada chamada
+        return max(self.min_shard_size, math.ceil(n_texts / self.workers))
+
+    def _shard_path(self, key: str) -> Optional[str]:
+        return os.path.join(self.shard_dir, f"{key}.npy") if self.shard_dir else None
+
+    def _store(self, key: str, embeddings: np.ndarray) -> None:
+        path = self._shard_path(key)
+        if path is None:
+            return
+        tmp = path[:-len(".npy")] + ".tmp.npy"
+        np.save(tmp, embeddings)
+        os.replace(tmp, path)  # shard só aparece completo
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Codifica `texts` (retomando shards já gravados) e retorna (N x dim) em ordem."""
+        texts = list(texts)
+        size = self._shard_size_for(len(texts))
+        shards = [texts[s:s + size] for s in range(0, len(texts), size)]
+        if not shards:
+            return np.zeros((0, 0), dtype=np.float32)
+        if self.shard_dir:
+            os.makedirs(self.shard_dir, exist_ok=True)
+
+        keys = [shard_key(self.model_name, shard) for shard in shards]
+        results: List[Optional[np.ndarray]] = [None] * len(shards)
+        for i, key in enumerate(keys):
+            path = self._shard_path(key)
+            if path and os.path.exists(path):
+                results[i] = np.load(path)
+
+        todo = [i for i, r in enumerate(results) if r is None]
+        if todo and self.workers > 1:
+            pool = self._get_pool()
+            futures = {pool.submit(_encode_shard, shards[i]): i for i in todo}
+            with self._lock:
+                self.submitted += len(futures)
+            for future in as_completed(futures):
+                i = futures[future]
+                results[i], counters = future.result()
+                if self.metrics is not None:
+                    self.metrics.record(**counters)
+                self._store(keys[i], results[i])  # grava na ordem de término
+        else:
+            for i in todo:
+                results[i] = self._encode_local(shards[i])
+                self._store(keys[i], results[i])
+        return np.concatenate(results)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def __enter__(self) -> "ShardedEncoder":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -1,107 +1,419 @@
+import argparse
+import functools
+import hashlib
 import os
-from typing import List, Dict, Tuple
-from sklearn.feature_extraction.text import TfidfVectorizer
+import shutil
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
 
 from src import io_utils
-from src.preprocess import build_windows
+from src.ann_index import build_ivf
+from src.batching import ENCODE_METRICS, encode_with_model
+from src.compare_lexical import make_tfidf_vectorizer
+from src.embedding_cache import EmbeddingCache, cached_encode, open_cache
+from src.fingerprint_index import FingerprintWriter, save_fingerprints
+from src.id_map import IdMap, IdMapWriter, load_id_map
+from src.minhash_lsh import build_lsh
+from src.parallel_encode import ShardedEncoder
+from src.preprocess import TokenizedText, build_windows
+from src.quantized_index import QUANTIZATION_KINDS, quantize
 from src.config import settings
 
 
-def _encode_embeddings(texts: List[str], model_name: str):
-    """
-    Carrega modelo SentenceTransformers e gera embeddings normalizados em lote.
-    """
+@functools.lru_cache(maxsize=2)
+def _load_model(model_name: str):
+    """Carrega o SentenceTransformer uma única vez (o build codifica em vários lotes)."""
     from sentence_transformers import SentenceTransformer  # import tardio para evitar custo no import global
     print(f"[INFO] Carregando modelo de embeddings: {model_name}")
-    model = SentenceTransformer(model_name)
+    return SentenceTransformer(model_name)
+
+
+def _shard_dir() -> str:
+    return os.path.join(settings.DATA_INDEXES_DIR, "_encode_shards")
+
+
+# Pools de codificação abertos durante o build (um por modelo)
+_ENCODERS: Dict[str, ShardedEncoder] = {}
+
+# Lotes de blocos codificados ao mesmo tempo com ENCODE_WORKERS > 1: enquanto os shards
+# de um lote terminam, os do seguinte já ocupam os processos livres do pool
+_CHUNKS_IN_FLIGHT = 2
+
 
+def _sharded_encoder(model_name: str) -> ShardedEncoder:
+    """
+    Pool de processos de codificação (ENCODE_WORKERS > 1), reaproveitado entre lotes.
+    Cada lote é dividido num shard por processo (ver ShardedEncoder.shard_size).
+    """
+    if model_name not in _ENCODERS:
+        print(f"[INFO] Codificação multi-processo: {settings.ENCODE_WORKERS} processos")
+        _ENCODERS[model_name] = ShardedEncoder(
+            model_name,
+            workers=settings.ENCODE_WORKERS,
+            batch_size=settings.ENCODE_BATCH_SIZE,
+            max_tokens=settings.ENCODE_MAX_TOKENS,
+            shard_dir=_shard_dir(),
+        )
+    return _ENCODERS[model_name]
+
+
+def _close_encoders(build_ok: bool) -> None:
+    """Encerra os pools; após um build completo, descarta os shards de retomada."""
+    for encoder in _ENCODERS.values():
+        encoder.close()
+    _ENCODERS.clear()
+    if build_ok:
+        shutil.rmtree(_shard_dir(), ignore_errors=True)
+
+
+def _encode_with_model(texts: List[str], model_name: str):
+    """
+    Gera embeddings normalizados em lote com o modelo SentenceTransformers.
+    Com ENCODE_WORKERS > 1, os blocos são divididos em shards e codificados em vários
+    processos; shards já concluídos por um build interrompido são reaproveitados.
+    """
     print(f"[INFO] Gerando embeddings para {len(texts)} blocos...")
-    embeddings = model.encode(
-        texts,
-        batch_size=32,                 # ajusta se tiver pouca memória
-        convert_to_numpy=True,
-        normalize_embeddings=True,
-        show_progress_bar=True
+    if settings.ENCODE_WORKERS > 1:
+        return _sharded_encoder(model_name).encode(texts)
+
+    # lotes de até ENCODE_MAX_TOKENS tokens (com padding) e ENCODE_BATCH_SIZE blocos
+    return encode_with_model(_load_model(model_name), texts, settings.ENCODE_MAX_TOKENS, settings.ENCODE_BATCH_SIZE)
+
+
+def _encode_embeddings(texts: List[str], model_name: str, cache: Optional[EmbeddingCache] = None):
+    """
+    Gera embeddings normalizados, consultando antes o cache persistente
+    (EMB_CACHE_DIR, aberto uma vez por build): o modelo só é carregado se houver
+    blocos ainda não vistos. Sem `cache`, codifica tudo com o modelo.
+    """
+    return cached_encode(texts, lambda batch: _encode_with_model(batch, model_name), cache)
+
+
+def _report_cache(cache: Optional[EmbeddingCache]) -> None:
+    """Grava o cache de embeddings em disco e imprime as estatísticas do build."""
+    if cache is None:
+        return
+    cache.flush()
+    stats = cache.stats()
+    print(f"   • Cache de embeddings: {stats['hits']} hits, {stats['misses']} misses "
+          f"({stats['size']} itens em cache)")
+
+
+def _doc_blocks(doc: Dict, window_size: int, stride: int, tokens: Optional[TokenizedText] = None) -> List[Dict]:
+    """
+    Quebra UM documento em BLOCOS (janelas deslizantes) e retorna os registros do
+    id_map correspondentes (o texto do bloco vai no campo "text").
+    `tokens`: o documento já dividido em palavras (evita dividi-lo de novo).
+    """
+    doc_id = doc["doc_id"]
+    return [
+        {
+            "uid": f"{doc_id}#b{w['bloco_id']}",
+            "doc_id": doc_id,
+            "block_id": int(w["bloco_id"]),
+            "start_word": int(w["start_word"]),
+            "end_word": int(w["end_word"]),
+            "text": w["text"],
+        }
+        for w in build_windows(text=tokens or doc["text"], window_size=window_size, stride=stride)
+    ]
+
+
+def _doc_hash(text: str) -> str:
+    """Hash de conteúdo de um documento (detecta arquivos novos/alterados)."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _manifest_header() -> Dict:
+    return {
+        "model_name": settings.SEM_MODEL_NAME,
+        "window_size": settings.WINDOW_SIZE,
+        "stride": settings.STRIDE,
+    }
+
+
+def _previous_embeddings(path_indexes: str) -> Tuple[Optional[Dict], Optional[np.ndarray], Dict[str, int]]:
+    """
+    Manifesto, embeddings (mmap) e mapa uid -> linha do build anterior, usados pelo
+    modo incremental. Sem build anterior compatível, retorna (None, None, {}).
+    """
+    previous = io_utils.load_manifest(path_indexes)
+    if not previous or any(previous.get(k) != v for k, v in _manifest_header().items()):
+        return previous, None, {}
+    try:
+        old_embeddings, old_id_map, _ = io_utils.load_index_semantic(os.path.join(path_indexes, "semantic"))
+    except (FileNotFoundError, KeyError):
+        return previous, None, {}
+    uid_of = old_id_map.uid if isinstance(old_id_map, IdMap) else (lambda row: old_id_map[row].get("uid", ""))
+    return previous, old_embeddings, {uid_of(row): row for row in range(len(old_id_map))}
+
+
+def _chunk_embeddings(
+    chunk: List[Dict],
+    reusable: Set[str],
+    old_embeddings: Optional[np.ndarray],
+    old_rows: Dict[str, int],
+    cache: Optional[EmbeddingCache] = None,
+) -> Tuple[np.ndarray, int]:
+    """
+    Embeddings de um lote de blocos. Blocos de documentos inalterados (`reusable`)
+    reaproveitam a linha do índice anterior; os demais são codificados (via `cache`).
+    Retorna (embeddings, nº de blocos reaproveitados).
+    """
+    reuse = [(i, old_rows[item["uid"]]) for i, item in enumerate(chunk)
+             if item["doc_id"] in reusable and item["uid"] in old_rows]
+    reused = {i for i, _ in reuse}
+    missing = [i for i in range(len(chunk)) if i not in reused]
+
+    new_embeddings = (
+        _encode_embeddings([chunk[i]["text"] for i in missing], settings.SEM_MODEL_NAME, cache)
+        if missing else None
     )
-    return embeddings
+    dim = (new_embeddings if new_embeddings is not None else old_embeddings).shape[1]
+    embeddings = np.empty((len(chunk), dim), dtype=np.float32)
+    if reuse:
+        new_idx, old_idx = (np.asarray(x) for x in zip(*reuse))
+        embeddings[new_idx] = old_embeddings[old_idx]
+    if missing:
+        embeddings[np.asarray(missing)] = new_embeddings
+    return embeddings, len(reuse)
 
 
-def _flatten_blocks(
-    corpus: List[Dict],
-    window_size: int,
-    stride: int
-) -> Tuple[List[str], List[Dict]]:
+def _embeddings_matrix(raw_path: str, npy_path: str, n_rows: int, dim: int, chunk_size: int) -> np.ndarray:
     """
-    Quebra cada documento do corpus em BLOCOS (janelas deslizantes) e
-    retorna (lista_textos_blocos, id_map_blocos).
+    Copia os embeddings gravados lote a lote (float32 cru, em `raw_path`) para
+    embeddings.npy, pré-alocado via mmap com as `n_rows` linhas do id_map: nenhuma
+    etapa mantém a matriz inteira em memória. Retorna o memmap do .npy final.
     """
-    block_texts: List[str] = []
-    id_map: List[Dict] = []
+    if n_rows == 0:
+        os.remove(raw_path)
+        return np.zeros((0, 0), dtype=np.float32)
+    raw = np.memmap(raw_path, dtype=np.float32, mode="r", shape=(n_rows, dim))
+    out = np.lib.format.open_memmap(npy_path, mode="w+", dtype=np.float32, shape=(n_rows, dim))
+    for start in range(0, n_rows, chunk_size):
+        out[start:start + chunk_size] = raw[start:start + chunk_size]
+    out.flush()
+    del raw
+    os.remove(raw_path)
+    return out
 
-    for doc in corpus:
-        doc_id = doc["doc_id"]
-        text = doc["text"]
-        windows = build_windows(text=text, window_size=window_size, stride=stride)
-        for w in windows:
-            block_texts.append(w["text"])
-            uid = f"{doc_id}#b{w['bloco_id']}"
-            id_map.append({
-                "uid": uid,
-                "doc_id": doc_id,
-                "block_id": int(w["bloco_id"]),
-                "start_word": int(w["start_word"]),
-                "end_word": int(w["end_word"]),
-                "text": w["text"],
-            })
 
-    return block_texts, id_map
+def _done(result) -> Future:
+    """Future já resolvido (lotes codificados no próprio fluxo, ENCODE_WORKERS = 1)."""
+    future: Future = Future()
+    future.set_result(result)
+    return future
 
 
-def main():
+def _build(incremental: bool) -> None:
     path_raw = settings.DATA_RAW_DIR
     path_processed = settings.DATA_PROCESSED_DIR
     path_indexes = settings.DATA_INDEXES_DIR
+    chunk_size = max(1, settings.INGEST_CHUNK_SIZE)
 
-    print("📂 Carregando corpus...")
-    corpus = io_utils.load_corpus(path_raw, path_processed)
-    print(f"   • Total de documentos: {len(corpus)}")
-
-    print("🧩 Quebrando documentos em blocos...")
-    block_texts, id_map_blocks = _flatten_blocks(
-        corpus=corpus,
-        window_size=settings.WINDOW_SIZE,
-        stride=settings.STRIDE,
+    # build anterior: versão apontada por CURRENT ou, em índices não versionados, a raiz
+    previous_dir = io_utils.current_index_dir(path_indexes) or path_indexes
+    previous, old_embeddings, old_rows = (
+        _previous_embeddings(previous_dir) if incremental else (None, None, {})
     )
-    print(f"   • Total de blocos gerados: {len(block_texts)}")
+    old_docs = (previous or {}).get("docs", {})
+
+    # Tudo é gravado numa versão nova; o serviço só a enxerga após publish_index_version
+    version = io_utils.new_index_version(path_indexes)
+    path_out = io_utils.index_version_dir(path_indexes, version)
+    try:
+        _build_version(path_raw, path_processed, path_out, chunk_size, incremental,
+                       old_docs, old_embeddings, old_rows)
+    except BaseException:
+        shutil.rmtree(path_out, ignore_errors=True)  # versão incompleta nunca é publicada
+        raise
+
+    io_utils.publish_index_version(path_indexes, version)
+    removed = io_utils.prune_index_versions(path_indexes, keep=settings.INDEX_KEEP_VERSIONS)
+    print(f"   • Versão publicada: {version}" + (f" (removidas: {len(removed)})" if removed else ""))
+    print("✅ Índices prontos!")
+
+
+def _build_version(
+    path_raw: str,
+    path_processed: str,
+    path_out: str,
+    chunk_size: int,
+    incremental: bool,
+    old_docs: Dict[str, str],
+    old_embeddings: Optional[np.ndarray],
+    old_rows: Dict[str, int],
+) -> None:
+    """Grava todos os índices (e o manifesto) de uma versão em `path_out`."""
+    print("📂 Lendo corpus e quebrando documentos em blocos...")
+    manifest = {**_manifest_header(), "docs": {}}
+    reusable: Set[str] = set()
+    n_reused = 0
+    # Embeddings vão para disco lote a lote (em memória, só os lotes em andamento)
+    semantic_dir = os.path.join(path_out, "semantic")
+    io_utils.ensure_dir(semantic_dir)
+    raw_path = os.path.join(semantic_dir, "embeddings.f32.tmp")
+    raw = open(raw_path, "wb")
+    dim = 0
+    # id_map gravado direto no lugar final, compartilhado pelos índices léxico e semântico
+    id_map_dir = os.path.join(path_out, "idmap")
+    chunk: List[Dict] = []
+    # Com vários processos, os lotes são codificados em segundo plano (na ordem)
+    executor = ThreadPoolExecutor(_CHUNKS_IN_FLIGHT) if settings.ENCODE_WORKERS > 1 else None
+    in_flight: "deque[Future]" = deque()
+    # Cache de embeddings aberto uma única vez (index.log lido e lock obtido por build)
+    cache = open_cache(settings.EMB_CACHE_DIR, settings.SEM_MODEL_NAME, settings.EMB_CACHE_MAX_ITEMS)
+
+    def collect(limit: int) -> None:
+        nonlocal n_reused, dim
+        while len(in_flight) > limit:
+            embeddings, reused = in_flight.popleft().result()
+            dim = embeddings.shape[1]
+            raw.write(np.ascontiguousarray(embeddings, dtype=np.float32).tobytes())
+            n_reused += reused
+
+    def flush_chunk():
+        if chunk:
+            if executor is None:
+                in_flight.append(_done(_chunk_embeddings(list(chunk), reusable, old_embeddings, old_rows, cache)))
+            else:
+                in_flight.append(executor.submit(_chunk_embeddings, list(chunk), reusable, old_embeddings, old_rows, cache))
+            collect(_CHUNKS_IN_FLIGHT - 1)
+            chunk.clear()
+
+    # Impressões (winnowing) por DOCUMENTO: trechos literais que cruzam janelas
+    fingerprints = FingerprintWriter(settings.FP_KGRAM, settings.FP_WINDOW) if settings.FP_KGRAM > 0 else None
+
+    try:
+        with IdMapWriter(id_map_dir) as writer:
+            docs = io_utils.iter_corpus(path_raw, path_processed, max_workers=settings.INGEST_WORKERS)
+            for doc in docs:
+                doc_hash = _doc_hash(doc["text"])
+                manifest["docs"][doc["doc_id"]] = doc_hash
+                tokens = TokenizedText(doc["text"])  # uma divisão por documento (blocos + impressões)
+                if fingerprints is not None:
+                    fingerprints.add(doc["doc_id"], tokens.words)
+                if old_embeddings is not None and old_docs.get(doc["doc_id"]) == doc_hash:
+                    reusable.add(doc["doc_id"])
+                for item in _doc_blocks(doc, settings.WINDOW_SIZE, settings.STRIDE, tokens):
+                    writer.append(item)
+                    chunk.append(item)
+                    if len(chunk) >= chunk_size:
+                        flush_chunk()
+            flush_chunk()
+            collect(0)
+        _report_cache(cache)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        if cache is not None:
+            cache.close()
+        raw.close()
+
+    id_map_blocks = load_id_map(id_map_dir)
+    print(f"   • Total de documentos: {len(manifest['docs'])}")
+    print(f"   • Total de blocos gerados: {len(id_map_blocks)}")
+    if incremental:
+        print(f"🔁 Modo incremental: {len(reusable)} inalterados, "
+              f"{len(manifest['docs']) - len(reusable)} novos/alterados, "
+              f"{len(set(old_docs) - set(manifest['docs']))} removidos")
+        print(f"   • Blocos reaproveitados: {n_reused} | codificados: {len(id_map_blocks) - n_reused}")
 
     # ----- Índice Léxico -----
     print("📝 Criando índice léxico (TF-IDF)...")
-    tfidf = TfidfVectorizer(
-        stop_words=None,
-        lowercase=False,
-        ngram_range=(1, 5),
+    tfidf = make_tfidf_vectorizer(
+        settings.LEX_FEATURES,
+        min_df=min(settings.LEX_MIN_DF, max(1, len(id_map_blocks))),
+        n_features=settings.LEX_HASH_FEATURES,
     )
-    tfidf_matrix = tfidf.fit_transform(block_texts)
+    tfidf_matrix = tfidf.fit_transform(id_map_blocks.text(row) for row in range(len(id_map_blocks)))
     io_utils.save_index_lexical(
-        os.path.join(path_indexes, "lexical"),
+        os.path.join(path_out, "lexical"),
         tfidf,
         tfidf_matrix,
         id_map_blocks,
     )
-    print(f"   • Índice léxico salvo em: {os.path.join(path_indexes, 'lexical')}")
+    print(f"   • Índice léxico salvo em: {os.path.join(path_out, 'lexical')}")
+    if settings.LEX_PREFILTER == "lsh":
+        print("🔎 Criando pré-filtro MinHash/LSH...")
+        lsh = build_lsh(
+            (id_map_blocks.text(row) for row in range(len(id_map_blocks))),
+            num_perm=settings.LSH_NUM_PERM,
+            bands=settings.LSH_BANDS,
+            shingle_size=settings.LSH_SHINGLE_SIZE,
+        )
+        io_utils.save_lsh(os.path.join(path_out, "lexical"), lsh)
+
+    if fingerprints is not None:
+        print("🧬 Salvando índice de impressões (trechos literais)...")
+        save_fingerprints(os.path.join(path_out, "fingerprint"), fingerprints.build())
 
     # ----- Índice Semântico -----
-    embeddings = _encode_embeddings(block_texts, model_name=settings.SEM_MODEL_NAME)
+    embeddings = _embeddings_matrix(raw_path, os.path.join(semantic_dir, "embeddings.npy"),
+                                    len(id_map_blocks), dim, chunk_size)
+    ann_index = None
+    if settings.SEM_SEARCH == "ivf":
+        print("🧭 Construindo índice aproximado (IVF)...")
+        ann_index = build_ivf(embeddings, nlist=settings.IVF_NLIST)
+        print(f"   • Listas IVF: {ann_index.nlist}")
+    quantized = None
+    if settings.SEM_QUANTIZATION in QUANTIZATION_KINDS:
+        print(f"🗜️ Quantizando embeddings ({settings.SEM_QUANTIZATION})...")
+        quantized = quantize(embeddings, settings.SEM_QUANTIZATION)
     io_utils.save_index_semantic(
-        os.path.join(path_indexes, "semantic"),
+        semantic_dir,
         embeddings,
         id_map_blocks,
         settings.SEM_MODEL_NAME,
+        ann_index=ann_index,
+        quantized=quantized,
     )
-    print(f"   • Índice semântico salvo em: {os.path.join(path_indexes, 'semantic')}")
+    print(f"   • Índice semântico salvo em: {semantic_dir}")
 
-    print("✅ Índices prontos!")
+    # com ENCODE_WORKERS > 1, as métricas vêm dos processos do pool (ShardedEncoder)
+    stats = ENCODE_METRICS.snapshot()
+    if stats["batches"]:
+        per_worker = " por processo" if settings.ENCODE_WORKERS > 1 else ""
+        print(f"   • Codificação: {stats['texts_per_second']:.1f} blocos/s{per_worker}, "
+              f"eficiência de padding {stats['padding_efficiency']:.1%} ({stats['batches']} lotes)")
+    io_utils.save_manifest(path_out, manifest)
+
+
+def main(incremental: bool = False):
+    """
+    Constrói os índices léxico e semântico a partir do corpus.
+
+    O corpus é lido em streaming (io_utils.iter_corpus, INGEST_WORKERS threads) e
+    processado em lotes de INGEST_CHUNK_SIZE blocos: os registros do id_map vão
+    direto para disco (IdMapWriter) e os embeddings são calculados por lote e gravados
+    em disco (embeddings.npy pré-alocado via mmap), de modo que nem os textos nem a
+    matriz de embeddings precisam ficar inteiros em memória. O TF-IDF é
+    ajustado depois, lendo os textos dos blocos do id_map em disco.
+
+    Com incremental=True, compara o hash de cada documento com o manifesto do build
+    anterior e só recalcula embeddings dos blocos de documentos novos/alterados
+    (os de documentos removidos saem do índice). O TF-IDF é sempre reajustado sobre
+    o corpus inteiro: é barato frente aos embeddings e mantém vocabulário e IDF exatos.
+
+    Com ENCODE_WORKERS > 1, os embeddings são gerados em vários processos; se o build
+    for interrompido, a próxima execução retoma a partir dos shards já gravados.
+    """
+    build_ok = False
+    try:
+        _build(incremental)
+        build_ok = True
+    finally:
+        _close_encoders(build_ok)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Constrói os índices léxico e semântico.")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="recalcula embeddings apenas de documentos novos/alterados (usa o manifest.json da versão atual)",
+    )
+    args = parser.parse_args()
+    main(incremental=args.incremental)
@@ -1,4 +1,4 @@
-from typing import List, Dict
+from typing import List, Dict, Tuple, Union
 
 
 def _split_words(text: str) -> List[str]:
@@ -13,8 +13,53 @@ def _split_words(text: str) -> List[str]:
     return text.split()
 
 
+class TokenizedText:
+    """
+    Texto dividido em palavras UMA única vez (mesma segmentação de _split_words).
+    Janelas e contextos são pares (início, fim) em palavras; o texto de um trecho só
+    é montado quando pedido (join), com as palavras separadas por um espaço: a saída
+    não depende dos espaços do original (o cache de resultados conta com isso).
+    """
+
+    __slots__ = ("text", "words")
+
+    def __init__(self, text: str):
+        self.text = text or ""
+        self.words = _split_words(self.text)
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def join(self, start_word: int, end_word: int) -> str:
+        """Texto das palavras [start_word, end_word), reconstruído com espaços."""
+        return " ".join(self.words[max(0, start_word):max(0, end_word)])
+
+    def window_spans(self, window_size: int, stride: int) -> List[Tuple[int, int]]:
+        """Janelas deslizantes como pares (start_word, end_word), sem montar o texto."""
+        n = len(self.words)
+        if n == 0 or window_size <= 0:
+            return []
+        step = stride if stride > 0 else window_size
+        spans: List[Tuple[int, int]] = []
+        for start in range(0, n, step):
+            end = min(start + window_size, n)
+            spans.append((start, end))
+            if end == n:
+                break
+        return spans
+
+    def context_span(self, start_word: int, end_word: int, margin: int) -> Tuple[int, int]:
+        """[start_word - margin, end_word + margin], limitado aos limites do texto."""
+        return max(0, start_word - margin), min(len(self.words), end_word + margin)
+
+
+def tokenize(text: Union[str, TokenizedText]) -> TokenizedText:
+    """Aceita texto ou um TokenizedText já construído (não re-tokeniza)."""
+    return text if isinstance(text, TokenizedText) else TokenizedText(text)
+
+
 def build_windows(
-    text: str,
+    text: Union[str, TokenizedText],
     window_size: int,
     stride: int
 ) -> List[Dict]:
@@ -26,46 +71,34 @@ def build_windows(
       - end_word: fim (índice de palavra, exclusivo)
       - text: texto do bloco (reconstruído com espaços)
     """
-    words = _split_words(text)
-    n = len(words)
-    windows: List[Dict] = []
-
-    if n == 0 or window_size <= 0:
-        return windows
-
-    bloco_id = 0
-    i = 0
-    while i < n:
-        start = i
-        end = min(i + window_size, n)
-        chunk_text = " ".join(words[start:end]).strip()
-        if chunk_text:
-            windows.append({
-                "bloco_id": bloco_id,
-                "start_word": start,
-                "end_word": end,
-                "text": chunk_text,
-            })
-            bloco_id += 1
-        if end == n:
-            break
-        i += stride if stride > 0 else window_size
-
-    return windows
+    tok = tokenize(text)
+    return [
+        {"bloco_id": bloco_id, "start_word": start, "end_word": end, "text": tok.join(start, end)}
+        for bloco_id, (start, end) in enumerate(tok.window_spans(window_size, stride))
+    ]
+
+
+def count_windows(n_words: int, window_size: int, stride: int) -> int:
+    """
+    Nº de janelas que build_windows gera para um texto de `n_words` palavras,
+    sem construí-las (ex.: para dimensionar lotes).
+    """
+    if n_words <= 0 or window_size <= 0:
+        return 0
+    step = stride if stride > 0 else window_size
+    # para na 1ª janela que alcança o fim ou quando o início passa do texto (stride > janela)
+    return min(-(-n_words // step), 1 + max(0, -(-(n_words - window_size) // step)))
 
 
 def extend_context(
-    text: str,
+    text: Union[str, TokenizedText],
     start_word: int,
     end_word: int,
     margin: int
 ) -> str:
     """
     Retorna o trecho do texto cobrindo [start_word - margin, end_word + margin],
-    limitado aos limites do texto.
+    limitado aos limites do texto. Com um TokenizedText, não re-tokeniza a redação.
     """
-    words = _split_words(text)
-    n = len(words)
-    s = max(0, start_word - margin)
-    e = min(n, end_word + margin)
-    return " ".join(words[s:e]).strip()
+    tok = tokenize(text)
+    return tok.join(*tok.context_span(start_word, end_word, margin))
@@ -0,0 +1,96 @@
+# src/quantized_index.py
+# Índice semântico quantizado (float16 ou int8) com re-rank exato.
+#
+# 1ª passada: produto interno da consulta com os vetores comprimidos (2 ou 4x menos
+# bytes varridos que em float32). Os `k * rerank_factor` melhores candidatos são
+# re-ranqueados com os embeddings float32 originais, lidos do arquivo memory-mapped
+# apenas nas linhas candidatas.
+#
+# Tolerância: os scores devolvidos são os cossenos EXATOS (float32). O que pode
+# diferir da busca exata é só a composição do top-k, quando um bloco do top-k exato
+# cai fora dos candidatos por erro de quantização. Com vetores L2-normalizados o erro
+# do score aproximado fica em ~1e-3 (float16) e ~1e-2 (int8, escala por dimensão);
+# com rerank_factor >= 4 o top-k coincide com o exato salvo empates nessa faixa.
+
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import numpy as np
+
+from src.topk import top_k_indices
+
+QUANTIZATION_KINDS = ("float16", "int8")
+
+
+@dataclass(frozen=True)
+class QuantizedIndex:
+    codes: np.ndarray             # (n_blocos, d) float16 ou int8
+    scales: Optional[np.ndarray]  # (d,) float32 no int8 (x ≈ codes * scales); None no float16
+
+    @property
+    def kind(self) -> str:
+        return "int8" if self.codes.dtype == np.int8 else "float16"
+
+
+def quantize(embeddings: np.ndarray, kind: str = "int8", chunk: int = 65536) -> QuantizedIndex:
+    """
+    Comprime a matriz de embeddings. int8 usa quantização escalar simétrica por
+    dimensão (escala = max|x_j| / 127); float16 é uma conversão direta.
+    """
+    if kind not in QUANTIZATION_KINDS:
+        raise ValueError(f"Quantização desconhecida: {kind!r} (use {', '.join(QUANTIZATION_KINDS)})")
+    if kind == "float16":
+        return QuantizedIndex(codes=np.asarray(embeddings, dtype=np.float16), scales=None)
+
+    n, d = embeddings.shape
+    max_abs = np.zeros(d, dtype=np.float32)
+    for s in range(0, n, chunk):
+        max_abs = np.maximum(max_abs, np.abs(np.asarray(embeddings[s:s + chunk], dtype=np.float32)).max(axis=0))
+    scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+
+    codes = np.empty((n, d), dtype=np.int8)
+    for s in range(0, n, chunk):
+        block = np.asarray(embeddings[s:s + chunk], dtype=np.float32) / scales
+        codes[s:s + chunk] = np.clip(np.rint(block), -127, 127)
+    return QuantizedIndex(codes=codes, scales=scales)
+
+
+def _approx_scores(index: QuantizedIndex, query_vecs: np.ndarray, chunk: int = 65536) -> np.ndarray:
+    """Scores aproximados (n_consultas x n_blocos), convertendo os códigos em blocos."""
+    q = query_vecs if index.scales is None else query_vecs * index.scales  # escala vai para a consulta
+    n = index.codes.shape[0]
+    out = np.empty((q.shape[0], n), dtype=np.float32)
+    for s in range(0, n, chunk):
+        out[:, s:s + chunk] = q @ np.asarray(index.codes[s:s + chunk], dtype=np.float32).T
+    return out
+
+
+def search_quantized(
+    index: QuantizedIndex,
+    embeddings: np.ndarray,
+    query_vecs: np.ndarray,
+    k: int,
+    rerank_factor: int = 4,
+) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Busca em duas etapas: top-(k * rerank_factor) pelos scores aproximados e re-rank
+    com o cosseno exato sobre os embeddings float32 (`embeddings`, tipicamente mmap).
+    Retorna, por consulta, (índices_dos_blocos, scores) ordenados por score desc.
+    """
+    query_vecs = np.atleast_2d(np.asarray(query_vecs, dtype=np.float32))
+    norms = np.linalg.norm(query_vecs, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    query_vecs = query_vecs / norms
+
+    n_cand = max(int(k), int(k) * max(1, int(rerank_factor)))
+    candidates = top_k_indices(_approx_scores(index, query_vecs), n_cand)
+
+    results: List[Tuple[np.ndarray, np.ndarray]] = []
+    for q, cand in zip(query_vecs, candidates):
+        cand = np.sort(cand)  # desempate determinístico pelo menor índice de bloco
+        vecs = np.asarray(embeddings[cand], dtype=np.float32)
+        v_norms = np.linalg.norm(vecs, axis=1)
+        v_norms[v_norms == 0] = 1.0
+        scores = (vecs @ q) / v_norms
+        sel = top_k_indices(scores, k)
+        results.append((cand[sel], scores[sel]))
+    return results
@@ -0,0 +1,190 @@
+# src/result_cache.py
+# Cache de resultados de comparação, usado por compare_service.compare_many em dois
+# níveis: redação inteira (resultado final) e janela (top-k léxico/semântico).
+#
+# Chaves (result_key): hash de (versão dos índices, parâmetros que afetam o resultado,
+# texto normalizado). Valores: JSON, guardado
+#   em memória -> LRU com no máx. max_items entradas (por processo)
+#   em disco   -> opcional (path): um arquivo por entrada em
+#                 <path>/<versão dos índices>/<chave[:2]>/<chave>.json, compartilhado
+#                 entre processos (ex.: workers do batch_compare) e reinícios do serviço;
+#                 com no máx. max_disk_items arquivos por versão (os lidos/gravados há
+#                 mais tempo, pelo mtime, são removidos)
+# Ao ver uma versão nova dos índices (use_version), o cache descarta as entradas em
+# memória; em disco, mantém a versão anterior (processos que ainda não trocaram de
+# versão continuam usando-a) e remove as mais antigas.
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from src.embedding_cache import normalize_text
+
+
+def result_key(text: str, version: str, params: str) -> str:
+    """Chave de cache: a mesma para textos que só diferem em espaços em branco."""
+    return hashlib.sha1(f"{version}\0{params}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+def _version_dirname(version: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]", "_", version) or "_"
+
+
+class ResultCache:
+    """
+    Cache LRU de valores serializáveis em JSON, com nível opcional em disco.
+    get() devolve sempre uma cópia nova (o chamador pode alterá-la à vontade).
+    max_items=0 desativa o cache (get sempre falha, put não faz nada);
+    max_disk_items=0 não limita o nível em disco. Seguro para uso entre threads.
+    """
+
+    def __init__(self, max_items: int = 1024, path: str = "", max_disk_items: int = 0):
+        self.max_items = max(0, int(max_items))
+        self.path = path or ""
+        self.max_disk_items = max(0, int(max_disk_items))
+        self.version: Optional[str] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, str]" = OrderedDict()
+        self._disk_writes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_items > 0
+
+    def use_version(self, version: str) -> None:
+        """
+        Passa a servir a versão `version` dos índices. Em disco, mantém também a
+        anterior (a deste processo ou, na 1ª chamada, a gravada por último) e remove
+        as mais antigas.
+        """
+        with self._lock:
+            if version == self.version:
+                return
+            previous, self.version = self.version, version
+            self._items.clear()
+        if not (self.enabled and self.path and os.path.isdir(self.path)):
+            return
+        current = _version_dirname(version)
+        others = [e for e in os.scandir(self.path) if e.is_dir() and e.name != current]
+        if previous is not None:
+            keep = _version_dirname(previous)
+        else:
+            keep = max(others, key=lambda e: e.stat().st_mtime, default=None)
+            keep = keep.name if keep is not None else None
+        for entry in others:
+            if entry.name != keep:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    # ---------- disco ----------
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, _version_dirname(self.version or ""), key[:2], f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[str]:
+        path = self._file(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = f.read()
+            os.utime(path)  # recência para a evicção do nível em disco
+            return data
+        except OSError:
+            return None
+
+    def _write_disk(self, key: str, data: str) -> None:
+        path = self._file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        if self.max_disk_items:
+            with self._lock:
+                self._disk_writes += 1
+                # poda a cada ~10% do limite gravado por este processo
+                prune = self._disk_writes >= max(1, self.max_disk_items // 10)
+                if prune:
+                    self._disk_writes = 0
+            if prune:
+                self._prune_disk()
+
+    def _prune_disk(self) -> None:
+        """Remove os arquivos mais antigos (mtime) da versão até 90% de max_disk_items."""
+        root = os.path.join(self.path, _version_dirname(self.version or ""))
+        files = []
+        for sub in os.scandir(root):
+            if sub.is_dir():
+                for entry in os.scandir(sub.path):
+                    if entry.name.endswith(".json"):
+                        try:
+                            files.append((entry.stat().st_mtime_ns, entry.path))
+                        except OSError:  # removido por outro processo
+                            pass
+        if len(files) <= self.max_disk_items:
+            return
+        files.sort()
+        for _, path in files[:len(files) - int(0.9 * self.max_disk_items)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    # ---------- API ----------
+    def get(self, key: str) -> Any:
+        """Valor guardado para `key` (memória, depois disco) ou None."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return json.loads(data)
+        data = self._read_disk(key) if self.path else None
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, data)
+        return json.loads(data)
+
+    def put(self, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        data = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._remember(key, data)
+        if self.path:
+            self._write_disk(key, data)
+
+    def _remember(self, key: str, data: str) -> None:
+        self._items[key] = data
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)  # evicção LRU
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": ((self.hits + self.disk_hits) / total) if total else 0.0,
+                "size": len(self._items),
+                "max_items": self.max_items,
+            }
+
+    def __len__(self) -> int:
+        return len(self._items)
@@ -0,0 +1,64 @@
+import numpy as np
+
+
+def _sort_desc(scores: np.ndarray, indices: np.ndarray) -> np.ndarray:
+    """
+    Ordena `indices` (1-D) por score desc; empates são resolvidos pelo menor índice.
+    """
+    order = np.lexsort((indices, -scores[indices]))
+    return indices[order]
+
+
+def _top_k_row(scores: np.ndarray, k: int) -> np.ndarray:
+    n = scores.shape[0]
+    if k >= n:
+        return _sort_desc(scores, np.arange(n))
+
+    # Seleção parcial O(N): descobre o k-ésimo maior score (limiar)...
+    part = np.argpartition(-scores, k - 1)[:k]
+    threshold = scores[part].min()
+
+    # ...e inclui TODOS os empatados no limiar, para que o desempate seja
+    # determinístico (menor índice) e não dependa do argpartition
+    candidates = np.flatnonzero(scores >= threshold)
+    return _sort_desc(scores, candidates)[:k]
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Retorna os índices dos k maiores scores, ordenados por score desc.
+    - scores 1-D (N,)   -> array (min(k, N),)
+    - scores 2-D (Q, N) -> array (Q, min(k, N)), uma linha por consulta
+    Usa seleção parcial (argpartition) e ordena apenas os k selecionados.
+    Empates são resolvidos de forma determinística pelo menor índice.
+    """
+    scores = np.asarray(scores)
+    if scores.ndim not in (1, 2):
+        raise ValueError(f"scores deve ser 1-D ou 2-D, recebido ndim={scores.ndim}")
+
+    n = scores.shape[-1]
+    k = max(0, min(int(k), n))
+
+    if scores.ndim == 1:
+        if k == 0:
+            return np.empty(0, dtype=np.intp)
+        return _top_k_row(scores, k)
+
+    q = scores.shape[0]
+    if k == 0 or q == 0:
+        return np.empty((q, k), dtype=np.intp)
+    if k == n:
+        order = np.lexsort((np.broadcast_to(np.arange(n), scores.shape), -scores), axis=-1)
+        return order
+
+    # Caminho vetorizado: seleção parcial em todas as linhas de uma vez
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    threshold = part_scores.min(axis=1)
+
+    # Linhas com empate no limiar caem no caminho por linha (desempate exato)
+    n_ge = (scores >= threshold[:, None]).sum(axis=1)
+    out = np.take_along_axis(part, np.lexsort((part, -part_scores), axis=-1), axis=1)
+    for row in np.flatnonzero(n_ge > k):
+        out[row] = _top_k_row(scores[row], k)
+    return out
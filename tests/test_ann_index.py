@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from src.ann_index import build_ivf, search_ivf, recall_at_k, default_nlist
+from src.topk import top_k_indices
+
+
+# 🔹 Fixture com embeddings sintéticos agrupados (clusters), já L2-normalizados
+@pytest.fixture
+def clustered_embeddings():
+    rng = np.random.default_rng(42)
+    centers = rng.normal(size=(8, 16))
+    points = np.concatenate([c + 0.15 * rng.normal(size=(60, 16)) for c in centers])
+    points /= np.linalg.norm(points, axis=1, keepdims=True)
+    return points.astype(np.float32)
+
+
+# 🔹 Testa a estrutura das listas invertidas: todo bloco aparece exatamente uma vez
+def test_build_ivf_structure(clustered_embeddings):
+    index = build_ivf(clustered_embeddings, nlist=8)
+    assert index.nlist == 8
+    assert index.list_offsets[-1] == len(clustered_embeddings)
+    assert sorted(index.list_ids.tolist()) == list(range(len(clustered_embeddings)))
+    assert default_nlist(400) == 80
+
+
+# 🔹 Sondando todas as listas, a busca IVF deve ser idêntica à exata
+def test_search_ivf_all_lists_is_exact(clustered_embeddings):
+    index = build_ivf(clustered_embeddings, nlist=8)
+    queries = clustered_embeddings[::37]
+    exact = top_k_indices(queries @ clustered_embeddings.T, 10)
+
+    approx = search_ivf(index, clustered_embeddings, queries, k=10, nprobe=index.nlist)
+    assert [a.tolist() for a, _ in approx] == exact.tolist()
+
+
+# 🔹 Com poucas listas sondadas, o recall@k deve continuar alto em dados agrupados
+def test_search_ivf_recall(clustered_embeddings):
+    index = build_ivf(clustered_embeddings, nlist=16)
+    queries = clustered_embeddings[::11]
+    exact = list(top_k_indices(queries @ clustered_embeddings.T, 10))
+
+    approx = [idx for idx, _ in search_ivf(index, clustered_embeddings, queries, k=10, nprobe=4)]
+    assert recall_at_k(approx, exact) >= 0.9
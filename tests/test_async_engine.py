@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import pytest
+from src.async_engine import CompareEngine
+
+
+class _FakeCompareMany:
+    """Registra os lotes recebidos (textos); cada redação vira [{"trecho": texto}]."""
+
+    def __init__(self, fail: bool = False):
+        self.batches = []
+        self.fail = fail
+
+    def __call__(self, toks):
+        textos = [tok.text for tok in toks]  # o engine envia TokenizedText
+        self.batches.append(textos)
+        if self.fail:
+            raise RuntimeError("índice indisponível")
+        return [[{"trecho": t}] for t in textos]
+
+
+def test_concurrent_requests_share_one_batch():
+    # 🔹 Requisições que chegam juntas viram uma única chamada a compare_many
+    fake = _FakeCompareMany()
+    engine = CompareEngine(max_batch_windows=1000, max_wait_ms=50, compare_many=fake)
+
+    async def run():
+        return await asyncio.gather(*(engine.compare(f"redação {i}") for i in range(5)))
+
+    results = asyncio.run(run())
+    assert results == [[{"trecho": f"redação {i}"}] for i in range(5)]
+    assert fake.batches == [[f"redação {i}" for i in range(5)]]
+    assert engine.stats.snapshot()["requests_per_batch"] == 5
+    engine.close()
+
+
+def test_batches_respect_max_windows():
+    # 🔹 Com WINDOW_SIZE=40, cada redação curta conta 1 janela: lotes de no máx. 2
+    fake = _FakeCompareMany()
+    engine = CompareEngine(max_batch_windows=2, max_wait_ms=50, compare_many=fake)
+
+    async def run():
+        return await asyncio.gather(*(engine.compare(f"texto {i}") for i in range(5)))
+
+    results = asyncio.run(run())
+    assert [r[0]["trecho"] for r in results] == [f"texto {i}" for i in range(5)]
+    assert [len(b) for b in fake.batches] == [2, 2, 1]
+    engine.close()
+
+
+def test_errors_reach_every_caller_and_empty_text_skips_queue():
+    # 🔹 Falha no lote é propagada a todos; texto vazio nem entra na fila
+    fake = _FakeCompareMany(fail=True)
+    engine = CompareEngine(max_wait_ms=20, compare_many=fake)
+
+    async def run():
+        return await asyncio.gather(engine.compare("a"), engine.compare("b"), return_exceptions=True)
+
+    errors = asyncio.run(run())
+    assert all(isinstance(e, RuntimeError) for e in errors)
+    assert asyncio.run(engine.compare("   ")) == []
+    assert len(fake.batches) == 1
+    engine.close()
+
+
+def test_submit_from_threads():
+    # 🔹 Chamadores síncronos (threads) usam o loop de fundo do engine
+    fake = _FakeCompareMany()
+    engine = CompareEngine(max_wait_ms=50, compare_many=fake)
+    results = {}
+
+    def call(i):
+        results[i] = engine.submit(f"sessão {i}").result(timeout=5)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == {i: [{"trecho": f"sessão {i}"}] for i in range(4)}
+    assert sum(len(b) for b in fake.batches) == 4
+    engine.close()
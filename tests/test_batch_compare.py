@@ -0,0 +1,88 @@
+import json
+import pytest
+from src import batch_compare
+
+
+def _fake_result(text):
+    # 🔹 Um bloco suspeito por redação que contém "copiado"
+    if "copiado" not in text:
+        return []
+    return [{
+        "bloco_id": 0, "inicio": 0, "fim": 3, "tipo": "plagio_literal", "trecho": text,
+        "trecho_contexto": text, "trechos_literais": [],
+        "melhor_candidato": {"doc_id": "fonte", "block_id": 2, "start_word": 40, "end_word": 80, "text": "x"},
+        "scores": {"final": 0.9, "lex_raw": 0.8, "sem_raw": 0.95, "lex_norm": 1.0, "sem_norm": 1.0},
+    }]
+
+
+@pytest.fixture
+def fake_compare(monkeypatch):
+    batches = []
+    def fake_many(toks):
+        textos = [tok.text for tok in toks]  # o lote chega já tokenizado
+        batches.append(textos)
+        return [_fake_result(t) for t in textos]
+    monkeypatch.setattr(batch_compare.compare_service, "compare_many", fake_many)
+    monkeypatch.setattr(batch_compare.compare_service, "warm", lambda: None)
+    return batches
+
+
+def _write_jsonl(path, n):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            f.write(json.dumps({"id": f"r{i}", "text": f"redação {i} {'copiado' if i % 2 else 'original'}"}) + "\n")
+
+
+def _read_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_batch_jsonl_output_in_chunks(tmp_path, fake_compare):
+    # 🔹 Redações agrupadas em lotes; uma linha de saída por redação
+    _write_jsonl(tmp_path / "in.jsonl", 5)
+    stats = batch_compare.run_batch(str(tmp_path / "in.jsonl"), str(tmp_path / "out.jsonl"), chunk_essays=2)
+
+    rows = _read_jsonl(tmp_path / "out.jsonl")
+    assert [len(b) for b in fake_compare] == [2, 2, 1]
+    assert [r["id"] for r in rows] == [f"r{i}" for i in range(5)]
+    assert [r["n_suspeitos"] for r in rows] == [0, 1, 0, 1, 0]
+    assert rows[1]["score_max"] == 0.9
+    assert stats["essays"] == 5 and stats["windows"] == 5  # 1 janela por redação curta
+
+
+def test_batch_resume_discards_uncheckpointed_output(tmp_path, fake_compare):
+    # 🔹 Simula queda: saída com lixo após o último checkpoint e checkpoint truncado
+    _write_jsonl(tmp_path / "in.jsonl", 5)
+    out = tmp_path / "out.jsonl"
+    batch_compare.run_batch(str(tmp_path / "in.jsonl"), str(out), chunk_essays=2)
+    first_chunk = _read_jsonl(tmp_path / "out.jsonl.checkpoint")[0]
+    with open(out, "r+b") as f:
+        f.truncate(first_chunk["mark"])
+        f.seek(0, 2)
+        f.write(b'{"id": "r2", "n_suspeitos"')  # lote interrompido no meio
+    (tmp_path / "out.jsonl.checkpoint").write_text(json.dumps(first_chunk) + '\n{"ids": ["r2"', encoding="utf-8")
+
+    fake_compare.clear()
+    stats = batch_compare.run_batch(str(tmp_path / "in.jsonl"), str(out), chunk_essays=2, resume=True)
+
+    assert fake_compare == [["redação 2 original", "redação 3 copiado"], ["redação 4 original"]]
+    assert stats["essays"] == 3
+    assert [r["id"] for r in _read_jsonl(out)] == [f"r{i}" for i in range(5)]
+    assert len(_read_jsonl(tmp_path / "out.jsonl.checkpoint")) == 3
+
+
+def test_batch_directory_input_to_parquet(tmp_path, fake_compare):
+    # 🔹 Diretório de .txt -> Parquet com uma linha por bloco suspeito
+    pq = pytest.importorskip("pyarrow.parquet")
+    essays = tmp_path / "essays"
+    essays.mkdir()
+    (essays / "a.txt").write_text("texto copiado da fonte", encoding="utf-8")
+    (essays / "b.txt").write_text("texto autoral", encoding="utf-8")
+
+    batch_compare.run_batch(str(essays), str(tmp_path / "out.parquet"), chunk_essays=1)
+
+    table = pq.read_table(str(tmp_path / "out.parquet"))
+    assert table.column("id").to_pylist() == ["a"]
+    assert table.column("candidato_doc_id").to_pylist() == ["fonte"]
+    assert table.column("score_final").to_pylist() == [0.9]
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from src.batching import BatchingMetrics, encode_bucketed, encode_with_model, plan_batches, token_lengths
+
+
+# 🔹 Testa que cada lote respeita o orçamento de tokens (com padding) e o limite de textos
+def test_plan_batches_respects_token_budget():
+    lengths = np.array([42, 10, 42, 3, 42, 42, 25, 42])
+    batches = plan_batches(lengths, max_tokens=100, max_batch_size=3)
+
+    assert sorted(np.concatenate(batches).tolist()) == list(range(len(lengths)))
+    for batch in batches:
+        assert len(batch) <= 3
+        assert len(batch) * lengths[batch].max() <= 100
+    # ordenados por tamanho: os mais longos ficam juntos
+    assert lengths[batches[0]].tolist() == [42, 42]
+
+    # texto maior que o orçamento vira um lote sozinho
+    assert [b.tolist() for b in plan_batches(np.array([500, 1]), 100, 8)] == [[0], [1]]
+
+
+# 🔹 Testa que o resultado volta na ordem original e as métricas são registradas
+def test_encode_bucketed_restores_order_and_records_metrics():
+    texts = ["a b c d e f", "a", "a b c", "a b", "a b c d e f g h"]
+    lengths = token_lengths(texts)
+    metrics = BatchingMetrics()
+    seen = []
+
+    def encode_batch(batch):
+        seen.append(list(batch))
+        return np.array([[len(t.split())] for t in batch], dtype=np.float32)
+
+    emb = encode_bucketed(texts, encode_batch, lengths, max_tokens=12, max_batch_size=4, metrics=metrics)
+
+    assert emb[:, 0].tolist() == [6, 1, 3, 2, 8]
+    assert seen[0] == ["a b c d e f g h"]
+    stats = metrics.snapshot()
+    assert stats["texts"] == 5 and stats["batches"] == len(seen)
+    assert stats["real_tokens"] == int(lengths.sum())
+    assert 0 < stats["padding_efficiency"] <= 1
+
+
+# 🔹 Testa encode_with_model com um modelo falso (tokenizer + encode por lote)
+def test_encode_with_model_uses_tokenizer_lengths():
+    class FakeModel:
+        max_seq_length = 4
+        calls = []
+
+        def tokenizer(self, texts, add_special_tokens, truncation, max_length):
+            ids = [list(range(min(len(t), max_length))) for t in texts]
+            return {"input_ids": ids}
+
+        def encode(self, batch, batch_size, **kwargs):
+            assert kwargs["normalize_embeddings"]
+            self.calls.append(batch_size)
+            return np.array([[len(t)] for t in batch], dtype=np.float32)
+
+    model = FakeModel()
+    assert token_lengths(["abcdef", "ab"], model).tolist() == [4, 2]
+    emb = encode_with_model(model, ["ab", "abcdef", "abc"], max_tokens=8, max_batch_size=8, metrics=None)
+    assert emb[:, 0].tolist() == [2, 6, 3]
+    assert model.calls == [2, 1]
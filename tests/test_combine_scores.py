@@ -51,3 +51,33 @@ def test_combine_scores_min_gate_filter():
     assert result[0]["flags"] == []
     assert result[0]["match_type"] is None
 
+
+
+def test_combine_scores_batch_matches_per_window():
+    # 🔹 Várias janelas de uma vez: mesmo resultado de combine_scores janela a janela
+    from src.combine_scores import combine_tops, combined_to_dicts
+    tops_lex = [[("doc_a", 0.9), ("doc_b", 0.4)], [], [("doc_c", 0.95)]]
+    tops_sem = [[("doc_b", 0.95), ("doc_c", 0.2)], [("doc_a", 0.3)], [("doc_c", 0.9), ("doc_a", 0.5)]]
+
+    combined, uids = combine_tops(tops_lex, tops_sem, k_final=4, alpha=0.5)
+
+    assert combined.shape == (3, 4)
+    for row, top_lex, top_sem in zip(combined, tops_lex, tops_sem):
+        assert combined_to_dicts(row, uids) == combine_scores(top_lex, top_sem, k_final=4, alpha=0.5)
+    # janela 1: só um candidato; o resto da linha fica vazio (cand = -1)
+    assert combined["cand"][1].tolist()[1:] == [-1, -1, -1]
+    assert uids[combined["cand"][2, 0]] == "doc_c" and combined["match"][2, 0] == 1
+
+
+def test_combine_scores_batch_aligns_same_candidate():
+    # 🔹 O mesmo candidato nos dois lados vira uma única entrada com os dois scores
+    from src.combine_scores import combine_scores_batch
+    combined = combine_scores_batch(
+        lex_ids=[[3, 1]], lex_scores=[[0.5, 0.2]],
+        sem_ids=[[1, -1]], sem_scores=[[0.9, 0.0]],
+        k_final=3,
+    )
+    row = combined[0]
+    assert row["cand"].tolist() == [3, 1, -1]  # alpha=0.6 favorece o léxico
+    assert row["score_lex_raw"].tolist()[:2] == [0.5, 0.2]
+    assert row["score_sem_raw"].tolist()[:2] == [0.0, 0.9]
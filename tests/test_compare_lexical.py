@@ -1,6 +1,11 @@
 import pytest
 from sklearn.feature_extraction.text import TfidfVectorizer
-from src.compare_lexical import compare_lexical
+from sklearn.metrics.pairwise import cosine_similarity
+import numpy as np
+from src.compare_lexical import (
+    compare_lexical, compare_lexical_batch, compare_lexical_candidates, build_postings, make_tfidf_vectorizer,
+)
+from src.topk import top_k_indices
 
 
 # 🔹 Fixture para preparar um cenário de teste consistente
@@ -47,3 +52,83 @@ def test_compare_lexical_top_n_limit(tfidf_setup):
     _, tfidf_model, tfidf_matrix, id_map = tfidf_setup
     result = compare_lexical("dados pessoais e privacidade", tfidf_model, tfidf_matrix, id_map, top_n=1)
     assert len(result) == 1
+
+
+# 🔹 Testa se a versão em lote reproduz a saída bloco a bloco
+# Inclui um bloco vazio, que deve resultar em lista vazia na mesma posição
+def test_compare_lexical_batch_matches_single(tfidf_setup):
+    _, tfidf_model, tfidf_matrix, id_map = tfidf_setup
+    queries = ["privacidade e dados pessoais", "", "cinema brasileiro"]
+    batch = compare_lexical_batch(queries, tfidf_model, tfidf_matrix, id_map, top_n=2)
+
+    assert len(batch) == 3
+    assert batch[1] == []
+    for q, res in zip(queries, batch):
+        assert res == compare_lexical(q, tfidf_model, tfidf_matrix, id_map, top_n=2)
+
+
+# 🔹 Testa se o produto esparso sobre as posting lists reproduz o cosseno do sklearn,
+# inclusive quando há menos blocos com score > 0 do que top_n (completa com zeros)
+def test_compare_lexical_sparse_matches_cosine(tfidf_setup):
+    _, tfidf_model, tfidf_matrix, id_map = tfidf_setup
+    postings = build_postings(tfidf_matrix)
+    query = "cinema e dados"
+
+    expected_scores = cosine_similarity(tfidf_model.transform([query]), tfidf_matrix)[0]
+    result = compare_lexical(query, tfidf_model, tfidf_matrix, id_map, top_n=3, postings=postings)
+
+    assert [uid for uid, _ in result] == [id_map[i]["uid"] for i in top_k_indices(expected_scores, 3)]
+    for uid, score in result:
+        assert score == pytest.approx(expected_scores[int(uid.split("_")[1])])
+
+    # Consulta sem nenhum n-grama do vocabulário: todos os scores são 0
+    result_empty = compare_lexical("xyz", tfidf_model, tfidf_matrix, id_map, top_n=2, postings=postings)
+    assert result_empty == [("doc_0", 0.0), ("doc_1", 0.0)]
+
+
+# 🔹 Testa a versão restrita a candidatos: com todos os blocos, coincide com o lote;
+# com um subconjunto, só os candidatos aparecem
+def test_compare_lexical_candidates(tfidf_setup):
+    _, tfidf_model, tfidf_matrix, id_map = tfidf_setup
+    queries = ["privacidade e dados pessoais", "cinema brasileiro", "dados"]
+    all_rows = [np.arange(3)] * 3
+    full = compare_lexical_batch(queries, tfidf_model, tfidf_matrix, id_map, top_n=2)
+    restricted = compare_lexical_candidates(queries, tfidf_model, tfidf_matrix, id_map, all_rows, top_n=2)
+    for a, b in zip(full, restricted):
+        assert [uid for uid, _ in a] == [uid for uid, _ in b]
+        assert [s for _, s in a] == pytest.approx([s for _, s in b])
+
+    subset = compare_lexical_candidates(queries, tfidf_model, tfidf_matrix, id_map,
+                                        [np.array([2]), np.array([], dtype=np.int64), np.array([0, 2])], top_n=5)
+    assert [uid for uid, _ in subset[0]] == ["doc_2"]
+    assert subset[1] == []
+    assert {uid for uid, _ in subset[2]} == {"doc_0", "doc_2"}
+
+
+# 🔹 Testa os modos de features: "pruned" descarta n-gramas de um só bloco e "hashing"
+# dispensa o vocabulário; em todos, a cópia literal continua em 1º lugar
+@pytest.mark.parametrize("mode", ["vocab", "pruned", "hashing"])
+def test_make_tfidf_vectorizer_modes(mode):
+    corpus = [
+        "a educação pública de qualidade transforma a sociedade brasileira",
+        "a educação pública de qualidade exige investimento contínuo",
+        "o cinema nacional depende de políticas culturais estáveis",
+        "políticas culturais estáveis fortalecem o cinema nacional",
+    ]
+    id_map = [{"uid": f"doc_{i}"} for i in range(len(corpus))]
+    model = make_tfidf_vectorizer(mode, min_df=2, n_features=2 ** 16)
+    matrix = model.fit_transform(iter(corpus))
+
+    if mode == "pruned":
+        vocab = make_tfidf_vectorizer("vocab").fit(corpus).vocabulary_
+        assert len(model.vocabulary_) < len(vocab)
+        assert "educação pública de qualidade" in model.vocabulary_
+    if mode == "hashing":
+        assert matrix.shape[1] == 2 ** 16
+
+    top = compare_lexical(corpus[2], model, matrix, id_map, top_n=2, postings=build_postings(matrix))
+    assert top[0][0] == "doc_2"
+    assert top[0][1] == pytest.approx(1.0, abs=1e-6)
+
+    with pytest.raises(ValueError):
+        make_tfidf_vectorizer("bm25")
@@ -1,6 +1,8 @@
+import dataclasses
 import numpy as np
 import pytest
-from src.compare_semantic import semantic_top_k, embed_texts
+from src import compare_semantic
+from src.compare_semantic import semantic_top_k, semantic_top_k_batch, embed_texts
 
 
 # 🔹 Fixture para criar embeddings e id_map fictícios
@@ -54,3 +56,57 @@ def test_semantic_top_k_limit(monkeypatch, semantic_setup):
     assert len(result) == 1
     assert result[0][0] == "doc_0"
 
+
+
+# 🔹 Testa se a versão em lote faz UMA chamada ao modelo e reproduz a saída bloco a bloco
+def test_semantic_top_k_batch_matches_single(monkeypatch, semantic_setup):
+    embeddings, id_map = semantic_setup
+    vectors = {"a": [0.8, 0.2], "b": [0.0, 1.0]}
+    calls = []
+
+    def fake_embed_texts(texts, model_name):
+        calls.append(list(texts))
+        return np.array([vectors[t] for t in texts])
+
+    monkeypatch.setattr("src.compare_semantic.embed_texts", fake_embed_texts)
+
+    batch = semantic_top_k_batch(["a", "", "b"], embeddings, id_map, "fake-model", k=2)
+    assert calls == [["a", "b"]]
+    assert batch[1] == []
+    assert batch[0] == semantic_top_k("a", embeddings, id_map, "fake-model", k=2)
+    assert batch[2] == semantic_top_k("b", embeddings, id_map, "fake-model", k=2)
+
+
+# 🔹 Sem onnxruntime ou sem modelo exportado, o backend ONNX cai para o torch (None + aviso)
+def test_onnx_backend_falls_back(monkeypatch, tmp_path):
+    fake_settings = dataclasses.replace(compare_semantic.settings, SEM_BACKEND="onnx", SEM_ONNX_DIR=str(tmp_path))
+    monkeypatch.setattr(compare_semantic, "settings", fake_settings)
+    with pytest.warns(UserWarning, match="ONNX"):
+        assert compare_semantic._get_onnx_model("fake-model") is None
+
+
+# 🔹 Vetores do ONNX (ex.: int8) e do torch ficam em caches separados
+def test_embed_texts_cache_separated_by_backend(monkeypatch, tmp_path):
+    class FakeModel:
+        def __init__(self, value, config=None):
+            self.value = value
+            if config is not None:
+                self.config = config
+
+    models = {"torch": FakeModel(1.0), "onnx": FakeModel(2.0, {"onnx_file": "model_int8.onnx"})}
+    def use_backend(backend):
+        fake_settings = dataclasses.replace(compare_semantic.settings, SEM_BACKEND=backend, EMB_CACHE_DIR=str(tmp_path))
+        monkeypatch.setattr(compare_semantic, "settings", fake_settings)
+        monkeypatch.setattr(compare_semantic, "_get_model", lambda name: models[backend])
+    monkeypatch.setattr(compare_semantic, "_encode",
+                        lambda texts, name: np.full((len(texts), 2), compare_semantic._get_model(name).value, dtype=np.float32))
+    compare_semantic.get_embedding_cache.cache_clear()
+
+    use_backend("torch")
+    assert embed_texts(["texto"], "fake-model").tolist() == [[1.0, 1.0]]
+    use_backend("onnx")
+    assert embed_texts(["texto"], "fake-model").tolist() == [[2.0, 2.0]]   # não reusa o vetor torch
+    use_backend("torch")
+    assert embed_texts(["texto"], "fake-model").tolist() == [[1.0, 1.0]]
+    assert compare_semantic._encoder_backend("fake-model") == "torch"
+    compare_semantic.get_embedding_cache.cache_clear()
@@ -1,15 +1,33 @@
-import pytest
+import dataclasses
+import numpy as np
 from src import compare_service
+from src.index_store import Indexes, IndexStore, build_uid_index, lexical_rows
+from src.metrics import Metrics
+from src.result_cache import ResultCache
+
+
+def _fake_indexes(**overrides) -> Indexes:
+    fields = dict(
+        tfidf_model="fake-tfidf", tfidf_matrix="fake-matrix", id_map_lex=[], postings="fake-postings",
+        embeddings="fake-embeddings", id_map_sem=[], model_name="fake-model", ann_index=None,
+        quant_index=None, lsh_index=None, fp_index=None, uid_index={}, lex_rows={}, version="test",
+    )
+    fields.update(overrides)
+    return Indexes(**fields)
+
+
+def _use_indexes(monkeypatch, indexes: Indexes) -> None:
+    store = IndexStore(compare_service.settings, reload_seconds=0, loader=lambda _settings, _version: indexes)
+    monkeypatch.setattr(compare_service, "STORE", store)
+    # caches novos: resultados de um teste não vazam para o próximo
+    monkeypatch.setattr(compare_service, "RESULT_CACHE", ResultCache(max_items=16))
+    monkeypatch.setattr(compare_service, "WINDOW_CACHE", ResultCache(max_items=16))
 
 
 def test_compare_service_with_mocked_dependencies(monkeypatch):
-    # 🔹 Mock dos índices carregados globalmente
-    monkeypatch.setattr(compare_service, "TFIDF_MODEL", "fake-tfidf")
-    monkeypatch.setattr(compare_service, "TFIDF_MATRIX", "fake-matrix")
-    monkeypatch.setattr(compare_service, "ID_MAP_LEX", [{"doc_id": "doc1", "start_word": 0, "end_word": 3, "text": "abc"}])
-    monkeypatch.setattr(compare_service, "EMBEDDINGS", "fake-embeddings")
-    monkeypatch.setattr(compare_service, "ID_MAP_SEM", [])
-    monkeypatch.setattr(compare_service, "MODEL_NAME", "fake-model")
+    # 🔹 Mock dos índices (IndexStore com loader falso)
+    id_map_lex = [{"doc_id": "doc1", "start_word": 0, "end_word": 3, "text": "abc"}]
+    _use_indexes(monkeypatch, _fake_indexes(id_map_lex=id_map_lex, uid_index=build_uid_index(id_map_lex)))
 
     # 🔹 Mock de build_windows
     monkeypatch.setattr(compare_service, "build_windows", lambda text, window_size, stride: [
@@ -19,24 +37,21 @@ def test_compare_service_with_mocked_dependencies(monkeypatch):
     # 🔹 Mock de extend_context
     monkeypatch.setattr(compare_service, "extend_context", lambda text, start_word, end_word, margin: "contexto estendido")
 
-    # 🔹 Mock de compare_lexical
-    monkeypatch.setattr(compare_service.compare_lexical, "compare_lexical", lambda **kwargs: [("doc1", 0.9)])
-
-    # 🔹 Mock de compare_semantic
-    monkeypatch.setattr(compare_service.compare_semantic, "semantic_top_k", lambda **kwargs: [("doc1", 0.95)])
-
-    # 🔹 Mock de combine_scores
-    fake_combined = [{
-        "doc_id": "doc1",
-        "score_final": 0.95,
-        "score_lex_raw": 0.9,
-        "score_sem_raw": 0.95,
-        "score_lex_norm": 1.0,
-        "score_sem_norm": 1.0,
-        "flags": ["plagio_literal"],
-        "match_type": "plagio_literal"
-    }]
-    monkeypatch.setattr(compare_service.combine_scores, "combine_scores", lambda **kwargs: fake_combined)
+    # 🔹 Mock de compare_lexical (lote: uma lista por janela)
+    monkeypatch.setattr(compare_service.compare_lexical, "compare_lexical_batch",
+                        lambda **kwargs: [[("doc1", 0.9)] for _ in kwargs["query_blocks"]])
+
+    # 🔹 Mock de compare_semantic (lote: uma lista por janela)
+    monkeypatch.setattr(compare_service.compare_semantic, "semantic_top_k_batch",
+                        lambda **kwargs: [[("doc1", 0.95)] for _ in kwargs["query_blocks"]])
+
+    # 🔹 Mock de combine_tops (array estruturado: melhor candidato de cada janela)
+    def fake_combine(tops_lex, tops_sem, k_final, **kwargs):
+        combined = np.zeros((len(tops_lex), k_final), dtype=compare_service.combine_scores.COMBINED_DTYPE)
+        combined["cand"] = -1
+        combined[:, 0] = (0, 1, 0.95, 0.9, 0.95, 1.0, 1.0)  # match 1 = plagio_literal
+        return combined, ["doc1"]
+    monkeypatch.setattr(compare_service.combine_scores, "combine_tops", fake_combine)
 
     # 🔹 Executa comparação
     texto = "texto de teste para comparação"
@@ -55,3 +70,112 @@ def test_compare_service_with_mocked_dependencies(monkeypatch):
 def test_compare_service_empty_text():
     # 🔹 Texto vazio deve retornar lista vazia
     assert compare_service.compare("") == []
+
+
+def test_lexical_tops_with_lsh_prefilter(monkeypatch):
+    # 🔹 Com o pré-filtro, o TF-IDF só recebe candidatos do LSH + blocos do top-k semântico
+    from src.minhash_lsh import build_lsh
+    id_map = [{"uid": f"d#b{i}", "doc_id": "d", "text": t} for i, t in enumerate(
+        ["um dois três quatro cinco", "seis sete oito nove dez", "onze doze treze catorze quinze"])]
+    indexes = _fake_indexes(
+        id_map_lex=id_map,
+        lsh_index=build_lsh([r["text"] for r in id_map], num_perm=32, bands=16),
+        lex_rows=lexical_rows(id_map),
+    )
+
+    received = {}
+    def fake_candidates(**kwargs):
+        received["candidates"] = [c.tolist() for c in kwargs["candidates"]]
+        return [[] for _ in kwargs["query_blocks"]]
+    monkeypatch.setattr(compare_service.compare_lexical, "compare_lexical_candidates", fake_candidates)
+
+    compare_service._lexical_tops(
+        indexes,
+        ["um dois três quatro cinco", "nada a ver aqui"],
+        [[("d#b2", 0.5)], [("d#b1", 0.4), ("outro#b0", 0.3)]],
+    )
+    assert received["candidates"] == [[0, 2], [1]]
+
+
+def test_literal_spans_from_fingerprint_index(monkeypatch):
+    # 🔹 Trechos literais são localizados na redação inteira, cruzando janelas
+    from src.fingerprint_index import FingerprintWriter
+    writer = FingerprintWriter(kgram=3, window=2)
+    writer.add("docA", "a redação deve respeitar os direitos humanos e propor intervenção")
+    _use_indexes(monkeypatch, _fake_indexes(fp_index=writer.build()))
+    monkeypatch.setattr(compare_service, "settings", dataclasses.replace(compare_service.settings, FP_MIN_WORDS=5))
+
+    spans = compare_service.literal_spans("Penso que a redação deve respeitar os direitos humanos sempre")
+    assert len(spans) == 1
+    assert spans[0]["doc_id"] == "docA"
+    assert spans[0]["text"] == "a redação deve respeitar os direitos humanos"
+    assert (spans[0]["doc_start"], spans[0]["doc_end"]) == (0, 7)
+
+
+def test_compare_many_scores_all_essays_in_one_batch(monkeypatch):
+    # 🔹 Janelas de várias redações: um único lote e resultados separados por redação
+    id_map_lex = [{"uid": "doc1#b0", "doc_id": "doc1", "start_word": 0, "end_word": 3, "text": "abc"}]
+    _use_indexes(monkeypatch, _fake_indexes(id_map_lex=id_map_lex, uid_index=build_uid_index(id_map_lex)))
+    monkeypatch.setattr(compare_service, "settings", dataclasses.replace(compare_service.settings, WINDOW_SIZE=2, STRIDE=2))
+
+    calls = []
+    def fake_sem(**kwargs):
+        calls.append(list(kwargs["query_blocks"]))
+        return [[("doc1#b0", 0.9 if "copiado" in b else 0.1)] for b in kwargs["query_blocks"]]
+    monkeypatch.setattr(compare_service.compare_semantic, "semantic_top_k_batch", fake_sem)
+    monkeypatch.setattr(compare_service.compare_lexical, "compare_lexical_batch",
+                        lambda **kwargs: [[("doc1#b0", 0.0)] for _ in kwargs["query_blocks"]])
+
+    results = compare_service.compare_many(["texto copiado aqui", "", "nada demais"])
+
+    assert calls == [["texto copiado", "aqui", "nada demais"]]
+    assert [[r["trecho"] for r in res] for res in results] == [["texto copiado"], [], []]
+    assert results[0][0]["melhor_candidato"]["doc_id"] == "doc1"
+    assert results[0][0]["tipo"] == "parafrase"  # semântico 0.9, léxico 0.0
+
+
+def test_compare_many_reuses_cached_essays_and_windows(monkeypatch):
+    # 🔹 Redação repetida (só muda o espaçamento) vem do cache; parágrafo repetido só paga janelas novas
+    id_map_lex = [{"uid": "doc1#b0", "doc_id": "doc1", "start_word": 0, "end_word": 3, "text": "abc"}]
+    indexes = _fake_indexes(id_map_lex=id_map_lex, uid_index=build_uid_index(id_map_lex), version="v1")
+    _use_indexes(monkeypatch, indexes)
+    monkeypatch.setattr(compare_service, "settings", dataclasses.replace(compare_service.settings, WINDOW_SIZE=2, STRIDE=2))
+
+    calls = []
+    def fake_sem(**kwargs):
+        calls.append(list(kwargs["query_blocks"]))
+        return [[("doc1#b0", 0.9)] for _ in kwargs["query_blocks"]]
+    monkeypatch.setattr(compare_service.compare_semantic, "semantic_top_k_batch", fake_sem)
+    monkeypatch.setattr(compare_service.compare_lexical, "compare_lexical_batch",
+                        lambda **kwargs: [[("doc1#b0", 0.0)] for _ in kwargs["query_blocks"]])
+
+    metrics = Metrics()
+    monkeypatch.setattr(compare_service, "METRICS", metrics)
+    first = compare_service.compare("texto copiado aqui")
+    first[0]["trecho"] = "alterado pelo chamador"
+    again = compare_service.compare("  texto   copiado\naqui ")
+    assert calls == [["texto copiado", "aqui"]]
+    assert again[0]["trecho"] == "texto copiado"
+
+    compare_service.compare("texto copiado outra coisa")
+    assert calls[-1] == ["outra coisa"]
+    assert compare_service.cache_stats()["redacoes"]["hits"] == 1
+    counters = metrics.snapshot()["counters"]
+    assert (counters["essays"], counters["result_cache_hits"], counters["window_cache_hits"]) == (3, 1, 1)
+    assert counters["windows"] == 4 and counters["windows_scored"] == 3
+
+    # 🔹 Nova versão dos índices invalida os dois caches
+    v2 = dataclasses.replace(indexes, version="v2")
+    monkeypatch.setattr(compare_service, "STORE", IndexStore(compare_service.settings, reload_seconds=0,
+                                                             loader=lambda _settings, _version: v2))
+    compare_service.compare("texto copiado aqui")
+    assert calls[-1] == ["texto copiado", "aqui"]
+
+
+# 🔹 Todo parâmetro que muda o resultado entra na chave do cache
+def test_result_params_cover_search_settings(monkeypatch):
+    base = compare_service._result_params()
+    for name, value in (("LEX_PREFILTER", "lsh"), ("LEX_FEATURES", "hashing"), ("SEM_SEARCH", "ivf"),
+                        ("SEM_QUANTIZATION", "int8"), ("FP_KGRAM", 99)):
+        monkeypatch.setattr(compare_service, "settings", dataclasses.replace(compare_service.settings, **{name: value}))
+        assert compare_service._result_params() != base, name
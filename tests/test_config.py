@@ -20,6 +20,10 @@ def test_get_settings_custom_env():
         "DELTA_PARA": "0.25",
         "MIN_GATE": "0.20",
         "SEM_MODEL_NAME": "fake-model",
+        "SEM_SEARCH": "IVF",
+        "IVF_NPROBE": "4",
+        "INGEST_WORKERS": "8",
+        "ENCODE_WORKERS": "4",
         "WINDOW_SIZE": "50",
         "STRIDE": "25",
         "CONTEXT_MARGIN": "12"
@@ -31,6 +35,10 @@ def test_get_settings_custom_env():
     assert settings.K_LEX == 15
     assert settings.ALPHA == 0.75
     assert settings.SEM_MODEL_NAME == "fake-model"
+    assert settings.SEM_SEARCH == "ivf"
+    assert settings.IVF_NPROBE == 4
+    assert settings.INGEST_WORKERS == 8
+    assert settings.ENCODE_WORKERS == 4
     assert settings.WINDOW_SIZE == 50
     assert settings.CONTEXT_MARGIN == 12
 
@@ -43,4 +51,7 @@ def test_get_settings_defaults():
     assert settings.ALPHA == 0.6
     assert settings.SEM_MODEL_NAME.startswith("sentence-transformers/")
     assert settings.WINDOW_SIZE == 40
+    assert settings.SEM_SEARCH == "exact"
+    assert settings.SEM_QUANTIZATION == "none"
+    assert settings.EMB_CACHE_DIR == ""
 
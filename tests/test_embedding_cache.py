@@ -0,0 +1,123 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+import numpy as np
+import pytest
+from src.embedding_cache import EmbeddingCache, cached_encode, cache_key, open_cache
+
+
+def _fake_encoder(calls):
+    # Embedding determinístico: [nº de caracteres, nº de palavras]
+    def encode(texts):
+        calls.append(list(texts))
+        return np.array([[len(t), len(t.split())] for t in texts], dtype=np.float32)
+    return encode
+
+
+# 🔹 Testa que só os textos ausentes vão ao modelo, deduplicados e na ordem original
+def test_cached_encode_hits_and_misses(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "fake-model")
+    calls = []
+    encode = _fake_encoder(calls)
+
+    first = cached_encode(["a b", "c", "a  b"], encode, cache)
+    assert calls == [["a b", "c"]]  # "a  b" normaliza para "a b"
+    assert first.tolist() == [[3, 2], [1, 1], [3, 2]]
+
+    second = cached_encode(["c", "d e f"], encode, cache)
+    assert calls[-1] == ["d e f"]
+    assert second.tolist() == [[1, 1], [5, 3]]
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 4
+
+
+# 🔹 Testa persistência em disco entre instâncias e isolamento por modelo
+def test_embedding_cache_persists(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "fake-model")
+    cache.put_many(["texto um"], np.array([[0.1, 0.2]]))
+    cache.flush()
+
+    reopened = EmbeddingCache(str(tmp_path), "fake-model")
+    found, missing = reopened.get_many(["texto um", "outro"])
+    assert missing == [1]
+    assert np.allclose(found[0], [0.1, 0.2])
+
+    other_model = EmbeddingCache(str(tmp_path), "outro-modelo")
+    assert other_model.get_many(["texto um"])[1] == [0]
+    assert cache_key("m1", "x") != cache_key("m2", "x")
+
+
+# 🔹 Testa evicção LRU ao atingir max_items
+def test_embedding_cache_lru_eviction(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "fake-model", max_items=2)
+    cache.put_many(["a", "b"], np.array([[1.0], [2.0]]))
+    cache.get_many(["a"])                      # "a" passa a ser o mais recente
+    cache.put_many(["c"], np.array([[3.0]]))  # evicta "b"
+
+    assert len(cache) == 2
+    assert cache.get_many(["b"])[1] == [0]
+    found, missing = cache.get_many(["a", "c"])
+    assert missing == [] and [float(v[0]) for v in found] == [1.0, 3.0]
+
+    with pytest.raises(ValueError):
+        cache.put_many(["d"], np.array([[1.0, 2.0]]))
+
+
+def test_open_cache_disabled():
+    assert open_cache("", "fake-model", 10) is None
+
+
+# 🔹 Testa duas instâncias no mesmo diretório (como dois processos): slots alocados por
+# uma são vistos pela outra antes de alocar, e uma evicção alheia não devolve vetor errado
+def test_embedding_cache_shared_directory(tmp_path):
+    a = EmbeddingCache(str(tmp_path), "fake-model", max_items=3)
+    b = EmbeddingCache(str(tmp_path), "fake-model", max_items=3)
+    a.put_many(["a1", "a2"], np.array([[1.0], [2.0]]))
+    b.put_many(["b1"], np.array([[3.0]]))           # b aloca depois de ler o log de a
+    found, missing = a.get_many(["a1", "a2", "b1"])
+    assert missing == [] and [float(v[0]) for v in found] == [1.0, 2.0, 3.0]
+
+    b.put_many(["b2"], np.array([[4.0]]))           # cheio: b evicta "a1" e reusa o slot
+    found, missing = a.get_many(["a1", "b2"])
+    assert missing == [0] and float(found[1][0]) == 4.0
+
+    reopened = EmbeddingCache(str(tmp_path), "fake-model", max_items=3)
+    found, missing = reopened.get_many(["a2", "b1", "b2"])
+    assert missing == [] and [float(v[0]) for v in found] == [2.0, 3.0, 4.0]
+
+
+# 🔹 Testa que o índice é um log só de acréscimo, compactado quando cresce demais
+def test_embedding_cache_log_appends_and_compacts(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "fake-model", max_items=4)
+    log = os.path.join(cache.path, "index.log")
+    cache.put_many(["a"], np.array([[1.0]]))
+    cache.put_many(["b"], np.array([[2.0]]))
+    with open(log, "r", encoding="utf-8") as f:
+        assert len(f.read().splitlines()) == 2
+
+    for i in range(1100):                           # passa de 2 * max_items + 1024 linhas
+        cache.put_many([f"t{i % 6}"], np.array([[float(i)]]))
+    with open(log, "r", encoding="utf-8") as f:
+        assert len(f.read().splitlines()) < 100
+    found, missing = EmbeddingCache(str(tmp_path), "fake-model", max_items=4).get_many(["t5", "t4"])
+    assert missing == [] and [float(v[0]) for v in found] == [1097.0, 1096.0]
+
+
+def _put_in_process(args):
+    # Função de módulo (vai ao processo filho): grava 50 textos do worker em lotes de 5
+    path, worker = args
+    cache = EmbeddingCache(path, "fake-model", max_items=1000)
+    for start in range(0, 50, 5):
+        texts = [f"w{worker} t{i}" for i in range(start, start + 5)]
+        cache.put_many(texts, np.array([[worker, i] for i in range(start, start + 5)], dtype=np.float32))
+    return worker
+
+
+# 🔹 Testa gravação concorrente de vários processos no mesmo cache
+def test_embedding_cache_multiprocess_writers(tmp_path):
+    with ProcessPoolExecutor(4) as pool:
+        assert sorted(pool.map(_put_in_process, [(str(tmp_path), w) for w in range(4)])) == [0, 1, 2, 3]
+
+    cache = EmbeddingCache(str(tmp_path), "fake-model", max_items=1000)
+    texts = [f"w{w} t{i}" for w in range(4) for i in range(50)]
+    found, missing = cache.get_many(texts)
+    assert missing == [] and len(cache) == 200
+    assert [v.tolist() for v in found] == [[w, i] for w in range(4) for i in range(50)]
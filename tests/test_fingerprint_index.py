@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from src.fingerprint_index import FingerprintWriter, find_spans, kgram_hashes, load_fingerprints, save_fingerprints, winnow
+
+
+def _words(n, seed):
+    rng = np.random.default_rng(seed)
+    return [f"w{x}" for x in rng.integers(0, 10_000, size=n)]
+
+
+# 🔹 Garantia do winnowing: toda sequência de `window` k-gramas tem uma impressão
+def test_winnow_covers_every_window():
+    hashes = kgram_hashes(" ".join(_words(200, 0)), 5)
+    picks = winnow(hashes, 4)
+    assert np.all(np.diff(picks) <= 4) and picks[0] <= 3 and picks[-1] >= len(hashes) - 4
+    assert len(picks) < len(hashes) / 2  # densidade ~ 2 / (window + 1)
+
+
+# 🔹 Trechos máximos: cruzam as janelas e apontam as posições no documento de origem
+def test_find_spans_reports_maximal_literal_spans(tmp_path):
+    doc_a, doc_b = _words(300, 1), _words(300, 2)
+    writer = FingerprintWriter(kgram=5, window=4)
+    writer.add("docA", " ".join(doc_a))
+    writer.add("docB", " ".join(doc_b))
+    save_fingerprints(str(tmp_path), writer.build())
+    index = load_fingerprints(str(tmp_path))
+
+    essay = _words(10, 3) + doc_a[100:160] + _words(7, 4) + doc_b[20:35] + _words(5, 5)
+    spans = find_spans(index, " ".join(essay), min_words=10)
+
+    assert [(s["doc_id"], s["n_words"]) for s in spans] == [("docA", 60), ("docB", 15)]
+    a = spans[0]
+    assert (a["query_start"], a["query_end"], a["doc_start"], a["doc_end"]) == (10, 70, 100, 160)
+    assert essay[spans[1]["query_start"]:spans[1]["query_end"]] == doc_b[20:35]
+    assert find_spans(index, essay, min_words=10) == spans  # lista de palavras já dividida
+
+    # Trechos mais curtos que window + kgram - 1 não são garantidos nem reportados
+    assert find_spans(index, " ".join(doc_a[5:11])) == []
+    assert load_fingerprints(str(tmp_path / "nada")) is None
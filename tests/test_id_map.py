@@ -0,0 +1,81 @@
+import json
+import pytest
+from src import io_utils
+from src import id_map as id_map_module
+from src.id_map import UidRows, save_id_map, load_id_map
+
+
+# 🔹 Fixture com id_map no formato gerado pelo pipeline (um dict por bloco)
+@pytest.fixture
+def id_map_blocks():
+    return [
+        {"uid": "doc_a#b0", "doc_id": "doc_a", "block_id": 0, "start_word": 0, "end_word": 40, "text": "Olá, mundo!"},
+        {"uid": "doc_a#b1", "doc_id": "doc_a", "block_id": 1, "start_word": 20, "end_word": 60, "text": "privacidade"},
+        {"uid": "doc_b#b0", "doc_id": "doc_b", "block_id": 0, "start_word": 0, "end_word": 12, "text": ""},
+    ]
+
+
+# 🔹 Testa ida e volta do formato colunar: registros equivalem aos dicts originais
+def test_id_map_roundtrip(tmp_path, id_map_blocks):
+    save_id_map(str(tmp_path), id_map_blocks)
+    id_map = load_id_map(str(tmp_path))
+
+    assert len(id_map) == 3
+    assert list(id_map) == id_map_blocks
+    assert id_map[-1]["doc_id"] == "doc_b"
+    assert id_map.doc_names == ["doc_a", "doc_b"]
+    with pytest.raises(IndexError):
+        id_map[3]
+
+
+# 🔹 Testa acessores diretos por linha (sem montar o registro inteiro)
+def test_id_map_row_accessors(tmp_path, id_map_blocks):
+    save_id_map(str(tmp_path), id_map_blocks)
+    id_map = load_id_map(str(tmp_path))
+
+    assert id_map.uid(1) == "doc_a#b1"
+    assert id_map.doc_id(2) == "doc_b"
+    assert id_map.text(0) == "Olá, mundo!"
+    assert id_map[1].get("start_word") == 20
+    assert load_id_map(str(tmp_path / "inexistente")) is None
+
+
+# 🔹 Testa que o id_map não é mais duplicado em JSON no índice semântico,
+# e que índices antigos (id_map dentro do meta.json) continuam legíveis
+def test_semantic_meta_without_id_map_and_legacy(tmp_path, id_map_blocks):
+    import numpy as np
+    out_dir = tmp_path / "semantic"
+    io_utils.save_index_semantic(str(out_dir), np.ones((3, 2)), id_map_blocks, "fake-model")
+    meta = json.loads((out_dir / "meta.json").read_text(encoding="utf-8"))
+    assert "id_map" not in meta
+
+    (out_dir / "meta.json").write_text(json.dumps({"id_map": id_map_blocks, "model_name": "m"}), encoding="utf-8")
+    _, id_map, model_name = io_utils.load_index_semantic(str(out_dir))
+    assert id_map == id_map_blocks
+    assert model_name == "m"
+
+
+# 🔹 Testa uid -> linha por busca binária nos hashes gravados com o id_map
+def test_uid_rows_lookup(tmp_path, id_map_blocks):
+    blocks = id_map_blocks + [
+        {"uid": "doc_a#b1", "doc_id": "doc_a", "block_id": 9, "text": "repetido"},  # uid repetido
+        {"doc_id": "doc_c", "block_id": 0, "text": "sem uid"},                      # chave = doc_id
+    ]
+    save_id_map(str(tmp_path), blocks)
+    id_map = load_id_map(str(tmp_path))
+    assert id_map.uid_hashes is not None and len(id_map.uid_hashes) == 5
+
+    for rows in (UidRows(id_map), UidRows(blocks)):  # arquivos gravados / lista em memória
+        assert rows.get("doc_b#b0") == 2
+        assert rows.get("doc_a#b1") == 1           # vale a menor linha
+        assert rows.get("doc_c") == 4
+        assert rows.get("inexistente") is None and "inexistente" not in rows
+
+
+# 🔹 Testa que colisões de hash são resolvidas conferindo o uid da linha
+def test_uid_rows_hash_collisions(monkeypatch, id_map_blocks):
+    monkeypatch.setattr(id_map_module, "uid_hash", lambda uid: 7)
+    rows = UidRows(id_map_blocks)
+    assert [rows[item["uid"]] for item in id_map_blocks] == [0, 1, 2]
+    with pytest.raises(KeyError):
+        rows["doc_z#b0"]
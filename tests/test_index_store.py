@@ -0,0 +1,158 @@
+import os
+import threading
+import time
+import pytest
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from src.config import get_settings
+from src.id_map import load_id_map, save_id_map
+from src.index_store import IndexStore, build_uid_index, index_paths, load_indexes
+from src import io_utils
+
+
+def _settings(tmp_path):
+    root = str(tmp_path / "indexes")
+    return get_settings({"DATA_INDEXES_DIR": root, "INDEX_RELOAD_SECONDS": "0"})
+
+
+class _Loaded:
+    def __init__(self, version):
+        self.version = version
+
+
+def test_build_uid_index_lookup_by_uid():
+    # 🔹 A chave é o uid do bloco (não o doc_id) e o léxico tem precedência
+    id_map_lex = [
+        {"uid": "docA#b0", "doc_id": "docA", "block_id": 0, "start_word": 0, "end_word": 40, "text": "bloco zero"},
+        {"uid": "docA#b1", "doc_id": "docA", "block_id": 1, "start_word": 20, "end_word": 60, "text": "bloco um"},
+    ]
+    id_map_sem = [
+        {"uid": "docA#b1", "doc_id": "docA", "block_id": 1, "start_word": 20, "end_word": 60, "text": "outro"},
+        {"uid": "docB#b0", "doc_id": "docB", "block_id": 0, "start_word": 0, "end_word": 40, "text": "bloco b"},
+    ]
+    index = build_uid_index(id_map_lex, id_map_sem)
+
+    assert index["docA#b1"]["block_id"] == 1
+    assert index["docA#b1"]["start_word"] == 20
+    assert index["docA#b1"]["text"] == "bloco um"
+    assert index["docB#b0"]["doc_id"] == "docB"
+    assert "docA" not in index
+
+
+def test_index_paths_follow_current_pointer(tmp_path):
+    # 🔹 Sem CURRENT: diretórios de settings; com CURRENT: os da versão publicada
+    settings = _settings(tmp_path)
+    assert index_paths(settings)["lexical"] == settings.INDEX_LEX_DIR
+
+    version = io_utils.new_index_version(settings.DATA_INDEXES_DIR)
+    assert index_paths(settings)["lexical"] == settings.INDEX_LEX_DIR  # ainda não publicada
+    io_utils.publish_index_version(settings.DATA_INDEXES_DIR, version)
+    assert index_paths(settings)["semantic"] == str(tmp_path / "indexes" / "versions" / version / "semantic")
+
+
+def test_versioned_indexes_share_one_id_map(tmp_path):
+    # 🔹 O id_map da versão fica em <versão>/idmap: gravado e aberto uma única vez
+    root = str(tmp_path / "indexes")
+    settings = get_settings({"DATA_INDEXES_DIR": root, "FP_KGRAM": "0", "LEX_PREFILTER": "none",
+                             "SEM_SEARCH": "exact", "SEM_QUANTIZATION": "none"})
+    version = io_utils.new_index_version(root)
+    paths = index_paths(settings, version)
+    texts = ["um texto qualquer", "outro texto"]
+    save_id_map(paths["idmap"], [{"uid": f"d#b{i}", "doc_id": "d", "block_id": i, "text": t} for i, t in enumerate(texts)])
+    id_map = load_id_map(paths["idmap"])
+    tfidf = TfidfVectorizer()
+    io_utils.save_index_lexical(paths["lexical"], tfidf, tfidf.fit_transform(texts), id_map)
+    io_utils.save_index_semantic(paths["semantic"], np.eye(2), id_map, "fake-model")
+    for name in ("lexical", "semantic"):
+        assert not any(f.startswith("idmap_") for f in os.listdir(paths[name]))
+
+    io_utils.publish_index_version(root, version)
+    indexes = load_indexes(settings)
+    assert indexes.id_map_lex is indexes.id_map_sem
+    assert indexes.uid_index["d#b1"]["text"] == "outro texto"
+    _, _, id_map_lex = io_utils.load_index_lexical(paths["lexical"])  # sem id_map informado: o da versão
+    assert id_map_lex.text(0) == "um texto qualquer"
+
+
+def test_prune_index_versions_keeps_current(tmp_path):
+    # 🔹 Mantém as mais recentes e nunca remove a versão apontada por CURRENT
+    root = str(tmp_path / "indexes")
+    for name in ("20240101-000000-000000001", "20240102-000000-000000001", "20240103-000000-000000001"):
+        (tmp_path / "indexes" / "versions" / name).mkdir(parents=True)
+    io_utils.publish_index_version(root, "20240101-000000-000000001")
+
+    removed = io_utils.prune_index_versions(root, keep=1)
+    assert removed == ["20240102-000000-000000001"]
+    assert sorted(p.name for p in (tmp_path / "indexes" / "versions").iterdir()) == [
+        "20240101-000000-000000001", "20240103-000000-000000001"]
+
+
+def test_store_loads_once_even_with_concurrent_callers(tmp_path):
+    # 🔹 Carregamento preguiçoso: várias threads na 1ª chamada -> um único load
+    calls = []
+
+    def loader(settings, version):
+        calls.append(version)
+        time.sleep(0.05)
+        return _Loaded(version)
+
+    store = IndexStore(_settings(tmp_path), loader=loader)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(store.get())) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+    assert store.warm() is results[0]
+
+
+def test_store_swaps_to_new_version_in_background(tmp_path):
+    # 🔹 Nova versão publicada: get() segue devolvendo a atual até a nova estar carregada
+    settings = _settings(tmp_path)
+    root = settings.DATA_INDEXES_DIR
+    io_utils.publish_index_version(root, io_utils.new_index_version(root))
+
+    release = threading.Event()
+    loads = []
+    def loader(s, version):
+        if loads:
+            release.wait(5)  # carga lenta da versão nova
+        loads.append(version)
+        return _Loaded(version)
+
+    store = IndexStore(settings, reload_seconds=1e-9, loader=loader)
+    old = store.get()
+
+    new_version = io_utils.new_index_version(root)
+    io_utils.publish_index_version(root, new_version)
+    assert store.get() is old  # dispara a carga e não bloqueia
+    assert store.get() is old
+
+    release.set()
+    store.wait(5)
+    assert store.get().version == new_version
+    assert loads == [old.version, new_version]
+
+
+def test_store_keeps_current_indexes_when_reload_fails(tmp_path):
+    # 🔹 Falha ao carregar a versão nova: mantém a versão em uso e avisa
+    settings = _settings(tmp_path)
+    root = settings.DATA_INDEXES_DIR
+    first_version = io_utils.new_index_version(root)
+    io_utils.publish_index_version(root, first_version)
+
+    def loader(s, version):
+        if version != first_version:
+            raise FileNotFoundError("tfidf_model.joblib")
+        return _Loaded(version)
+
+    store = IndexStore(settings, reload_seconds=1e-9, loader=loader)
+    first = store.get()
+    io_utils.publish_index_version(root, io_utils.new_index_version(root))
+    with pytest.warns(UserWarning):
+        store.get()
+        store.wait(5)
+    assert store.get() is first
@@ -4,6 +4,9 @@ import pytest
 from scipy import sparse
 from sklearn.feature_extraction.text import TfidfVectorizer
 from src import io_utils
+from src.ann_index import build_ivf
+from src.minhash_lsh import build_lsh, query_lsh
+from src.quantized_index import quantize
 
 
 # 🔹 Testa ensure_dir criando diretório inexistente
@@ -41,6 +44,20 @@ def test_load_corpus_prefers_processed(tmp_path):
     assert "processado" in corpus[0]["text"]
 
 
+# 🔹 Testa iter_corpus: leitura paralela preserva a ordem dos arquivos
+def test_iter_corpus_streams_in_order(tmp_path):
+    raw_dir = tmp_path / "raw"
+    raw_dir.mkdir()
+    for i in range(10):
+        (raw_dir / f"doc{i:02d}.txt").write_text(f"texto {i}", encoding="utf-8")
+
+    docs = io_utils.iter_corpus(str(raw_dir), max_workers=3, prefetch=2)
+    assert not isinstance(docs, list)
+    corpus = list(docs)
+    assert [d["doc_id"] for d in corpus] == [f"doc{i:02d}" for i in range(10)]
+    assert corpus[7]["text"] == "texto 7"
+
+
 # 🔹 Testa save/load do índice léxico
 def test_save_and_load_index_lexical(tmp_path):
     out_dir = tmp_path / "lexical"
@@ -50,13 +67,38 @@ def test_save_and_load_index_lexical(tmp_path):
 
     io_utils.save_index_lexical(str(out_dir), tfidf, matrix, id_map)
     assert (out_dir / "tfidf_model.joblib").exists()
-    assert (out_dir / "tfidf_matrix.npz").exists()
-    assert (out_dir / "id_map.json").exists()
+    assert (out_dir / "tfidf_data.npy").exists()
+    assert (out_dir / "postings_data.npy").exists()
+    assert (out_dir / "idmap_docs.json").exists()
+    assert not (out_dir / "id_map.json").exists()
 
     model_loaded, matrix_loaded, id_map_loaded = io_utils.load_index_lexical(str(out_dir))
     assert isinstance(model_loaded, TfidfVectorizer)
     assert sparse.issparse(matrix_loaded)
-    assert id_map_loaded == id_map
+    assert (matrix_loaded != matrix).nnz == 0
+    assert list(id_map_loaded) == id_map
+
+    # Matriz e postings são abertos via mmap (somente leitura), sem cópia em memória
+    assert not matrix_loaded.data.flags.writeable
+    postings = io_utils.load_postings_lexical(str(out_dir))
+    assert (postings != matrix.T).nnz == 0
+
+
+# 🔹 Testa leitura de índice léxico no formato antigo (tfidf_matrix.npz, sem postings)
+def test_load_index_lexical_legacy_npz(tmp_path):
+    import joblib, json
+    out_dir = tmp_path / "lexical"
+    out_dir.mkdir()
+    tfidf = TfidfVectorizer()
+    matrix = tfidf.fit_transform(["teste de tfidf", "outro teste"])
+    joblib.dump(tfidf, out_dir / "tfidf_model.joblib")
+    sparse.save_npz(out_dir / "tfidf_matrix.npz", matrix)
+    (out_dir / "id_map.json").write_text(json.dumps([{"doc_id": "a"}, {"doc_id": "b"}]), encoding="utf-8")
+
+    _, matrix_loaded, _ = io_utils.load_index_lexical(str(out_dir))
+    assert (matrix_loaded != matrix).nnz == 0
+    assert io_utils.load_postings_lexical(str(out_dir)) is None
+    assert (io_utils.load_postings_lexical(str(out_dir), matrix_loaded) != matrix.T).nnz == 0
 
 
 # 🔹 Testa save/load do índice semântico
@@ -72,5 +114,64 @@ def test_save_and_load_index_semantic(tmp_path):
 
     emb_loaded, id_map_loaded, model_name_loaded = io_utils.load_index_semantic(str(out_dir))
     assert np.array_equal(embeddings, emb_loaded)
-    assert id_map_loaded == id_map
+    assert isinstance(emb_loaded, np.memmap) and emb_loaded.dtype == np.float32
+    # Campos ausentes no id_map original são preenchidos com os valores padrão
+    assert [dict(r) for r in id_map_loaded] == [
+        {"doc_id": d["doc_id"], "block_id": -1, "start_word": -1, "end_word": -1, "text": ""} for d in id_map
+    ]
     assert model_name_loaded == model_name
+
+
+# 🔹 Testa save/load do índice aproximado (IVF) junto ao índice semântico
+def test_save_and_load_ann_index(tmp_path):
+    out_dir = tmp_path / "semantic"
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(20, 4)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    ann = build_ivf(embeddings, nlist=4)
+
+    io_utils.save_index_semantic(str(out_dir), embeddings, [{"doc_id": "d"}] * 20, "fake-model")
+    assert io_utils.load_ann_index(str(out_dir)) is None
+
+    io_utils.save_index_semantic(str(out_dir), embeddings, [{"doc_id": "d"}] * 20, "fake-model", ann_index=ann)
+    loaded = io_utils.load_ann_index(str(out_dir))
+    assert np.array_equal(loaded.centroids, ann.centroids)
+    assert np.array_equal(loaded.list_offsets, ann.list_offsets)
+    assert np.array_equal(loaded.list_ids, ann.list_ids)
+
+    # regravado sem IVF: as listas do build anterior não podem sobrar
+    io_utils.save_index_semantic(str(out_dir), embeddings, [{"doc_id": "d"}] * 20, "fake-model")
+    assert io_utils.load_ann_index(str(out_dir)) is None
+    assert not list(out_dir.glob("ivf_*.npy"))
+
+
+# 🔹 Testa save/load do índice quantizado e a remoção de vetores de builds antigos
+def test_save_and_load_quantized_index(tmp_path):
+    out_dir = tmp_path / "semantic"
+    embeddings = np.random.default_rng(0).normal(size=(10, 4)).astype(np.float32)
+    id_map = [{"doc_id": "d"}] * 10
+
+    io_utils.save_index_semantic(str(out_dir), embeddings, id_map, "fake-model", quantized=quantize(embeddings, "int8"))
+    loaded = io_utils.load_quantized_index(str(out_dir), "int8")
+    assert loaded.kind == "int8" and loaded.codes.shape == (10, 4)
+    assert loaded.scales.shape == (4,)
+
+    io_utils.save_index_semantic(str(out_dir), embeddings, id_map, "fake-model")
+    assert io_utils.load_quantized_index(str(out_dir), "int8") is None
+
+
+# 🔹 Testa save/load do pré-filtro LSH (removido ao regravar o índice léxico)
+def test_save_and_load_lsh(tmp_path):
+    out_dir = tmp_path / "lexical"
+    texts = ["um dois três quatro", "cinco seis sete oito"]
+    tfidf = TfidfVectorizer()
+    io_utils.save_index_lexical(str(out_dir), tfidf, tfidf.fit_transform(texts), [{"doc_id": "d"}] * 2)
+    assert io_utils.load_lsh(str(out_dir)) is None
+
+    io_utils.save_lsh(str(out_dir), build_lsh(texts, num_perm=16, bands=8))
+    loaded = io_utils.load_lsh(str(out_dir))
+    assert loaded.bands == 8 and loaded.signatures.shape == (2, 16)
+    assert 1 in query_lsh(loaded, ["cinco seis sete oito"])[0][0]
+
+    io_utils.save_index_lexical(str(out_dir), tfidf, tfidf.transform(texts), [{"doc_id": "d"}] * 2)
+    assert io_utils.load_lsh(str(out_dir)) is None
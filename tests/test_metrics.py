@@ -0,0 +1,63 @@
+import json
+import threading
+import time
+import urllib.request
+import pytest
+from http.server import ThreadingHTTPServer
+from src import metrics
+from src.metrics import Metrics, profile_request
+
+
+# 🔹 Testa timers por etapa e contadores no snapshot e no texto do Prometheus
+def test_metrics_stages_counters_and_prometheus():
+    m = Metrics(prefix="teste")
+    with m.stage("embedding"):
+        time.sleep(0.01)
+    m.observe("embedding", 0.002)
+    m.inc("windows", 7)
+
+    snap = m.snapshot()
+    assert snap["counters"] == {"windows": 7}
+    assert snap["stages"]["embedding"]["count"] == 2
+    assert snap["stages"]["embedding"]["max_ms"] >= 10
+
+    text = m.prometheus()
+    assert 'teste_stage_seconds_count{stage="embedding"} 2' in text
+    assert "teste_windows_total 7" in text
+
+
+# 🔹 Testa o gancho de profiling: grava .prof/.json só para requisições lentas
+def test_profile_request_saves_slow_requests(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS", Metrics())
+    with profile_request("compare", str(tmp_path), min_seconds=10.0):
+        metrics.METRICS.observe("combine", 0.001)
+    assert list(tmp_path.iterdir()) == []
+
+    with profile_request("compare", str(tmp_path), min_seconds=0.0):
+        metrics.METRICS.observe("combine", 0.001)
+        metrics.METRICS.observe("combine", 0.002)
+    names = sorted(p.suffix for p in tmp_path.iterdir())
+    assert names == [".json", ".prof"]
+    trace = json.loads(next(tmp_path.glob("*.json")).read_text(encoding="utf-8"))
+    assert trace["stages"] == {"combine": pytest.approx(0.003)}
+
+    with profile_request("compare", "", min_seconds=0.0):  # desativado: nada é gravado
+        pass
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+# 🔹 Testa o endpoint /metrics
+def test_metrics_http_endpoint(monkeypatch):
+    m = Metrics()
+    m.inc("essays", 3)
+    monkeypatch.setattr(metrics, "METRICS", m)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), metrics._MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as resp:
+            body = resp.read().decode("utf-8")
+        assert "plagio_essays_total 3" in body
+    finally:
+        server.shutdown()
+        server.server_close()
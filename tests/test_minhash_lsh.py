@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from src.minhash_lsh import build_lsh, minhash_signatures, query_lsh, shingle_hashes
+
+
+def _blocks(n, seed=0, words=40):
+    rng = np.random.default_rng(seed)
+    vocab = [f"palavra{i}" for i in range(5000)]
+    return [" ".join(rng.choice(vocab, size=words)) for _ in range(n)]
+
+
+# 🔹 Testa que a fração de valores iguais nas assinaturas estima o Jaccard dos shingles
+def test_minhash_estimates_jaccard():
+    base = _blocks(1)[0].split()
+    a, b = " ".join(base), " ".join(base[:30] + _blocks(1, seed=9, words=10)[0].split())
+    sa, sb = set(shingle_hashes(a).tolist()), set(shingle_hashes(b).tolist())
+    true_j = len(sa & sb) / len(sa | sb)
+
+    sigs = minhash_signatures([a, b], num_perm=256)
+    assert sigs.dtype == np.uint32
+    assert abs((sigs[0] == sigs[1]).mean() - true_j) < 0.1
+
+
+# 🔹 Cópias (inteiras ou parciais) viram candidatas; textos sem relação, não
+def test_query_lsh_finds_near_duplicates():
+    corpus = _blocks(300)
+    index = build_lsh(corpus, num_perm=96, bands=32)
+    assert index.rows_per_band == 3
+
+    copied = corpus[42]
+    partial = " ".join(corpus[7].split()[5:] + ["acréscimo", "novo", "aqui", "e", "ali"])
+    unrelated = _blocks(1, seed=123)[0]
+    (c1, j1), (c2, j2), (c3, _) = query_lsh(index, [copied, partial, unrelated])
+
+    assert 42 in c1 and j1[list(c1).index(42)] == 1.0
+    assert 7 in c2 and j2[list(c2).index(7)] > 0.5
+    assert len(c3) == 0
+
+    with pytest.raises(ValueError):
+        build_lsh(corpus, num_perm=100, bands=32)
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from src import onnx_backend
+
+
+# 🔹 Testa o mean pooling: tokens de padding não entram na média
+def test_pool_mean_ignores_padding():
+    hidden = np.array([[[1.0, 1.0], [3.0, 3.0], [100.0, 100.0]]], dtype=np.float32)
+    mask = np.array([[1, 1, 0]])
+    assert onnx_backend._pool(hidden, mask, "mean").tolist() == [[2.0, 2.0]]
+    assert onnx_backend._pool(hidden, mask, "cls").tolist() == [[1.0, 1.0]]
+
+
+class Transformer:
+    pass
+
+
+class Pooling:
+    def __init__(self, mode):
+        self.mode = mode
+
+    def get_pooling_mode_str(self):
+        return self.mode
+
+
+class Normalize:
+    pass
+
+
+class Dense:
+    pass
+
+
+# 🔹 Testa a checagem de exportação: só Transformer -> Pooling mean/cls [-> Normalize]
+def test_exportable_pooling_rejects_unsupported_models():
+    assert onnx_backend.exportable_pooling([Transformer(), Pooling("mean"), Normalize()]) == "mean"
+    assert onnx_backend.exportable_pooling([Transformer(), Pooling("cls")]) == "cls"
+    for modules in (
+        [Transformer(), Pooling("max")],
+        [Transformer(), Pooling("weightedmean"), Normalize()],
+        [Transformer(), Pooling("cls+mean")],
+        [Transformer(), Pooling("mean"), Dense(), Normalize()],
+        [Transformer(), Pooling("mean"), Normalize(), Dense()],
+    ):
+        with pytest.raises(ValueError):
+            onnx_backend.exportable_pooling(modules)
+
+
+# 🔹 Testa que o modelo exportado (int8) é equivalente em cosseno ao modelo torch
+def test_onnx_embeddings_match_torch(tmp_path):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("torch")
+    st = pytest.importorskip("sentence_transformers")
+    from src.config import settings
+
+    try:
+        torch_model = st.SentenceTransformer(settings.SEM_MODEL_NAME, device="cpu")
+        path = onnx_backend.export_onnx(settings.SEM_MODEL_NAME, str(tmp_path), quantize=True)
+    except OSError as e:  # modelo indisponível (sem rede/cache)
+        pytest.skip(f"modelo indisponível: {e}")
+
+    texts = [
+        "O plágio consiste em apresentar como seu o trabalho de outra pessoa.",
+        "Copiar ideias sem citar a fonte também é plágio.",
+        "curto",
+    ]
+    expected = torch_model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+    got = onnx_backend.OnnxEncoder(path).encode(texts, batch_size=2)
+
+    cosines = (expected * got).sum(axis=1)
+    assert got.shape == expected.shape
+    assert cosines.min() > 0.98  # tolerância da quantização dinâmica int8
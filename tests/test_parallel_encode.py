@@ -0,0 +1,69 @@
+import os
+import numpy as np
+import pytest
+from src.batching import BatchingMetrics, encode_bucketed
+from src.parallel_encode import ShardedEncoder
+
+
+def _fake_encode(texts):
+    # Embedding determinístico (precisa ser função de módulo para ir aos processos)
+    return np.array([[len(t), len(t.split()), os.getpid()] for t in texts], dtype=np.float32)
+
+
+def _bucketed_encode(texts):
+    # Lotes por orçamento de tokens no worker: as métricas ficam no ENCODE_METRICS do processo
+    return encode_bucketed(texts, _fake_encode, [len(t.split()) for t in texts], max_tokens=16, max_batch_size=8)
+
+
+def _failing_encode(texts):
+    raise AssertionError("não deveria codificar shards já gravados")
+
+
+TEXTS = [f"bloco número {i} " * (i % 3 + 1) for i in range(23)]
+
+
+# 🔹 Testa que o resultado multi-processo sai na ordem original dos textos
+def test_sharded_encoder_multiprocess_preserves_order():
+    with ShardedEncoder("fake-model", workers=2, shard_size=4, encoder=_fake_encode) as enc:
+        emb = enc.encode(TEXTS)
+
+    assert emb.shape == (len(TEXTS), 3)
+    assert emb[:, :2].tolist() == [[len(t), len(t.split())] for t in TEXTS]
+    assert os.getpid() not in set(emb[:, 2].astype(int).tolist())  # codificado nos workers
+
+
+# 🔹 Testa a retomada: shards já gravados não voltam ao modelo
+def test_sharded_encoder_resumes_from_completed_shards(tmp_path):
+    shard_dir = str(tmp_path / "shards")
+    with ShardedEncoder("fake-model", workers=1, shard_size=5, shard_dir=shard_dir, encoder=_fake_encode) as enc:
+        first = enc.encode(TEXTS)
+    assert len(os.listdir(shard_dir)) == 5
+
+    with ShardedEncoder("fake-model", workers=2, shard_size=5, shard_dir=shard_dir, encoder=_failing_encode) as enc:
+        again = enc.encode(TEXTS)
+    assert np.array_equal(first, again)
+
+    # Outro modelo não reaproveita os shards
+    with ShardedEncoder("outro-modelo", workers=1, shard_size=5, shard_dir=shard_dir, encoder=_failing_encode) as enc:
+        with pytest.raises(AssertionError):
+            enc.encode(TEXTS)
+
+
+# 🔹 Testa o tamanho de shard automático: um shard por processo, com tamanho mínimo
+def test_sharded_encoder_default_shards_one_per_worker():
+    enc = ShardedEncoder("fake-model", workers=4, encoder=_fake_encode)
+    assert enc._shard_size_for(2048) == 512   # 4 shards: os 4 processos ocupados
+    assert enc._shard_size_for(100) == 64     # lotes pequenos: shards de no mín. 64 textos
+    assert ShardedEncoder("fake-model", workers=4, shard_size=10)._shard_size_for(2048) == 10
+
+
+# 🔹 Testa que as métricas de lote dos processos do pool chegam ao processo principal
+def test_sharded_encoder_merges_worker_metrics():
+    metrics = BatchingMetrics()
+    with ShardedEncoder("fake-model", workers=2, shard_size=6, encoder=_bucketed_encode, metrics=metrics) as enc:
+        enc.encode(TEXTS)
+
+    stats = metrics.snapshot()
+    assert stats["texts"] == len(TEXTS)
+    assert stats["real_tokens"] == sum(len(t.split()) for t in TEXTS)
+    assert stats["batches"] >= 4  # ao menos um lote por shard
@@ -1,7 +1,11 @@
 import os
 import numpy as np
 import pytest
-from src import pipeline_build_index
+from src import pipeline_build_index, io_utils
+from src.embedding_cache import open_cache
+from src.parallel_encode import ShardedEncoder
+from src.fingerprint_index import find_spans, load_fingerprints
+from src.preprocess import tokenize
 
 
 def test_pipeline_build_index_main(tmp_path, monkeypatch):
@@ -20,19 +24,34 @@ def test_pipeline_build_index_main(tmp_path, monkeypatch):
         WINDOW_SIZE = 5
         STRIDE = 2
         SEM_MODEL_NAME = "fake-model"
+        SEM_SEARCH = "exact"
+        IVF_NLIST = 0
+        SEM_QUANTIZATION = "none"
+        LEX_FEATURES = "vocab"
+        LEX_MIN_DF = 2
+        LEX_HASH_FEATURES = 2 ** 20
+        LEX_PREFILTER = "none"
+        FP_KGRAM = 0
+        FP_WINDOW = 4
+        INGEST_WORKERS = 2
+        INGEST_CHUNK_SIZE = 2
+        INDEX_KEEP_VERSIONS = 2
+        ENCODE_WORKERS = 1
+        EMB_CACHE_DIR = ""
+        EMB_CACHE_MAX_ITEMS = 100
 
     monkeypatch.setattr(pipeline_build_index, "settings", FakeSettings)
 
     # 🔹 Mock de corpus
     fake_corpus = [{"doc_id": "doc1", "text": "um texto simples para teste"}]
-    monkeypatch.setattr(pipeline_build_index.io_utils, "load_corpus", lambda *a, **kw: fake_corpus)
+    monkeypatch.setattr(pipeline_build_index.io_utils, "iter_corpus", lambda *a, **kw: iter(fake_corpus))
 
     # 🔹 Mock de build_windows
     monkeypatch.setattr(
         pipeline_build_index, 
         "build_windows", 
         lambda text, window_size, stride: [
-            {"bloco_id": 0, "start_word": 0, "end_word": 3, "text": text}
+            {"bloco_id": 0, "start_word": 0, "end_word": 3, "text": tokenize(text).text}
         ]
     )
 
@@ -45,14 +64,16 @@ def test_pipeline_build_index_main(tmp_path, monkeypatch):
 
     # 🔹 Mock de save_index_semantic
     saved_semantic = {}
-    def fake_save_semantic(path, emb, id_map, model_name):
+    def fake_save_semantic(path, emb, id_map, model_name, ann_index=None, quantized=None):
         saved_semantic["path"] = path
+        saved_semantic["ann_index"] = ann_index
+        saved_semantic["quantized"] = quantized
         saved_semantic["shape"] = emb.shape
         saved_semantic["model_name"] = model_name
     monkeypatch.setattr(pipeline_build_index.io_utils, "save_index_semantic", fake_save_semantic)
 
     # 🔹 Mock de _encode_embeddings
-    monkeypatch.setattr(pipeline_build_index, "_encode_embeddings", lambda texts, model_name: np.ones((len(texts), 3)))
+    monkeypatch.setattr(pipeline_build_index, "_encode_embeddings", lambda texts, model_name, cache=None: np.ones((len(texts), 3)))
 
     # 🔹 Executa pipeline
     pipeline_build_index.main()
@@ -61,5 +82,208 @@ def test_pipeline_build_index_main(tmp_path, monkeypatch):
     assert saved_lexical["n_blocks"] == 1
     assert saved_semantic["shape"] == (1, 3)
     assert saved_semantic["model_name"] == "fake-model"
+    assert saved_semantic["ann_index"] is None
+    assert saved_semantic["quantized"] is None
     assert os.path.basename(saved_lexical["path"]) == "lexical"
     assert os.path.basename(saved_semantic["path"]) == "semantic"
+
+
+def test_pipeline_build_index_incremental(tmp_path, monkeypatch):
+    # 🔹 Corpus real em disco + índices reais no tmp_path; só o modelo é simulado
+    raw_dir = tmp_path / "data" / "raw"
+    indexes_dir = tmp_path / "data" / "indexes"
+    raw_dir.mkdir(parents=True)
+    (raw_dir / "doc1.txt").write_text("um dois três quatro cinco seis", encoding="utf-8")
+    (raw_dir / "doc2.txt").write_text("sete oito nove dez", encoding="utf-8")
+    (raw_dir / "doc3.txt").write_text("onze doze treze", encoding="utf-8")
+
+    class FakeSettings:
+        DATA_RAW_DIR = str(raw_dir)
+        DATA_PROCESSED_DIR = str(tmp_path / "data" / "processed")
+        DATA_INDEXES_DIR = str(indexes_dir)
+        WINDOW_SIZE = 4
+        STRIDE = 2
+        SEM_MODEL_NAME = "fake-model"
+        SEM_SEARCH = "exact"
+        IVF_NLIST = 0
+        SEM_QUANTIZATION = "none"
+        LEX_FEATURES = "vocab"
+        LEX_MIN_DF = 2
+        LEX_HASH_FEATURES = 2 ** 20
+        LEX_PREFILTER = "none"
+        FP_KGRAM = 2
+        FP_WINDOW = 4
+        INGEST_WORKERS = 2
+        INGEST_CHUNK_SIZE = 2
+        INDEX_KEEP_VERSIONS = 2
+        ENCODE_WORKERS = 1
+        EMB_CACHE_DIR = ""
+        EMB_CACHE_MAX_ITEMS = 100
+
+    monkeypatch.setattr(pipeline_build_index, "settings", FakeSettings)
+
+    # 🔹 Embedding determinístico por texto + registro dos textos codificados
+    encoded = []
+    def fake_encode(texts, model_name, cache=None):
+        encoded.extend(texts)
+        return np.array([[len(t), t.count(" ") + 1.0] for t in texts], dtype=np.float32)
+    monkeypatch.setattr(pipeline_build_index, "_encode_embeddings", fake_encode)
+
+    pipeline_build_index.main()
+    assert len(encoded) == 4
+
+    # 🔹 Altera doc2, remove doc3 e adiciona doc4: só doc2 e doc4 são recodificados
+    (raw_dir / "doc2.txt").write_text("sete oito nove dez onze", encoding="utf-8")
+    (raw_dir / "doc3.txt").unlink()
+    (raw_dir / "doc4.txt").write_text("catorze", encoding="utf-8")
+    encoded.clear()
+    pipeline_build_index.main(incremental=True)
+    assert encoded == ["sete oito nove dez", "nove dez onze", "catorze"]
+
+    # 🔹 O índice final é idêntico ao de um build completo do novo corpus
+    current = io_utils.current_index_dir(str(indexes_dir))
+    emb_inc, id_map_inc, _ = io_utils.load_index_semantic(os.path.join(current, "semantic"))
+    emb_inc = np.array(emb_inc)
+    pipeline_build_index.main()
+    current = io_utils.current_index_dir(str(indexes_dir))
+    emb_full, id_map_full, _ = io_utils.load_index_semantic(os.path.join(current, "semantic"))
+    assert [r["uid"] for r in id_map_inc] == [r["uid"] for r in id_map_full]
+    assert np.array_equal(emb_inc, emb_full)
+    assert "doc3" not in {r["doc_id"] for r in id_map_full}
+
+    # 🔹 Índice de impressões reconstruído com o corpus atual
+    spans = find_spans(load_fingerprints(os.path.join(current, "fingerprint")), "x sete oito nove dez onze y")
+    assert [(s["doc_id"], s["n_words"]) for s in spans] == [("doc2", 5)]
+
+    # 🔹 Cada build publicou uma versão nova; só as INDEX_KEEP_VERSIONS mais recentes ficam
+    assert len(os.listdir(indexes_dir / "versions")) == 2
+    assert not (indexes_dir / "semantic").exists()
+
+
+def test_encode_embeddings_uses_persistent_cache(tmp_path, monkeypatch):
+    # 🔹 Com EMB_CACHE_DIR, blocos já vistos não voltam ao modelo num novo build
+    calls = []
+    def fake_model(texts, model_name):
+        calls.append(list(texts))
+        return np.ones((len(texts), 3), dtype=np.float32)
+    monkeypatch.setattr(pipeline_build_index, "_encode_with_model", fake_model)
+
+    cache_dir = str(tmp_path / "cache")
+    cache = open_cache(cache_dir, "fake-model", 100)
+    pipeline_build_index._encode_embeddings(["bloco a", "bloco b"], "fake-model", cache)
+    cache.close()
+    cache = open_cache(cache_dir, "fake-model", 100)
+    emb = pipeline_build_index._encode_embeddings(["bloco b", "bloco c"], "fake-model", cache)
+    cache.close()
+
+    assert calls == [["bloco a", "bloco b"], ["bloco c"]]
+    assert emb.shape == (2, 3)
+
+
+def test_build_opens_embedding_cache_once(tmp_path, monkeypatch):
+    # 🔹 Vários lotes no mesmo build: o cache é aberto (e o index.log lido) uma só vez
+    raw_dir = tmp_path / "data" / "raw"
+    raw_dir.mkdir(parents=True)
+    (raw_dir / "doc1.txt").write_text(" ".join(f"p{i}" for i in range(11)), encoding="utf-8")
+
+    class FakeSettings:
+        DATA_RAW_DIR = str(raw_dir)
+        DATA_PROCESSED_DIR = str(tmp_path / "data" / "processed")
+        DATA_INDEXES_DIR = str(tmp_path / "data" / "indexes")
+        WINDOW_SIZE = 2
+        STRIDE = 1
+        SEM_MODEL_NAME = "fake-model"
+        SEM_SEARCH = "exact"
+        IVF_NLIST = 0
+        SEM_QUANTIZATION = "none"
+        LEX_FEATURES = "vocab"
+        LEX_MIN_DF = 1
+        LEX_HASH_FEATURES = 2 ** 20
+        LEX_PREFILTER = "none"
+        FP_KGRAM = 0
+        FP_WINDOW = 4
+        INGEST_WORKERS = 1
+        INGEST_CHUNK_SIZE = 3
+        INDEX_KEEP_VERSIONS = 2
+        ENCODE_WORKERS = 1
+        EMB_CACHE_DIR = str(tmp_path / "cache")
+        EMB_CACHE_MAX_ITEMS = 100
+
+    monkeypatch.setattr(pipeline_build_index, "settings", FakeSettings)
+    monkeypatch.setattr(pipeline_build_index, "_encode_with_model",
+                        lambda texts, model_name: _fake_encode(texts))
+    opened = []
+    def counting_open(*args, **kwargs):
+        opened.append(open_cache(*args, **kwargs))
+        return opened[-1]
+    monkeypatch.setattr(pipeline_build_index, "open_cache", counting_open)
+
+    pipeline_build_index.main()
+
+    # 10 blocos em lotes de 3 -> 4 lotes, um único cache (já fechado ao fim do build)
+    assert len(opened) == 1 and opened[0].stats()["misses"] == 10
+    assert opened[0]._lock_fd is None
+
+
+def _fake_encode(texts):
+    # Embedding determinístico (função de módulo: vai aos processos do pool)
+    return np.array([[len(t), 1.0] for t in texts], dtype=np.float32)
+
+
+def test_default_build_keeps_every_encode_worker_busy(tmp_path, monkeypatch):
+    # 🔹 Build com ENCODE_WORKERS=3: cada lote de INGEST_CHUNK_SIZE blocos vira um shard por processo
+    raw_dir = tmp_path / "data" / "raw"
+    raw_dir.mkdir(parents=True)
+    (raw_dir / "doc1.txt").write_text(" ".join(f"p{i}" for i in range(401)), encoding="utf-8")
+
+    class FakeSettings:
+        DATA_RAW_DIR = str(raw_dir)
+        DATA_PROCESSED_DIR = str(tmp_path / "data" / "processed")
+        DATA_INDEXES_DIR = str(tmp_path / "data" / "indexes")
+        WINDOW_SIZE = 2
+        STRIDE = 1
+        SEM_MODEL_NAME = "fake-model"
+        SEM_SEARCH = "exact"
+        IVF_NLIST = 0
+        SEM_QUANTIZATION = "none"
+        LEX_FEATURES = "vocab"
+        LEX_MIN_DF = 1
+        LEX_HASH_FEATURES = 2 ** 20
+        LEX_PREFILTER = "none"
+        FP_KGRAM = 0
+        FP_WINDOW = 4
+        INGEST_WORKERS = 1
+        INGEST_CHUNK_SIZE = 300
+        INDEX_KEEP_VERSIONS = 2
+        ENCODE_WORKERS = 3
+        ENCODE_BATCH_SIZE = 32
+        ENCODE_MAX_TOKENS = 8192
+        EMB_CACHE_DIR = ""
+        EMB_CACHE_MAX_ITEMS = 100
+
+    monkeypatch.setattr(pipeline_build_index, "settings", FakeSettings)
+    encoders = []
+    def make_encoder(*args, **kwargs):
+        encoders.append(ShardedEncoder(*args, encoder=_fake_encode, **kwargs))
+        return encoders[-1]
+    monkeypatch.setattr(pipeline_build_index, "ShardedEncoder", make_encoder)
+    saved = []
+    save_semantic = io_utils.save_index_semantic
+    def spy_save_semantic(path, emb, *args, **kwargs):
+        saved.append(emb)
+        save_semantic(path, emb, *args, **kwargs)
+    monkeypatch.setattr(pipeline_build_index.io_utils, "save_index_semantic", spy_save_semantic)
+
+    pipeline_build_index.main()
+
+    # 🔹 Lotes gravados direto no embeddings.npy da versão (memmap), sem concatenar em memória
+    current = io_utils.current_index_dir(str(tmp_path / "data" / "indexes"))
+    assert isinstance(saved[0], np.memmap)
+    assert os.path.samefile(saved[0].filename, os.path.join(current, "semantic", "embeddings.npy"))
+    assert not os.path.exists(os.path.join(current, "semantic", "embeddings.f32.tmp"))
+
+    # 400 blocos: lote de 300 -> 3 shards de 100; lote de 100 -> 2 shards (mín. 64 textos)
+    assert len(encoders) == 1 and encoders[0].submitted == 5
+    emb, id_map, _ = io_utils.load_index_semantic(os.path.join(current, "semantic"))
+    assert emb.shape == (400, 2)
+    assert np.asarray(emb)[:, 0].tolist() == [len(id_map[i]["text"]) for i in range(400)]
@@ -62,3 +62,22 @@ def test_extend_context_limits():
     text = "um dois três"
     result = preprocess.extend_context(text, start_word=0, end_word=2, margin=5)
     assert result == "um dois três"
+
+
+# 🔹 Testa join: palavras do trecho reconstruídas com espaços simples
+def test_tokenized_text_join():
+    tok = preprocess.tokenize("  um  dois\ntrês quatro ")
+    assert tok.words == ["um", "dois", "três", "quatro"]
+    assert tok.join(1, 3) == "dois três"
+    assert tok.join(2, 2) == ""
+    assert preprocess.tokenize(tok) is tok
+
+
+# 🔹 Testa que janelas a partir de TokenizedText equivalem às do texto bruto
+def test_build_windows_from_tokenized_text():
+    text = "a b c d e f g"
+    tok = preprocess.tokenize(text)
+    for window_size, stride in [(3, 2), (2, 5), (10, 1)]:
+        assert preprocess.build_windows(tok, window_size, stride) == preprocess.build_windows(text, window_size, stride)
+        assert len(tok.window_spans(window_size, stride)) == preprocess.count_windows(len(tok), window_size, stride)
+    assert preprocess.extend_context(tok, start_word=1, end_word=3, margin=1) == "a b c d"
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from src.quantized_index import quantize, search_quantized
+from src.topk import top_k_indices
+
+
+# 🔹 Fixture com embeddings aleatórios L2-normalizados (dimensão típica de MiniLM)
+@pytest.fixture
+def embeddings():
+    rng = np.random.default_rng(7)
+    points = rng.normal(size=(2000, 384)).astype(np.float32)
+    return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+
+# 🔹 Testa o erro de reconstrução e o tamanho em memória de cada formato
+@pytest.mark.parametrize("kind, max_err, ratio", [("float16", 1e-3, 2), ("int8", 2e-2, 4)])
+def test_quantize_error_and_size(embeddings, kind, max_err, ratio):
+    index = quantize(embeddings, kind)
+    assert index.kind == kind
+    assert index.codes.nbytes * ratio == embeddings.nbytes
+    scales = 1.0 if index.scales is None else index.scales
+    restored = index.codes.astype(np.float32) * scales
+    assert np.abs(restored - embeddings).max() < max_err
+
+    with pytest.raises(ValueError):
+        quantize(embeddings, "int4")
+
+
+# 🔹 Com re-rank, o top-k coincide com a busca exata e os scores são os exatos
+@pytest.mark.parametrize("kind", ["float16", "int8"])
+def test_search_quantized_matches_exact(embeddings, kind):
+    rng = np.random.default_rng(1)
+    queries = embeddings[::50] + 0.05 * rng.normal(size=(40, 384)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    exact_scores = queries @ embeddings.T
+    exact = top_k_indices(exact_scores, 10)
+
+    results = search_quantized(quantize(embeddings, kind), embeddings, queries, k=10, rerank_factor=4)
+    for row, (idx, scores) in enumerate(results):
+        assert idx.tolist() == exact[row].tolist()
+        assert np.allclose(scores, exact_scores[row, idx], atol=1e-5)
@@ -0,0 +1,67 @@
+import os
+from src.result_cache import ResultCache, result_key
+
+
+# 🔹 Testa chave: ignora espaçamento, mas muda com versão e parâmetros
+def test_result_key_normalizes_text():
+    assert result_key("a  b\nc", "v1", "p") == result_key(" a b c ", "v1", "p")
+    assert result_key("a b c", "v1", "p") != result_key("a b c", "v2", "p")
+    assert result_key("a b c", "v1", "p") != result_key("a b c", "v1", "q")
+
+
+# 🔹 Testa LRU em memória, cópias independentes e cache desativado
+def test_result_cache_lru_and_copies():
+    cache = ResultCache(max_items=2)
+    cache.use_version("v1")
+    cache.put("a", [{"x": 1}])
+    cache.put("b", [{"x": 2}])
+    cache.get("a")[0]["x"] = 99          # o chamador altera a cópia, não o cache
+    cache.put("c", [{"x": 3}])           # evicta "b" (menos usado)
+
+    assert cache.get("a") == [{"x": 1}]
+    assert cache.get("b") is None
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1
+
+    disabled = ResultCache(max_items=0)
+    disabled.put("a", [1])
+    assert disabled.get("a") is None and not disabled.enabled
+
+
+# 🔹 Testa nível em disco entre instâncias e invalidação por nova versão dos índices
+def test_result_cache_disk_tier_and_version_change(tmp_path):
+    first = ResultCache(max_items=4, path=str(tmp_path))
+    first.use_version("mtime:1")
+    first.put("abc123", {"score": 0.5})
+
+    other = ResultCache(max_items=4, path=str(tmp_path))  # ex.: outro processo
+    other.use_version("mtime:1")
+    assert other.get("abc123") == {"score": 0.5}
+    assert other.stats()["disk_hits"] == 1
+
+    other.use_version("mtime:2")
+    assert other.get("abc123") is None
+    # a versão anterior fica em disco para quem ainda a serve (hot swap); as mais antigas saem
+    assert first.get("abc123") == {"score": 0.5}
+    assert os.listdir(tmp_path) == ["mtime_1"]
+    other.put("def456", {"score": 0.7})
+    other.use_version("mtime:3")
+    assert sorted(os.listdir(tmp_path)) == ["mtime_2"]
+
+    fresh = ResultCache(max_items=4, path=str(tmp_path))  # processo novo: mantém a última gravada
+    fresh.use_version("mtime:4")
+    assert sorted(os.listdir(tmp_path)) == ["mtime_2"]
+
+
+# 🔹 Testa o limite de arquivos do nível em disco: saem os lidos/gravados há mais tempo
+def test_result_cache_disk_tier_is_bounded(tmp_path):
+    cache = ResultCache(max_items=1, path=str(tmp_path), max_disk_items=10)
+    cache.use_version("v1")
+    keys = [result_key(f"redação {i}", "v1", "p") for i in range(30)]
+    for i, key in enumerate(keys):
+        cache.put(key, {"i": i})
+        path = cache._file(key)
+        os.utime(path, ns=(i * 10**9, i * 10**9))  # mtimes distintos e crescentes
+
+    on_disk = [name for sub in os.listdir(tmp_path / "v1") for name in os.listdir(tmp_path / "v1" / sub)]
+    assert len(on_disk) <= 10
+    assert f"{keys[-1]}.json" in on_disk and f"{keys[0]}.json" not in on_disk
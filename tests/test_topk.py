@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from src.topk import top_k_indices
+
+
+# 🔹 Testa seleção 1-D: ordem decrescente e limite k
+def test_top_k_indices_1d_basic():
+    scores = np.array([0.1, 0.9, 0.3, 0.7, 0.5])
+    assert top_k_indices(scores, 3).tolist() == [1, 3, 4]
+
+
+# 🔹 Testa desempate determinístico pelo menor índice, inclusive no limiar do k
+def test_top_k_indices_ties_are_deterministic():
+    scores = np.array([0.5, 0.9, 0.5, 0.5, 0.9, 0.1])
+    assert top_k_indices(scores, 3).tolist() == [1, 4, 0]
+    assert top_k_indices(scores, 4).tolist() == [1, 4, 0, 2]
+
+
+# 🔹 Testa k maior que N e k == 0
+def test_top_k_indices_k_limits():
+    scores = np.array([0.2, 0.8])
+    assert top_k_indices(scores, 10).tolist() == [1, 0]
+    assert top_k_indices(scores, 0).tolist() == []
+
+
+# 🔹 Testa modo 2-D (lote) contra a ordenação completa, linha a linha
+def test_top_k_indices_2d_matches_full_sort():
+    rng = np.random.default_rng(0)
+    scores = rng.integers(0, 5, size=(20, 50)).astype(float)  # muitos empates
+    result = top_k_indices(scores, 7)
+
+    assert result.shape == (20, 7)
+    for row in range(scores.shape[0]):
+        expected = np.lexsort((np.arange(50), -scores[row]))[:7]
+        assert result[row].tolist() == expected.tolist()
+        assert top_k_indices(scores[row], 7).tolist() == expected.tolist()
+
+
+def test_top_k_indices_invalid_ndim():
+    with pytest.raises(ValueError):
+        top_k_indices(np.zeros((2, 2, 2)), 1)